@@ -1,6 +1,6 @@
 import cv2
 import numpy as np
-from config import Config
+from config import Config, FORWARD_HEAD_POSES
 
 class HeadPoseAnalyzer:
     """Analyzes head pose using facial landmarks"""
@@ -69,6 +69,6 @@ class HeadPoseAnalyzer:
         p2 = (int(nose_projections[1][0][0]), int(nose_projections[1][0][1]))  # Projected forward point
 
         # Determine distraction status
-        is_distracted = text != "Forward"
+        is_distracted = text not in FORWARD_HEAD_POSES
         
         return text, is_distracted, p1, p2
\ No newline at end of file
@@ -7,9 +7,7 @@ import time
 import logging
 import os
 from datetime import datetime, timedelta
-import pandas as pd
-import io
-from flask import send_file
+from flask import stream_with_context
 import psutil
 
 # Import custom modules
@@ -19,9 +17,16 @@ from utils.audio_manager import AudioManager
 from utils.pomodoro_timer import PomodoroTimer
 from utils.achievement_manager import AchievementManager
 from utils.analytics_manager import AnalyticsManager
+from utils.session_finalizer import SessionFinalizer
+from utils.retention import RetentionJob
+from utils.account_index import account_index
+from utils.leaderboard import leaderboard_service, windowed_leaderboards
+from utils import retention, session_export, visualization_blob
 
 
 # Import auth modules
+from models import shards
+from models.database import release_connections
 from models.user import User, init_db
 from auth_routes import auth_bp
 from profile_routes import profile_bp
@@ -42,6 +47,9 @@ login_manager.login_message_category = 'info'
 # Initialize database
 init_db()
 
+# Hand each request's / Socket.IO event's connections back to the shared pool
+app.teardown_appcontext(release_connections)
+
 # Register Blueprints
 app.register_blueprint(auth_bp)
 app.register_blueprint(profile_bp)
@@ -49,6 +57,12 @@ app.register_blueprint(profile_bp)
 # Set up socket.io with CORS
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# Persists finished sessions off the Socket.IO handlers
+session_finalizer = SessionFinalizer()
+
+# Rolls up / removes old detail data and legacy files in the background
+retention_job = RetentionJob()
+
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -67,6 +81,11 @@ class WebDrowsinessDetector:
         self.stats_manager = StatisticsManager()
         self.audio_manager = AudioManager()
         self.pomodoro = PomodoroTimer(self.audio_manager)
+
+        # One timer and one statistics path per frame: the detector formats the
+        # status of this timer and the wrapper feeds its own stats_manager
+        self.detector.pomodoro = self.pomodoro
+        self.detector.record_statistics = False
         
         # Store user ID for statistics tracking
         self.user_id = user_id
@@ -75,7 +94,7 @@ class WebDrowsinessDetector:
         self.achievement_manager = AchievementManager(user_id)
     
         # Initialize analytics manager
-        self.analytics_manager = AnalyticsManager()
+        self.analytics_manager = AnalyticsManager(user_id)
         
         # Camera and processing variables
         self.camera = None
@@ -103,6 +122,13 @@ class WebDrowsinessDetector:
     
         # Add CPU monitoring thread
         self.cpu_monitor_thread = None
+
+        # Derive EAR/MAR thresholds from the user's own distribution when enabled.
+        # The config holds the thresholds in effect; the user's fixed ones are
+        # kept here so an adaptive override is never saved in their place
+        self.adaptive_thresholds = False
+        self.fixed_ear_thresh = self.detector.config.EYE_AR_THRESH
+        self.fixed_mar_thresh = self.detector.config.MOUTH_AR_THRESH
         
         # Apply user settings if available
         if user_id:
@@ -188,16 +214,37 @@ class WebDrowsinessDetector:
             settings = user.get_settings()
             if settings:
                 # Apply detection settings
-                self.detector.config.EYE_AR_THRESH = settings.get('eye_ar_thresh', 0.15)
-                self.detector.config.MOUTH_AR_THRESH = settings.get('mouth_ar_thresh', 1.35)
+                self.fixed_ear_thresh = settings.get('eye_ar_thresh', 0.15)
+                self.fixed_mar_thresh = settings.get('mouth_ar_thresh', 1.35)
+                self.detector.config.EYE_AR_THRESH = self.fixed_ear_thresh
+                self.detector.config.MOUTH_AR_THRESH = self.fixed_mar_thresh
                 self.detector.config.HEAD_POSE_THRESHOLD = settings.get('head_pose_threshold', 10.0)
                 
+                # Override fixed thresholds with the user's percentiles if enabled
+                self.adaptive_thresholds = bool(settings.get('adaptive_thresholds', 0))
+                if self.adaptive_thresholds:
+                    self.apply_adaptive_thresholds()
+                
                 # Apply pomodoro settings
                 self.pomodoro.work_duration = settings.get('work_duration', 25)
                 self.pomodoro.short_break_duration = settings.get('short_break_duration', 5)
                 self.pomodoro.long_break_duration = settings.get('long_break_duration', 15)
                 self.pomodoro.long_break_interval = settings.get('long_break_interval', 4)
     
+    def apply_adaptive_thresholds(self):
+        """Set EAR/MAR thresholds from the user's stored distribution percentiles"""
+        if not self.user_id:
+            return
+            
+        thresholds = StatisticsManager.get_adaptive_thresholds(self.user_id, self.detector.config)
+        if 'eye_ar_thresh' in thresholds:
+            self.detector.config.EYE_AR_THRESH = thresholds['eye_ar_thresh']
+        if 'mouth_ar_thresh' in thresholds:
+            self.detector.config.MOUTH_AR_THRESH = thresholds['mouth_ar_thresh']
+            
+        if thresholds:
+            logging.info(f"Adaptive thresholds applied for user {self.user_id}: {thresholds}")
+    
     def save_user_settings(self, settings_dict):
         """Save user settings"""
         if not self.user_id:
@@ -226,60 +273,29 @@ class WebDrowsinessDetector:
         cv2.putText(frame, f"CPU: {self.cpu_usage:.1f}%", 
                 (10, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-        # Check if person is distracted based on head pose
-        is_looking_away = False
-        if self.detector.head_pose_text:  # Make sure head_pose_text exists
-            is_looking_away = self.detector.head_pose_text not in ['Forward', 'forward', 'Center', 'center']
-        
-        # Update distraction timing
-        current_time = time.time()
-        if is_looking_away and self.distraction_start_time is None:
-            self.distraction_start_time = current_time
-        elif not is_looking_away:
-            self.distraction_start_time = None
-        
-        # Only count as distracted if it's been 5 seconds
-        is_distracted = False
-        if is_looking_away and self.distraction_start_time is not None:
-            elapsed_time = current_time - self.distraction_start_time
-            # Only mark as distracted if they've been looking away for at least 5 seconds
-            is_distracted = elapsed_time >= 5.0
-        
-        # Get current metrics
-        metrics = {
-            'ear': self.detector.current_ear,
-            'mar': self.detector.current_mar,
-            'drowsy': self.detector.alarm_status,
-            'yawning': self.detector.alarm_status2,
-            'distracted': is_distracted,  # Now this is only True after 5 seconds
-            'camera_blocked': self.camera_blocked_status,
-            'head_pose': self.detector.head_pose_text,
-            'pomodoro': self.pomodoro.get_timer_status(),
-            # Add performance metrics
-            'fps': self.current_fps,
-            'cpu_usage': self.cpu_usage
-        }
-
+        # Reuse the result the detector built for this frame
+        result = self.detector.last_result
+        result.fps = self.current_fps
+        result.cpu_usage = self.cpu_usage
         # FIX: Store user ID in metrics for session tracking
-        metrics['user_id'] = self.user_id
+        result.user_id = self.user_id
 
         # Update statistics manager
-        self.stats_manager.update_metrics(metrics)
+        self.stats_manager.update_metrics(result)
         
         # Check for state changes and emit events
-        if metrics['drowsy'] and not self.prev_state['drowsy']:
+        prev_state = self.prev_state
+        if result.drowsy and not prev_state['drowsy']:
             socketio.emit('drowsy_event')
-        if metrics['yawning'] and not self.prev_state['yawning']:
+        if result.yawning and not prev_state['yawning']:
             socketio.emit('yawn_event')
-        if metrics['distracted'] and not self.prev_state['distracted']:
+        if result.distracted and not prev_state['distracted']:
             socketio.emit('distraction_event')
             
         # Update previous states
-        self.prev_state = {
-            'drowsy': metrics['drowsy'],
-            'yawning': metrics['yawning'],
-            'distracted': metrics['distracted']
-        }
+        prev_state['drowsy'] = result.drowsy
+        prev_state['yawning'] = result.yawning
+        prev_state['distracted'] = result.distracted
         
         return frame
     
@@ -371,6 +387,35 @@ class WebDrowsinessDetector:
             # Add a small delay to prevent high CPU usage
             time.sleep(0.01)
     
+    def stop_processing(self):
+        """
+        Stop the frame loop and wait until it has exited
+
+        Returns:
+            StatisticsManager: The stopped session's statistics, which no
+                other thread writes from now on, or None if detection was
+                not running
+        """
+        with self.frame_lock:
+            if not self.is_running:
+                return None
+            self.is_running = False
+            thread = self.thread
+            stats_manager = self.stats_manager
+
+        # Joined outside frame_lock: the loop takes it to publish each frame
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+            if thread.is_alive():
+                # A read stuck on the camera returns once it is released
+                self.release_camera()
+                thread.join()
+
+        with self.frame_lock:
+            if not self.is_running:
+                self.release_camera()
+        return stats_manager
+
     def get_frame(self):
         """
         Safely get the current frame
@@ -526,11 +571,17 @@ def start_detection():
     detector = get_detector_for_user(current_user.id)
     
     with detector.frame_lock:
-        if not detector.is_running:
+        # A session still being stopped keeps its frame loop until it exits
+        stopping = detector.thread is not None and detector.thread.is_alive()
+        if not detector.is_running and not stopping:
             try:
                 # Reset statistics manager for new session
                 detector.stats_manager = StatisticsManager()
 
+                # Refresh adaptive thresholds from the baseline updated last session
+                if detector.adaptive_thresholds:
+                    detector.apply_adaptive_thresholds()
+
                 # Initialize camera
                 detector.initialize_camera()
                 detector.is_running = True
@@ -564,19 +615,30 @@ def send_periodic_statistics(detector):
         try:
             if detector.stats_manager.current_session['start_time']:
                 # Get base statistics
+                session_summary = detector.stats_manager.refresh_summary()
+                result = detector.detector.last_result
                 stats = {
                     'session_duration': int((datetime.now() - detector.stats_manager.current_session['start_time']).total_seconds() // 60),
                     'total_drowsy_events': detector.stats_manager.session_summary['total_drowsy_events'],
                     'total_yawn_events': detector.stats_manager.session_summary['total_yawn_events'],
                     'total_distraction_events': detector.stats_manager.session_summary['total_distraction_events'],
+                    # Streaming EAR/MAR statistics
+                    'average_ear': session_summary['average_ear'],
+                    'ear_std': session_summary['ear_std'],
+                    'average_mar': session_summary['average_mar'],
+                    'mar_std': session_summary['mar_std'],
+                    'perclos': session_summary['perclos'],
+                    'blink_count': session_summary['blink_count'],
+                    'blink_rate': session_summary['blink_rate'],
+                    'yawn_rate': session_summary['yawn_rate'],
                     # Add current metrics
                     'current_metrics': {
-                        'ear': detector.detector.current_ear,
-                        'mar': detector.detector.current_mar,
-                        'head_pose': detector.detector.head_pose_text,
-                        'drowsy': detector.detector.alarm_status,
-                        'yawning': detector.detector.alarm_status2,
-                        'distracted': detector.detector.head_pose_text not in ['Forward', 'forward', 'Center', 'center'] if detector.detector.head_pose_text else False
+                        'ear': result.ear if result else 0.0,
+                        'mar': result.mar if result else 0.0,
+                        'head_pose': result.head_pose if result else None,
+                        'drowsy': result.drowsy if result else False,
+                        'yawning': result.yawning if result else False,
+                        'distracted': result.distracted if result else False
                     }
                 }
             
@@ -593,93 +655,112 @@ def send_periodic_statistics(detector):
 @socketio.on('stop_detection')
 @login_required
 def stop_detection():
-    """Stop the drowsiness detection and collect session data"""
+    """Stop the drowsiness detection and hand the session to the finalizer"""
     detector = get_detector_for_user(current_user.id)
     
-    with detector.frame_lock:
-        if detector.is_running:
-            detector.is_running = False
-            if detector.thread:
-                detector.thread.join(timeout=1.0)
-            detector.release_camera()
-            
-            # Get session statistics
-            stats_file = detector.stats_manager.save_session()
-            
-            # FIX: Also save to database with the correct user_id
-            if hasattr(detector.stats_manager, 'user_id') and detector.stats_manager.user_id:
-                detector.stats_manager.save_session_to_db(detector.stats_manager.user_id)
-            else:
-                detector.stats_manager.save_session_to_db(current_user.id)
-                
-            session_stats = detector.stats_manager.session_summary
-            
-            # Calculate points for the session
-            points_result = detector.achievement_manager.calculate_session_points(session_stats)
-            
-            # Track session in analytics
-            detector.analytics_manager.track_session(
-                session_stats, 
-                points_result.get('total_points', 0)
-            )
-            
-            # Save session to user history if authenticated
-            session_id = None
-            if current_user.is_authenticated:
-                user = User.get_by_id(current_user.id)
-                if user:
-                    session_data = {
-                        'start_time': detector.stats_manager.current_session['start_time'].isoformat(),
-                        'end_time': datetime.now().isoformat(),
-                        'duration_minutes': session_stats.get('session_duration_minutes', 0),
-                        'drowsy_events': session_stats.get('total_drowsy_events', 0),
-                        'yawn_events': session_stats.get('total_yawn_events', 0),
-                        'distraction_events': session_stats.get('total_distraction_events', 0),
-                        'completed_pomodoros': session_stats.get('completed_pomodoro_sessions', 0),
-                        'points_earned': points_result.get('total_points', 0)
-                    }
-                    session_id = user.save_session(session_data)
-            
-            # Check for achievements based on session stats
-            achievements = detector.achievement_manager.check_session_achievements(session_stats)
-            
-            # Track achievements in analytics
-            if achievements:
-                detector.analytics_manager.track_achievement(len(achievements))
-            
-            # Check pomodoro achievements if applicable
-            completed_pomodoros = session_stats.get('completed_pomodoro_sessions', 0)
-            if completed_pomodoros > 0:
-                pomodoro_achievements = detector.achievement_manager.check_pomodoro_achievements(completed_pomodoros)
-                achievements.extend(pomodoro_achievements)
-                
-                # Track badges if any were earned
-                badges_earned = sum(1 for a in pomodoro_achievements if a.get('type') == 'badge')
-                if badges_earned > 0:
-                    detector.analytics_manager.track_badge(badges_earned)
-            
-            # Track level up if it occurred
-            if points_result.get('level_up'):
-                detector.analytics_manager.track_level_up()
-            
-            # Save updated profile
-            detector.achievement_manager.save_profile()
-            
-            # Send response with stats and achievements
-            emit('detection_status', {
-                'status': 'stopped',
-                'stats_file': str(stats_file) if stats_file else None,
-                'points': points_result,
-                'achievements': achievements
-            })
-            
-            # Additionally, emit gamification status update
-            emit('gamification_update', detector.achievement_manager.get_gamification_status())
-            
-            # FIX: Request an update of the session history after the session completes
-            emit('session_history_data', {'sessions': User.get_by_id(current_user.id).get_session_history()})
+    # The frame loop has exited once this returns, so the finalizer is the
+    # only writer of this stats_manager (start_detection replaces it)
+    stats_manager = detector.stop_processing()
+    if stats_manager:
+        # Duration must be in the summary before the session is scored
+        session_stats = dict(stats_manager.finish_session())
+        achievement_manager = detector.achievement_manager
+        analytics_manager = detector.analytics_manager
+        
+        # Gamification is evaluated in memory here so the client gets its
+        # points right away; the changed rows are written by the finalizer
+        
+        # Calculate points for the session
+        points_result = achievement_manager.calculate_session_points(session_stats)
+        
+        # Track session in analytics
+        analytics_manager.track_session(
+            session_stats, 
+            points_result.get('total_points', 0),
+            achievement_manager=achievement_manager,
+            save=False
+        )
+        
+        # Check for achievements based on session stats
+        achievements = achievement_manager.check_session_achievements(session_stats)
+        
+        # Track achievements in analytics
+        if achievements:
+            analytics_manager.track_achievement(len(achievements), save=False)
+        
+        # Check pomodoro achievements if applicable
+        completed_pomodoros = session_stats.get('completed_pomodoro_sessions', 0)
+        if completed_pomodoros > 0:
+            pomodoro_achievements = achievement_manager.check_pomodoro_achievements(completed_pomodoros)
+            achievements.extend(pomodoro_achievements)
             
-            logging.info(f"Detection stopped for user {current_user.id}")
+            # Track badges if any were earned
+            badges_earned = sum(1 for a in pomodoro_achievements if a.get('type') == 'badge')
+            if badges_earned > 0:
+                analytics_manager.track_badge(badges_earned, save=False)
+        
+        # Track level up if it occurred
+        if points_result.get('level_up'):
+            analytics_manager.track_level_up(save=False)
+        
+        session_data = {
+            'start_time': stats_manager.current_session['start_time'].isoformat(),
+            'end_time': stats_manager.session_end_time.isoformat(),
+            'duration_minutes': session_stats.get('session_duration_minutes', 0),
+            'drowsy_events': session_stats.get('total_drowsy_events', 0),
+            'yawn_events': session_stats.get('total_yawn_events', 0),
+            'distraction_events': session_stats.get('total_distraction_events', 0),
+            'completed_pomodoros': session_stats.get('completed_pomodoro_sessions', 0),
+            'points_earned': points_result.get('total_points', 0),
+            'average_ear': session_stats.get('average_ear', 0.0),
+            'average_mar': session_stats.get('average_mar', 0.0),
+            'perclos': session_stats.get('perclos', 0.0),
+            'blink_count': session_stats.get('blink_count', 0),
+            'blink_rate': session_stats.get('blink_rate', 0.0),
+            'yawn_rate': session_stats.get('yawn_rate', 0.0),
+            'session_uid': stats_manager.session_uid
+        }
+        
+        job = {
+            'user': User.get_by_id(current_user.id),
+            'user_id': current_user.id,
+            'stats_manager': stats_manager,
+            'session_data': session_data,
+            'achievement_manager': achievement_manager,
+            'profile': achievement_manager.snapshot_profile(),
+            'analytics_manager': analytics_manager,
+            'analytics': analytics_manager.snapshot_analytics()
+        }
+        session_finalizer.submit(job, on_done=_session_finalized_callback(request.sid, current_user.id, achievement_manager))
+        
+        # Acknowledge immediately; results follow in 'session_finalized'
+        emit('detection_status', {
+            'status': 'stopped',
+            'finalizing': True,
+            'stats_file': None,
+            'points': points_result,
+            'achievements': achievements
+        })
+        
+        # Additionally, emit gamification status update
+        emit('gamification_update', achievement_manager.get_gamification_status())
+        
+        logging.info(f"Detection stopped for user {current_user.id}")
+
+def _session_finalized_callback(sid, user_id, achievement_manager):
+    """Build the finalizer callback that pushes results to one client"""
+    def on_done(result):
+        socketio.emit('session_finalized', result, room=sid)
+        if not result['success']:
+            return
+        
+        socketio.emit('gamification_update', achievement_manager.get_gamification_status(), room=sid)
+        
+        # Refresh the session history now that the session row is committed
+        user = User.get_by_id(user_id)
+        if user:
+            socketio.emit('session_history_data', {'sessions': user.get_session_history()}, room=sid)
+    return on_done
 
 @app.route('/api/stop_detection_emergency', methods=['POST'])
 @login_required
@@ -689,36 +770,40 @@ def emergency_stop_detection():
         # Get current user's detector
         detector = get_detector_for_user(current_user.id)
         
-        if detector and detector.is_running:
-            # Forcefully stop the detection
-            detector.is_running = False
-            
-            # Release camera resources immediately
-            detector.release_camera()
-            
+        # Stop the frame loop and release the camera; once this returns the
+        # session's stats_manager is only written by the finalizer
+        stats_manager = detector.stop_processing() if detector else None
+        if stats_manager:
             # Log the emergency stop
             logging.warning(f"Emergency detection stop triggered for user {current_user.id}")
             
-            # Save session data if possible
+            # Save a minimal session record (no points for emergency stops)
             try:
-                # Try to save to database with a minimal session record
-                detector.stats_manager.save_session_to_db(current_user.id)
-                
-                # Create a minimal session record in user history
-                user = User.get_by_id(current_user.id)
-                if user:
-                    session_data = {
-                        'start_time': detector.stats_manager.current_session['start_time'].isoformat(),
-                        'end_time': datetime.now().isoformat(),
-                        'duration_minutes': int((datetime.now() - detector.stats_manager.current_session['start_time']).total_seconds() // 60),
-                        'drowsy_events': detector.stats_manager.session_summary.get('total_drowsy_events', 0),
-                        'yawn_events': detector.stats_manager.session_summary.get('total_yawn_events', 0),
-                        'distraction_events': detector.stats_manager.session_summary.get('total_distraction_events', 0),
-                        'completed_pomodoros': detector.stats_manager.session_summary.get('completed_pomodoro_sessions', 0),
-                        'points_earned': 0  # No points earned for emergency stops
-                    }
-                    user.save_session(session_data)
-                    logging.info(f"Emergency session saved for user {current_user.id}")
+                summary = stats_manager.finish_session()
+                session_data = {
+                    'start_time': stats_manager.current_session['start_time'].isoformat(),
+                    'end_time': stats_manager.session_end_time.isoformat(),
+                    'duration_minutes': int(summary['session_duration_minutes']),
+                    'drowsy_events': summary.get('total_drowsy_events', 0),
+                    'yawn_events': summary.get('total_yawn_events', 0),
+                    'distraction_events': summary.get('total_distraction_events', 0),
+                    'completed_pomodoros': summary.get('completed_pomodoro_sessions', 0),
+                    'points_earned': 0,  # No points earned for emergency stops
+                    'average_ear': summary.get('average_ear', 0.0),
+                    'average_mar': summary.get('average_mar', 0.0),
+                    'perclos': summary.get('perclos', 0.0),
+                    'blink_count': summary.get('blink_count', 0),
+                    'blink_rate': summary.get('blink_rate', 0.0),
+                    'yawn_rate': summary.get('yawn_rate', 0.0),
+                    'session_uid': stats_manager.session_uid
+                }
+                session_finalizer.submit({
+                    'user': User.get_by_id(current_user.id),
+                    'user_id': current_user.id,
+                    'stats_manager': stats_manager,
+                    'session_data': session_data
+                })
+                logging.info(f"Emergency session queued for user {current_user.id}")
                 
             except Exception as e:
                 logging.error(f"Error saving emergency session: {str(e)}")
@@ -734,7 +819,7 @@ def emergency_stop_detection():
 # Add this code to app.py after the existing socket.io event handlers
 @socketio.on('get_visualization_data')
 @login_required
-def handle_get_visualization_data():
+def handle_get_visualization_data(data=None):
     """Handle request for visualization data"""
     detector = get_detector_for_user(current_user.id)
     
@@ -744,7 +829,12 @@ def handle_get_visualization_data():
         
     # Get visualization data
     # IMPORTANT FIX: Always pass from_db=True and user_id to ensure database is used
-    visualization_data = detector.stats_manager.get_visualization_data(from_db=True, user_id=current_user.id)
+    bucket_minutes = 5
+    if isinstance(data, dict) and data.get('bucket_minutes') in (1, 5, 15):
+        bucket_minutes = data['bucket_minutes']
+    visualization_data = detector.stats_manager.get_visualization_data(
+        from_db=True, user_id=current_user.id, bucket_minutes=bucket_minutes
+    )
     
     # Emit back to client
     emit('visualization_data', visualization_data)
@@ -1002,50 +1092,42 @@ def handle_save_gamification_data():
 @socketio.on('get_leaderboard_data')
 @login_required
 def handle_get_leaderboard_data(data=None):
-    """Handle request for leaderboard data"""
-    # Log the current user for debugging
-    logging.info(f"Leaderboard requested by: {current_user.username} (ID: {current_user.id})")
-    
-    detector = get_detector_for_user(current_user.id)
-    
-    if not detector or not detector.analytics_manager:
-        logging.error(f"Analytics manager not initialized for user {current_user.id}")
-        emit('leaderboard_data', {'error': 'Analytics manager not initialized'})
-        return
+    """
+    Handle request for one leaderboard page
     
+    Args:
+        data: Optional {'page': int, 'page_size': int, 'period': 'all' |
+            'daily' | 'weekly' | 'monthly'} (defaults to the first all-time page)
+    """
+    data = data or {}
     try:
-        # Set current user ID on the analytics manager
-        detector.analytics_manager.current_user_id = current_user.id
-        
-        # Get leaderboard data - passing None as limit to get all users
-        users = detector.analytics_manager.get_leaderboard_data(limit=None)
-        
-        # Filter out admin user if it somehow got through the SQL filter
-        users = [user for user in users if user.get('username') != 'admin']
-        
-        # Debug log about the returned users
-        logging.info(f"Returning {len(users)} users for leaderboard")
-        
-        # Check if current user is correctly marked
-        current_user_in_list = False
-        for user in users:
-            if user.get('is_current_user'):
-                current_user_in_list = True
-                logging.info(f"Current user in leaderboard data: {user['name']} (ID: {user['id']})")
-        
-        if not current_user_in_list and current_user.username != 'admin':
-            logging.warning(f"Current user {current_user.id} not marked in leaderboard data!")
-            
-            # Fix issue by manually marking the current user
-            for user in users:
-                if user['id'] == current_user.id:
-                    user['is_current_user'] = True
-                    current_user_in_list = True
-                    logging.info(f"Manually marked current user: {user['name']} (ID: {user['id']})")
-                    break
-        
-        # Emit to client
-        emit('leaderboard_data', {'users': users})
+        page_size = max(1, min(int(data.get('page_size', 5)), 100))
+        page = max(1, int(data.get('page', 1)))
+        period = data.get('period', 'all')
+        
+        if period in windowed_leaderboards.PERIODS:
+            my_rank = windowed_leaderboards.rank_of(period, current_user.id)
+            users, total = windowed_leaderboards.page(period, page, page_size, current_user_id=current_user.id)
+            around_me = windowed_leaderboards.around(period, current_user.id)
+        else:
+            period = 'all'
+            my_rank = leaderboard_service.rank_of(current_user.id)
+            users, total = leaderboard_service.page(page, page_size, current_user_id=current_user.id)
+            around_me = leaderboard_service.around(current_user.id)
+        
+        emit('leaderboard_data', {
+            'users': users,
+            'period': period,
+            'page': page,
+            'page_size': page_size,
+            'total': total,
+            'total_pages': max(1, (total + page_size - 1) // page_size),
+            'me': {
+                'rank': my_rank,
+                'page': (my_rank - 1) // page_size + 1 if my_rank else None,
+                'neighbours': around_me['neighbours']
+            }
+        })
         
     except Exception as e:
         logging.error(f"Error getting leaderboard data: {str(e)}")
@@ -1200,17 +1282,30 @@ def update_detection_settings(data):
     detector = get_detector_for_user(current_user.id)
     try:
         # Update the configuration
-        detector.detector.config.EYE_AR_THRESH = float(data.get('eye_threshold', 0.15))
-        detector.detector.config.MOUTH_AR_THRESH = float(data.get('mouth_threshold', 1.35))
+        detector.fixed_ear_thresh = float(data.get('eye_threshold', 0.15))
+        detector.fixed_mar_thresh = float(data.get('mouth_threshold', 1.35))
+        detector.detector.config.EYE_AR_THRESH = detector.fixed_ear_thresh
+        detector.detector.config.MOUTH_AR_THRESH = detector.fixed_mar_thresh
         detector.detector.config.HEAD_POSE_THRESHOLD = float(data.get('head_pose_threshold', 10.0))
         
+        # Adaptive mode is only changed when the client sends it explicitly
+        if 'adaptive_thresholds' in data:
+            detector.adaptive_thresholds = bool(data['adaptive_thresholds'])
+        
+        # Only the fixed thresholds are saved, never an adaptive override
+        settings_to_save = {
+            'eye_ar_thresh': detector.fixed_ear_thresh,
+            'mouth_ar_thresh': detector.fixed_mar_thresh,
+            'head_pose_threshold': detector.detector.config.HEAD_POSE_THRESHOLD,
+            'adaptive_thresholds': 1 if detector.adaptive_thresholds else 0
+        }
+        
+        if detector.adaptive_thresholds:
+            detector.apply_adaptive_thresholds()
+        
         # Save to user settings if authenticated
         if current_user.is_authenticated:
-            detector.save_user_settings({
-                'eye_ar_thresh': detector.detector.config.EYE_AR_THRESH,
-                'mouth_ar_thresh': detector.detector.config.MOUTH_AR_THRESH,
-                'head_pose_threshold': detector.detector.config.HEAD_POSE_THRESHOLD
-            })
+            detector.save_user_settings(settings_to_save)
         
         # Emit confirmation
         emit('settings_updated', {'status': 'success', 'message': 'Detection settings updated successfully'})
@@ -1267,9 +1362,14 @@ def get_current_settings():
     try:
         settings = {
             'detection': {
-                'eye_threshold': detector.detector.config.EYE_AR_THRESH,
-                'mouth_threshold': detector.detector.config.MOUTH_AR_THRESH,
-                'head_pose_threshold': detector.detector.config.HEAD_POSE_THRESHOLD
+                # The user's fixed thresholds (what the settings form edits)
+                'eye_threshold': detector.fixed_ear_thresh,
+                'mouth_threshold': detector.fixed_mar_thresh,
+                'head_pose_threshold': detector.detector.config.HEAD_POSE_THRESHOLD,
+                'adaptive_thresholds': detector.adaptive_thresholds,
+                # Thresholds in effect while adaptive mode is on (None when off)
+                'adaptive_eye_threshold': detector.detector.config.EYE_AR_THRESH if detector.adaptive_thresholds else None,
+                'adaptive_mouth_threshold': detector.detector.config.MOUTH_AR_THRESH if detector.adaptive_thresholds else None
             },
             'pomodoro': {
                 'work_duration': detector.pomodoro.work_duration,
@@ -1295,10 +1395,14 @@ def send_timer_updates():
     while True:
         try:
             # Check all active detector instances
-            for user_id, detector in detector_instances.items():
+            for user_id, detector in list(detector_instances.items()):
                 if detector.pomodoro and detector.pomodoro.is_active:
                     status = detector.pomodoro.get_timer_status()
                     socketio.emit('pomodoro_update', status, room=user_id)
+                
+                # Write-behind: persist gamification changes periodically
+                if detector.achievement_manager:
+                    detector.achievement_manager.flush_if_due()
         except Exception as e:
             logging.error(f"Error sending timer updates: {str(e)}")
         socketio.sleep(1)  # Update every second
@@ -1333,72 +1437,39 @@ def create_test_data(force=False):
 @app.route('/api/export_session_history')
 @login_required
 def export_session_history():
-    """Export session history as Excel file"""
+    """
+    Export the full session history as a streamed download
+    
+    Query args:
+        format: 'xlsx' (default), 'csv' or 'ndjson'
+    """
     if not current_user.is_authenticated:
         return {"error": "User not authenticated"}, 401
+    
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format not in session_export.FORMATS:
+        return {"error": f"Unsupported export format: {export_format}"}, 400
         
     try:
-        # Get session history for the current user
         user = User.get_by_id(current_user.id)
         if not user:
             return {"error": "User not found"}, 404
-            
-        # Get all session history
-        sessions = user.get_session_history(limit=100)  # Increase limit to get more history
-        
-        # Prepare data for export
-        export_data = []
-        for session in sessions:
-            # Format timestamps
-            start_time = session.get('start_time')
-            if isinstance(start_time, datetime):
-                start_time = start_time.strftime('%Y-%m-%d %H:%M:%S')
-                
-            end_time = session.get('end_time')
-            if isinstance(end_time, datetime):
-                end_time = end_time.strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Create a row for the export
-            export_row = {
-                'Date': start_time,
-                'End Time': end_time,
-                'Duration (minutes)': session.get('duration_minutes', 0),
-                'Drowsy Events': session.get('drowsy_events', 0),
-                'Yawn Events': session.get('yawn_events', 0),
-                'Distraction Events': session.get('distraction_events', 0),
-                'Completed Pomodoros': session.get('completed_pomodoros', 0),
-                'Points Earned': session.get('points_earned', 0)
-            }
-            export_data.append(export_row)
-            
-        # Create a DataFrame
-        df = pd.DataFrame(export_data)
-        
-        # Create Excel file in memory
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, sheet_name='Session History', index=False)
-            
-            # Auto-adjust columns' width
-            worksheet = writer.sheets['Session History']
-            for i, col in enumerate(df.columns):
-                # Get maximum column width
-                column_len = max(df[col].astype(str).map(len).max(), len(col))
-                worksheet.set_column(i, i, column_len + 2)  # Set width with padding
         
-        output.seek(0)
+        # Every session, read in batches and written out as it arrives
+        chunks = session_export.stream_export(user.iter_sessions(), export_format)
         
-        # Generate filename with timestamp
+        mimetype, extension = session_export.FORMATS[export_format]
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"focus_guard_sessions_{timestamp}.xlsx"
-        
-        # Return the Excel file
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
+        filename = f"focus_guard_sessions_{timestamp}.{extension}"
+        
+        response = Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
         )
+        # Removes the XLSX temp file even if the body is never sent
+        response.call_on_close(chunks.close)
+        return response
         
     except Exception as e:
         logging.error(f"Error exporting session history: {str(e)}")
@@ -1409,6 +1480,25 @@ def export_session_history():
 # Then in the main block, add:
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
+    
+    # Per-user shard mode: move rows still in the main database to the shards
+    if shards.ENABLED:
+        shards.shard_existing_users()
+    
+    # Save sessions cut short by a crash from their last checkpoint
+    session_finalizer.recover()
+    
+    # One-time full VACUUM to incremental auto_vacuum, before any request
+    if retention.CONVERT_AUTO_VACUUM:
+        retention_job.convert_all()
+    
+    # Re-encode visualization data still stored as JSON, off the request path
+    visualization_blob.start_background_migration()
+    retention_job.start()
+    
+    # Username / email availability checks are answered from memory once loaded
+    account_index.start_background_load()
+    
     socketio.start_background_task(send_timer_updates)
     
     # Add this line to create test data
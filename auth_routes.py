@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, session
 from flask_login import login_user, logout_user, login_required, current_user
 from models.user import User
+from utils.account_index import account_index
 import logging
 import re
 
@@ -177,11 +178,12 @@ def check_username():
     if not is_valid_username(username):
         return jsonify({'available': False, 'message': 'Invalid username format'}), 400
     
-    user = User.get_by_username(username)
+    # Answered from memory; no database query while the user types
+    taken = account_index.username_taken(username)
     
     return jsonify({
-        'available': user is None,
-        'message': 'Username available' if user is None else 'Username already taken'
+        'available': not taken,
+        'message': 'Username already taken' if taken else 'Username available'
     })
 
 @auth_bp.route('/api/auth/check-email', methods=['POST'])
@@ -197,11 +199,11 @@ def check_email():
     if not is_valid_email(email):
         return jsonify({'available': False, 'message': 'Invalid email format'}), 400
     
-    user = User.get_by_email(email)
+    taken = account_index.email_taken(email)
     
     return jsonify({
-        'available': user is None,
-        'message': 'Email available' if user is None else 'Email already registered'
+        'available': not taken,
+        'message': 'Email already registered' if taken else 'Email available'
     })
 
 @auth_bp.route('/forgot-password')
@@ -0,0 +1,132 @@
+"""
+Username / email availability checks: SQLite lookups vs the account index
+
+Seeds a throwaway database with synthetic accounts (default one million)
+and times the registration form's availability checks three ways: the
+old per-call query (User.get_by_username / get_by_email), the in-memory
+AccountIndex, and the AccountIndex in Bloom filter mode. Reports load
+time, memory held by the index, per-check latency (p50 / p99) and, for
+the Bloom filters, how many checks of available names still needed a
+confirming query. Exits non-zero if any method disagrees with another.
+
+Usage:
+    python -m benchmarks.account_index [--accounts 1000000] [--checks 20000]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def timed_checks(check, queries):
+    """Return (answers, per-check latencies) of check(kind, value) over queries"""
+    answers, latencies = [], []
+    for kind, value in queries:
+        start = time.perf_counter()
+        answers.append(check(kind, value))
+        latencies.append(time.perf_counter() - start)
+    return answers, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--accounts', type=int, default=1000000)
+    parser.add_argument('--checks', type=int, default=20000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    root = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app's database path is relative to the working directory
+        os.chdir(tmp)
+        try:
+            from models.database import close_connections
+            from models.user import User, init_db
+            from utils.account_index import AccountIndex
+            from utils.test_data import create_bulk_test_data
+
+            init_db()
+            start = time.perf_counter()
+            create_bulk_test_data(users=args.accounts, sessions_per_user=0, events=False, batch_users=20000)
+            seed_seconds = time.perf_counter() - start
+
+            # Half taken, half available, as while someone types a name
+            rng = random.Random(5)
+            queries = []
+            for i in range(args.checks):
+                account = rng.randint(1, args.accounts)
+                kind = 'username' if i % 2 else 'email'
+                if rng.random() < 0.5:
+                    value = f"synthetic{account}" if kind == 'username' else f" Synthetic{account}@Example.com"
+                else:
+                    value = f"newuser{account}" if kind == 'username' else f"newuser{account}@example.com"
+                queries.append((kind, value))
+
+            def sql_check(kind, value):
+                if kind == 'username':
+                    return User.get_by_username(value.strip()) is not None
+                return User.get_by_email(value.strip().lower()) is not None
+
+            results = {'sqlite query': timed_checks(sql_check, queries) + (None, None)}
+
+            for label, bloom in (('account index', False), ('index + Bloom', True)):
+                index = AccountIndex(bloom=bloom)
+                start = time.perf_counter()
+                index.reload()
+                load_seconds = time.perf_counter() - start
+                # Memory from a second load: tracing would distort the timing
+                tracemalloc.start()
+                index.reload()
+                memory = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+
+                confirmations = []
+                index._confirm = (lambda confirm: lambda column, value: confirmations.append(value)
+                                  or confirm(column, value))(index._confirm)
+
+                def index_check(kind, value, index=index):
+                    return index.username_taken(value) if kind == 'username' else index.email_taken(value)
+
+                answers, latencies = timed_checks(index_check, queries)
+                false_positives = len(confirmations) - sum(answers)
+                results[label] = (answers, latencies, (load_seconds, memory), false_positives if bloom else None)
+            close_connections()
+        finally:
+            os.chdir(root)
+
+    reference = results['sqlite query'][0]
+    available = reference.count(False)
+    print(f"Accounts:                 {args.accounts:,} (seeded in {seed_seconds:.1f} s)")
+    print(f"Checks:                   {len(queries):,} ({available:,} available)")
+    print(f"{'':<22}{'free p50':>10}{'taken p50':>10}{'p99 us':>9}{'load s':>9}{'memory MiB':>12}")
+    mismatches = 0
+    for label, (answers, latencies, load, false_positives) in results.items():
+        mismatches += sum(answer != expected for answer, expected in zip(answers, reference))
+        free = [latency for latency, taken in zip(latencies, reference) if not taken]
+        taken = [latency for latency, taken in zip(latencies, reference) if taken]
+        load_text = f"{load[0]:>9.2f}{load[1] / 2 ** 20:>12.1f}" if load else f"{'-':>9}{'-':>12}"
+        print(f"{label + ':':<22}{percentile(free, 0.5) * 1e6:>10.2f}{percentile(taken, 0.5) * 1e6:>10.2f}"
+              f"{percentile(latencies, 0.99) * 1e6:>9.2f}{load_text}")
+        if false_positives is not None:
+            print(f"{'':<26}Bloom false positives: {false_positives} of {available} available "
+                  f"({false_positives / max(1, available):.2%}), each confirmed by one query")
+    print("(latencies in microseconds; 'free' = name available)")
+    print(f"Disagreements:            {mismatches}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# benchmarks/checkpoint_overhead.py
+"""
+CPU overhead of periodic session checkpoints
+
+Feeds StatisticsManager simulated 30 FPS frames (with a detection event
+every few seconds), takes a checkpoint at every simulated interval and
+reports the CPU time spent checkpointing as a share of one core over the
+simulated session. Runs against a throwaway database in a temp directory.
+Exits non-zero if the overhead reaches the budget.
+
+Usage:
+    python -m benchmarks.checkpoint_overhead [--minutes 30] [--budget 1.0]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--minutes', type=int, default=30, help='Simulated session length')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--event-every', type=float, default=5.0, help='Seconds between detection events')
+    parser.add_argument('--budget', type=float, default=1.0, help='Maximum CPU share in percent')
+    args = parser.parse_args()
+
+    root = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app's database path is relative to the working directory
+        os.chdir(tmp)
+        try:
+            from models.database import close_connections, get_connection
+            from models.user import User, init_db
+            from utils.statistics_manager import StatisticsManager
+
+            logging.disable(logging.INFO)
+            init_db()
+            user = User.create('bench', 'bench@example.com', 'Bench', 'x')
+            manager = StatisticsManager()
+            manager.user_id = user.id
+            interval = manager.CHECKPOINT_INTERVAL_SECONDS
+            # Time is simulated, so only explicit checkpoints run
+            manager.CHECKPOINT_INTERVAL_SECONDS = float('inf')
+            manager.EVENT_FLUSH_SECONDS = float('inf')
+
+            rng = random.Random(3)
+            frames = args.minutes * 60 * args.fps
+            frames_per_checkpoint = int(interval * args.fps)
+            frames_per_event = max(1, int(args.event_every * args.fps))
+
+            frame_cpu = 0.0
+            checkpoint_cpu = 0.0
+            checkpoints = 0
+            for frame in range(frames):
+                in_event = frame % frames_per_event < 3
+                metrics = {
+                    'ear': rng.gauss(0.28, 0.03),
+                    'mar': rng.gauss(0.4, 0.1),
+                    'drowsy': in_event,
+                    'yawning': False,
+                    'distracted': False,
+                    'head_pose': 'Forward'
+                }
+                start = time.process_time()
+                manager.update_metrics(metrics)
+                frame_cpu += time.process_time() - start
+
+                if (frame + 1) % frames_per_checkpoint == 0:
+                    start = time.process_time()
+                    assert manager.checkpoint(), "checkpoint failed"
+                    checkpoint_cpu += time.process_time() - start
+                    checkpoints += 1
+
+            stored = get_connection().execute("SELECT COUNT(*) FROM session_checkpoints").fetchone()[0]
+            events = get_connection().execute("SELECT COUNT(*) FROM session_events").fetchone()[0]
+            close_connections()
+        finally:
+            os.chdir(root)
+
+    session_seconds = frames / args.fps
+    overhead = checkpoint_cpu / session_seconds * 100.0
+
+    print(f"Simulated session:        {args.minutes} min at {args.fps} FPS ({frames} frames)")
+    print(f"Checkpoint interval:      {interval:.0f} s ({checkpoints} checkpoints, {stored} stored, {events} events)")
+    print(f"update_metrics CPU:       {frame_cpu * 1000.0 / frames:8.3f} ms per frame")
+    print(f"Checkpoint CPU:           {checkpoint_cpu * 1000.0 / max(1, checkpoints):8.3f} ms per checkpoint")
+    print(f"Checkpoint overhead:      {overhead:8.4f} % of one core (budget {args.budget}%)")
+
+    return 0 if overhead < args.budget else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
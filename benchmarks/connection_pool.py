@@ -0,0 +1,116 @@
+# benchmarks/connection_pool.py
+"""
+Connection reuse when every request runs on a new thread
+
+Flask-SocketIO in threading mode handles each HTTP request and Socket.IO
+event on a fresh thread. This runs that pattern against a throwaway
+database: each simulated request starts its own thread, loads a user and
+its session history, and ends with release_connections() (what the app's
+teardown_appcontext does). Reports per-request latency and how many
+SQLite connections were opened, against opening a fresh connection per
+request. Exits non-zero if connections were not reused across threads.
+
+Usage:
+    python -m benchmarks.connection_pool [--requests 2000] [--concurrency 8]
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_requests(handler, requests, concurrency):
+    """Run handler once per request, each on a new thread, concurrency at a time"""
+    latencies = []
+    lock = threading.Lock()
+
+    def request():
+        start = time.perf_counter()
+        handler()
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    for first in range(0, requests, concurrency):
+        threads = [threading.Thread(target=request) for _ in range(min(concurrency, requests - first))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    root = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app's database path is relative to the working directory
+        os.chdir(tmp)
+        try:
+            from models import database
+            from models.user import User, init_db
+            from utils.test_data import create_bulk_test_data
+
+            init_db()
+            create_bulk_test_data(users=200, sessions_per_user=10, events=False)
+            database.close_connections()
+
+            opened = []
+            open_connection = database._open
+            database._open = lambda path, read_only: opened.append(path) or open_connection(path, read_only)
+
+            def pooled_request():
+                try:
+                    user = User.get_by_id(1 + len(opened) % 200)
+                    user.get_session_history(limit=10)
+                finally:
+                    database.release_connections()
+
+            def fresh_request():
+                # What every request paid before: connect plus the PRAGMAs
+                conn = open_connection(database.DB_PATH, read_only=True)
+                try:
+                    conn.execute("SELECT * FROM users WHERE id = 1").fetchone()
+                    conn.execute(
+                        "SELECT * FROM user_sessions WHERE user_id = 1 ORDER BY start_time DESC LIMIT 10"
+                    ).fetchall()
+                finally:
+                    conn.close()
+
+            pooled = run_requests(pooled_request, args.requests, args.concurrency)
+            fresh = run_requests(fresh_request, args.requests, args.concurrency)
+            database._open = open_connection
+            database.close_connections()
+        finally:
+            os.chdir(root)
+
+    print(f"Requests:                 {args.requests:,} on new threads, {args.concurrency} at a time")
+    print(f"SQLite:                   {sqlite3.sqlite_version}")
+    print(f"{'':<26}{'p50 ms':>9}{'p99 ms':>9}")
+    for label, latencies in (('fresh connection', fresh), ('shared pool', pooled)):
+        print(f"{label + ':':<26}{percentile(latencies, 0.5) * 1e3:>9.3f}{percentile(latencies, 0.99) * 1e3:>9.3f}")
+    print(f"Connections opened:       {len(opened)} (pool) vs {args.requests} (fresh)")
+
+    # Every request after the first few must reuse a connection
+    limit = 2 * args.concurrency * 2
+    return 0 if len(opened) <= limit else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
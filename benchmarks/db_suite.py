@@ -0,0 +1,242 @@
+"""
+Database benchmark suite over the app's real data-access entry points
+
+For each database size (sessions) a throwaway database is seeded with
+utils.test_data.create_bulk_test_data() and these calls are timed:
+
+    load_user        User.get_by_id (the Flask-Login user_loader)
+    history          User.get_session_history(limit=10)
+    leaderboard      AnalyticsManager.get_leaderboard_data(limit=10)
+    save_session     StatisticsManager.save_session_to_db(user_id)
+    save_profile     AchievementManager.save_profile() after add_points()
+    export           export_session_history (CSV); where app.py cannot be
+                     imported (e.g. OpenCV missing) the same calls the
+                     route makes: session_export.stream_export(user.iter_sessions())
+
+Each size runs in its own process and temp directory, fully offline.
+Reports p50 / p99 latency and rows per second per call, and writes the
+results as JSON (with the git commit, Python and SQLite versions) so runs
+can be diffed between commits with --compare.
+
+Usage:
+    python -m benchmarks.db_suite [--sessions 1000 100000 1000000] [--calls 200]
+                                  [--output db_suite.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ROOT = Path(__file__).resolve().parent.parent
+SESSIONS_PER_USER = 10
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(call, arguments):
+    """
+    Time call(argument) for every argument
+
+    call returns the number of rows it read or wrote.
+
+    Returns:
+        dict: calls, p50_ms, p99_ms, rows_per_second
+    """
+    latencies, rows = [], 0
+    for argument in arguments:
+        start = time.perf_counter()
+        rows += call(argument)
+        latencies.append(time.perf_counter() - start)
+    return {
+        'calls': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.5) * 1e3, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1e3, 4),
+        'rows_per_second': round(rows / sum(latencies), 1)
+    }
+
+
+def export_call():
+    """
+    Return (label, function(user) -> bytes written) for the session export
+    """
+    from utils import session_export
+
+    try:
+        import app as web_app
+        from flask_login import login_user
+    except ImportError as e:
+        def export(user):
+            return sum(len(chunk) for chunk in session_export.stream_export(user.iter_sessions(), 'csv'))
+        return f"stream_export (app.py not importable: {e})", export
+
+    def export(user):
+        with web_app.app.test_request_context('/api/export_session_history?format=csv'):
+            login_user(user)
+            response = web_app.export_session_history()
+            return sum(len(chunk) for chunk in response.response)
+    return 'export_session_history', export
+
+
+def run_size(sessions, calls, seed):
+    """Seed a database with about this many sessions and time every entry point"""
+    root = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app's database path is relative to the working directory
+        os.chdir(tmp)
+        try:
+            from models.database import close_connections, get_read_connection
+            from models.user import User, init_db
+            from utils.achievement_manager import AchievementManager
+            from utils.analytics_manager import AnalyticsManager
+            from utils.statistics_manager import StatisticsManager
+            from utils.test_data import create_bulk_test_data
+
+            logging.disable(logging.INFO)
+            init_db()
+            start = time.perf_counter()
+            counts = create_bulk_test_data(users=max(10, sessions // SESSIONS_PER_USER),
+                                           sessions_per_user=SESSIONS_PER_USER, seed=seed, events=False)
+            seed_seconds = time.perf_counter() - start
+
+            rng = random.Random(seed)
+            user_ids = [row[0] for row in get_read_connection().execute("SELECT id FROM users")]
+            users = [User.get_by_id(user_id) for user_id in rng.sample(user_ids, min(calls, len(user_ids)))]
+            sample = [rng.choice(users) for _ in range(calls)]
+            session_counts = dict(get_read_connection().execute(
+                "SELECT user_id, COUNT(*) FROM user_sessions GROUP BY user_id"
+            ).fetchall())
+            results = {}
+
+            results['load_user'] = measure(lambda user: 1 if User.get_by_id(user.id) else 0, sample)
+            results['history'] = measure(lambda user: len(user.get_session_history(limit=10)), sample)
+
+            analytics_manager = AnalyticsManager()
+            results['leaderboard'] = measure(
+                lambda user: len(analytics_manager.get_leaderboard_data(limit=10)), sample
+            )
+
+            # One finished session per call; a fresh uid each time, as every
+            # real session has its own
+            statistics_manager = StatisticsManager()
+            for frame in range(300):
+                statistics_manager.update_metrics({'ear': 0.28, 'mar': 0.4, 'drowsy': frame % 100 < 3})
+
+            def save_session(user):
+                statistics_manager.session_uid = uuid.uuid4().hex
+                return 1 if statistics_manager.save_session_to_db(user.id) else 0
+
+            results['save_session'] = measure(save_session, sample)
+
+            # Managers loaded and saved once first, so the timed saves are the
+            # steady state (a few changed settings), not the first full write
+            managers = {user.id: AchievementManager(user.id, save_dir=os.path.join(tmp, 'gamification'))
+                        for user in users}
+            for manager in managers.values():
+                manager.save_profile()
+
+            def save_profile(user):
+                manager = managers[user.id]
+                manager.add_points(10, "benchmark")
+                return 1 if manager.save_profile() else 0
+
+            results['save_profile'] = measure(save_profile, sample)
+
+            export_label, export = export_call()
+
+            def export_rows(user):
+                export(user)
+                return session_counts.get(user.id, 0)
+
+            results['export'] = measure(export_rows, sample[:max(1, calls // 4)])
+            results['export']['entry_point'] = export_label
+            close_connections()
+        finally:
+            os.chdir(root)
+
+    return {
+        'users': counts['users'],
+        'sessions': counts['sessions'],
+        'seed_seconds': round(seed_seconds, 2),
+        'benchmarks': results
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """Print each p50 / p99 as a ratio of the baseline run"""
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'}:")
+    for size, result in report['sizes'].items():
+        old_size = baseline.get('sizes', {}).get(size)
+        if not old_size:
+            continue
+        for name, current in result['benchmarks'].items():
+            old = old_size['benchmarks'].get(name)
+            if old and old['p50_ms'] and old['p99_ms']:
+                print(f"{size:>9}  {name:<14} p50 x{current['p50_ms'] / old['p50_ms']:5.2f}  "
+                      f"p99 x{current['p99_ms'] / old['p99_ms']:5.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--calls', type=int, default=200, help='Calls per entry point (exports: a quarter)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='db_suite.json', help='JSON results file')
+    parser.add_argument('--compare', help='Earlier JSON results to compare against')
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'sizes': {}
+    }
+    for sessions in args.sessions:
+        # A fresh process per size: module-level caches and pooled
+        # connections never carry over from the previous database
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            report['sizes'][str(sessions)] = executor.submit(run_size, sessions, args.calls, args.seed).result()
+
+    print(f"{'sessions':>9}  {'entry point':<14} {'p50 ms':>9} {'p99 ms':>9} {'rows/s':>12}")
+    for size, result in report['sizes'].items():
+        for name, stats in result['benchmarks'].items():
+            print(f"{result['sessions']:>9}  {name:<14} {stats['p50_ms']:>9.3f} {stats['p99_ms']:>9.3f} "
+                  f"{stats['rows_per_second']:>12,.0f}")
+    export_entry = next(iter(report['sizes'].values()))['benchmarks']['export']['entry_point']
+    print(f"\nexport measured through: {export_entry}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
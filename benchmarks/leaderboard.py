@@ -0,0 +1,103 @@
+# benchmarks/leaderboard.py
+"""
+Compare the per-request cost of the old leaderboard query with the
+in-memory LeaderboardService
+
+The old handler sorted every active user in SQL and scanned the result in
+Python to find the current user. The service is loaded once and then
+serves a page, "my rank" and neighbours, and absorbs point updates.
+
+Run from the repository root:
+    python -m benchmarks.leaderboard --users 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import get_connection, close_connections
+from models.migrations import migrate
+from utils.leaderboard import LeaderboardService
+from utils.test_data import create_bulk_test_data
+
+
+def old_request(conn, user_id):
+    """What handle_get_leaderboard_data used to do per request"""
+    rows = conn.execute('''
+        SELECT u.id, u.username, u.full_name,
+            s.profile_points, s.profile_level, s.daily_streak, s.pomodoro_streak
+        FROM users u
+        JOIN user_settings s ON u.id = s.user_id
+        WHERE u.is_active = 1 AND u.username != 'admin'
+        ORDER BY s.profile_points DESC
+        LIMIT -1
+    ''').fetchall()
+    users = [
+        {'id': row['id'], 'name': row['full_name'], 'points': row['profile_points'] or 0,
+         'is_current_user': row['id'] == user_id}
+        for row in rows
+    ]
+    return next((i + 1 for i, user in enumerate(users) if user['is_current_user']), None)
+
+
+def new_request(service, user_id):
+    """What handle_get_leaderboard_data does now per request"""
+    service.page(1, 5, current_user_id=user_id)
+    service.around(user_id)
+    return service.rank_of(user_id)
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--sessions-per-user', type=float, default=2)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'leaderboard.db')
+        migrate(path)
+        create_bulk_test_data(users=args.users, sessions_per_user=args.sessions_per_user, seed=7,
+                              events=False, path=path)
+        conn = get_connection(path)
+
+        user_ids = [rng.randint(1, args.users) for _ in range(args.requests)]
+        old_ms = timed(lambda: old_request(conn, rng.choice(user_ids)), max(1, args.requests // 20))
+
+        service = LeaderboardService(path)
+        start = time.perf_counter()
+        service.reload()
+        load_ms = (time.perf_counter() - start) * 1000.0
+
+        # Sanity check: every sampled user is on the leaderboard
+        for user_id in user_ids[:5]:
+            assert service.rank_of(user_id) is not None
+
+        new_ms = timed(lambda: new_request(service, rng.choice(user_ids)), args.requests)
+        update_ms = timed(
+            lambda: service.update_user(rng.randint(1, args.users), points=rng.randint(0, 50000)),
+            args.requests
+        )
+        close_connections()
+
+    print(f"Users:                         {args.users}")
+    print(f"Old request (SQL sort + scan): {old_ms:9.3f} ms")
+    print(f"Service load (once):           {load_ms:9.3f} ms")
+    print(f"Service request (page + rank): {new_ms:9.3f} ms")
+    print(f"Service point update:          {update_ms:9.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+# benchmarks/query_plans.py
+"""
+Check that the hot queries are served by the indexes added in migrations
+
+Migrates a throwaway database, seeds it and asserts on EXPLAIN QUERY PLAN
+output for the session history, finalize and leaderboard queries. Exits
+non-zero if any query falls back to a full scan or a temporary sort.
+
+Run from the repository root:
+    python -m benchmarks.query_plans
+"""
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import get_connection, close_connections
+from models.migrations import migrate
+
+# name -> (sql, params, index that must appear in the plan)
+# Queries named in SMALL_GROUP_BY group by a computed key (e.g. hour of day),
+# which no index can order, so a temporary b-tree for GROUP BY is expected
+QUERIES = {
+    'session history': (
+        '''SELECT * FROM user_sessions
+           WHERE user_id = ?
+           ORDER BY start_time DESC
+           LIMIT ?''',
+        (7, 10),
+        'idx_user_sessions_user_start'
+    ),
+    'session history (keyset page)': (
+        '''SELECT id, start_time, duration_minutes, points_earned FROM user_sessions
+           WHERE user_id = ? AND (start_time, id) < (?, ?)
+           ORDER BY start_time DESC, id DESC
+           LIMIT ?''',
+        (7, '2025-01-15T00:00:00', 10**9, 10),
+        'idx_user_sessions_user_start'
+    ),
+    'finalize (pending visualization)': (
+        '''SELECT id FROM user_sessions
+           WHERE user_id = ? AND visualization_data IS NULL
+           ORDER BY start_time DESC LIMIT 1''',
+        (7,),
+        'idx_user_sessions_pending_viz'
+    ),
+    'latest visualization': (
+        '''SELECT * FROM user_sessions
+           WHERE user_id = ? AND length(visualization_data) > 0
+           ORDER BY start_time DESC
+           LIMIT 1''',
+        (7,),
+        'idx_user_sessions_user_start'
+    ),
+    'visualization migration batch': (
+        '''SELECT id, visualization_data FROM user_sessions
+           WHERE id > ? AND typeof(visualization_data) = 'text'
+           ORDER BY id LIMIT ?''',
+        (0, 200),
+        'INTEGER PRIMARY KEY'
+    ),
+    'profile summary': (
+        '''SELECT COUNT(*), SUM(duration_minutes), SUM(points_earned), SUM(completed_pomodoros),
+               SUM(drowsy_events), SUM(yawn_events), SUM(distraction_events)
+           FROM user_sessions
+           WHERE user_id = ?''',
+        (7,),
+        'COVERING INDEX idx_user_sessions_user_totals'
+    ),
+    'events by hour of day': (
+        '''SELECT CAST(strftime('%H', occurred_at) AS INTEGER) AS hour, COUNT(*)
+           FROM session_events
+           WHERE user_id = ? AND event_type = ? AND occurred_at >= ?
+           GROUP BY hour''',
+        (7, 'drowsy', '2025-01-01'),
+        'COVERING INDEX idx_session_events_user_type_time'
+    ),
+    'stats buckets (sessions)': (
+        '''SELECT date(start_time) AS bucket_start, COUNT(*), SUM(duration_minutes),
+               SUM(points_earned), SUM(completed_pomodoros)
+           FROM user_sessions
+           WHERE user_id = ? AND start_time >= ? AND start_time < ?
+           GROUP BY bucket_start''',
+        (7, '2025-01-01', '2025-02-01'),
+        'idx_user_sessions_user_start'
+    ),
+    'stats buckets (events)': (
+        '''SELECT date(occurred_at) AS bucket_start, event_type, COUNT(*)
+           FROM session_events
+           WHERE user_id = ? AND event_type IN ('drowsy', 'yawn', 'distraction')
+               AND occurred_at >= ? AND occurred_at < ?
+           GROUP BY bucket_start, event_type''',
+        (7, '2025-01-01', '2025-02-01'),
+        'COVERING INDEX idx_session_events_user_type_time'
+    ),
+    'stats buckets (compacted events)': (
+        '''SELECT date(hour) AS bucket_start, event_type, SUM(events)
+           FROM user_event_hourly
+           WHERE user_id = ? AND event_type IN ('drowsy', 'yawn', 'distraction')
+               AND hour >= ? AND hour < ?
+           GROUP BY bucket_start, event_type''',
+        (7, '2025-01-01', '2025-02-01'),
+        'PRIMARY KEY'
+    ),
+    'retention: compact events': (
+        '''SELECT event_type, strftime('%Y-%m-%dT%H:00:00', occurred_at) AS hour, COUNT(*)
+           FROM session_events
+           WHERE user_id = ? AND occurred_at < ?
+           GROUP BY event_type, hour''',
+        (7, '2025-01-01'),
+        'COVERING INDEX idx_session_events_user_type_time'
+    ),
+    'retention: expired visualization': (
+        '''SELECT id, start_time, visualization_data FROM user_sessions
+           WHERE user_id = ? AND start_time < ? AND length(visualization_data) > 0
+           LIMIT ?''',
+        (7, '2025-01-01', 200),
+        'idx_user_sessions_user_start'
+    ),
+    'leaderboard': (
+        '''SELECT u.id, u.username, u.full_name,
+               s.profile_points, s.profile_level, s.daily_streak, s.pomodoro_streak
+           FROM users u
+           JOIN user_settings s ON u.id = s.user_id
+           WHERE u.is_active = 1 AND u.username != 'admin'
+           ORDER BY s.profile_points DESC
+           LIMIT ?''',
+        (10,),
+        'idx_user_settings_points'
+    ),
+}
+
+
+SMALL_GROUP_BY = {
+    'events by hour of day', 'stats buckets (sessions)', 'stats buckets (events)',
+    'stats buckets (compacted events)', 'retention: compact events'
+}
+
+
+def seed(conn, users=500, sessions_per_user=20):
+    """Fill the database with sessions (the app never runs ANALYZE, so neither do we)"""
+    rng = random.Random(42)
+    conn.executemany(
+        "INSERT INTO users (id, username, email, full_name, password_hash) VALUES (?, ?, ?, ?, 'x')",
+        [(i, f"user{i}", f"user{i}@example.com", f"User {i}") for i in range(1, users + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO user_settings (user_id, profile_points) VALUES (?, ?)",
+        [(i, rng.randint(0, 10000)) for i in range(1, users + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO user_sessions (user_id, start_time, visualization_data) VALUES (?, ?, ?)",
+        [
+            (i, f"2025-01-{(s % 28) + 1:02d}T{s % 24:02d}:00:00", None if s == 0 else '{}')
+            for i in range(1, users + 1)
+            for s in range(sessions_per_user)
+        ]
+    )
+    conn.commit()
+
+
+def query_plan(conn, sql, params):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'plans.db')
+        version = migrate(path)
+        conn = get_connection(path)
+        seed(conn)
+        print(f"Schema version {version}")
+
+        for name, (sql, params, index) in QUERIES.items():
+            plan = query_plan(conn, sql, params)
+            problems = []
+            if not any(index in detail for detail in plan):
+                problems.append(f"does not use {index}")
+            if any('TEMP B-TREE' in detail for detail in plan
+                   if not (name in SMALL_GROUP_BY and detail.endswith('FOR GROUP BY'))):
+                problems.append("sorts in a temporary b-tree")
+            if any(detail.startswith('SCAN') and 'USING' not in detail for detail in plan):
+                problems.append("does a full table scan")
+
+            status = 'FAIL' if problems else 'ok'
+            print(f"[{status}] {name}")
+            for detail in plan:
+                print(f"       {detail}")
+            for problem in problems:
+                print(f"       -> {problem}")
+            failures += bool(problems)
+
+        close_connections()
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
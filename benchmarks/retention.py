@@ -0,0 +1,144 @@
+"""
+Retention job: space reclaimed, directory scans and preserved statistics
+
+Seeds a throwaway database (in a temp directory) with a year of sessions,
+detection events and visualization blobs plus a directory of legacy
+session_stats_*.json files, runs RetentionJob once and reports database
+size, file count and the cost of the file-history scan before and after.
+Exits non-zero if the bucketed stats or the events-by-hour counts change
+(events older than the retention window must survive as hourly counts).
+
+Usage:
+    python -m benchmarks.retention [--users 50] [--days 365] [--files 2000]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--files', type=int, default=2000)
+    args = parser.parse_args()
+
+    root = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app's database path is relative to the working directory
+        os.chdir(tmp)
+        try:
+            from models import analytics
+            from models.database import DB_PATH, close_connections, get_connection
+            from models.migrations import migrate
+            from utils.retention import RetentionJob
+            from utils.statistics_manager import StatisticsManager
+            from utils.visualization_blob import VisualizationBlob
+
+            logging.disable(logging.INFO)
+            migrate()
+            conn = get_connection()
+            rng = random.Random(5)
+            now = datetime(2025, 12, 31, 23, 0)
+            first_day = now - timedelta(days=args.days)
+
+            conn.executemany(
+                "INSERT INTO users (id, username, email, full_name, password_hash) VALUES (?, ?, ?, ?, 'x')",
+                [(i, f"user{i}", f"user{i}@example.com", f"User {i}") for i in range(1, args.users + 1)]
+            )
+            sessions, events = [], []
+            for user_id in range(1, args.users + 1):
+                for day in range(args.days):
+                    start = first_day + timedelta(days=day, hours=rng.randint(8, 20))
+                    uid = f"{user_id}-{day}"
+                    timeline = [{'time': (start + timedelta(minutes=5 * i)).strftime('%H:%M'),
+                                 'drowsy': rng.randint(0, 3), 'yawn': rng.randint(0, 2), 'distraction': rng.randint(0, 4)}
+                                for i in range(12)]
+                    blob = VisualizationBlob.encode({'timeline': timeline, 'distribution': [], 'historical': [],
+                                                     'session_info': {'duration': 60}})
+                    sessions.append((user_id, start.isoformat(), 60, uid, blob))
+                    for _ in range(rng.randint(5, 30)):
+                        offset = rng.uniform(0, 3600)
+                        events.append((uid, user_id, rng.choice(('drowsy', 'yawn', 'distraction')),
+                                       (start + timedelta(seconds=offset)).isoformat(), offset))
+            conn.executemany(
+                "INSERT INTO user_sessions (user_id, start_time, duration_minutes, session_uid, visualization_data) "
+                "VALUES (?, ?, ?, ?, ?)", sessions
+            )
+            conn.executemany(
+                "INSERT INTO session_events (session_uid, user_id, event_type, occurred_at, offset_seconds) "
+                "VALUES (?, ?, ?, ?, ?)", events
+            )
+            conn.commit()
+
+            stats_dir = Path('statistics')
+            stats_dir.mkdir()
+            for index in range(args.files):
+                ended = now - timedelta(hours=index * 6)
+                file_path = stats_dir / f"session_stats_{ended.strftime('%Y%m%d_%H%M%S')}.json"
+                file_path.write_text('{"session_summary": {"session_duration_minutes": 30}}')
+                os.utime(file_path, (ended.timestamp(), ended.timestamp()))
+
+            def snapshot():
+                start, end = first_day.isoformat(), now.isoformat()
+                return (
+                    [analytics.get_bucketed_stats(user_id, start, end, bucket)
+                     for user_id in (1, args.users) for bucket in ('day', 'week')],
+                    [StatisticsManager.get_event_counts_by_hour(user_id, event_type, days=args.days + 30)
+                     for user_id in (1, args.users) for event_type in ('drowsy', 'yawn', 'distraction')]
+                )
+
+            def scan_seconds():
+                manager = StatisticsManager()
+                started = time.perf_counter()
+                for _ in range(20):
+                    manager._get_historical_sessions_from_files()
+                return (time.perf_counter() - started) / 20
+
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            size_before = os.path.getsize(DB_PATH)
+            files_before = len(list(stats_dir.iterdir()))
+            scan_before = scan_seconds()
+            stats_before = snapshot()
+            analytics._stats_cache.clear()
+
+            job = RetentionJob(archive_dir='archive')
+            job.PAUSE_SECONDS = 0
+            started = time.perf_counter()
+            report = job.run_once(now=now)
+            run_seconds = time.perf_counter() - started
+
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            size_after = os.path.getsize(DB_PATH)
+            files_after = len(list(stats_dir.iterdir()))
+            scan_after = scan_seconds()
+            stats_after = snapshot()
+            archives = sorted(path.name for path in Path('archive').iterdir())
+            second_run = job.run_once(now=now)
+            close_connections()
+        finally:
+            os.chdir(root)
+
+    unchanged = stats_before == stats_after
+    print(f"Seeded:                   {len(sessions)} sessions, {len(events)} events, {args.files} stats files")
+    print(f"Retention run:            {run_seconds:.2f} s -> {report}")
+    print(f"Database file:            {size_before / 1024:10.1f} KiB -> {size_after / 1024:10.1f} KiB "
+          f"({size_after / size_before:.1%})")
+    print(f"Stats files:              {files_before} -> {files_after} ({len(archives)} archives)")
+    print(f"File history scan:        {scan_before * 1e3:8.3f} ms -> {scan_after * 1e3:8.3f} ms")
+    print(f"Second run:               {second_run}")
+    print(f"Stats unchanged:          {unchanged}")
+
+    return 0 if unchanged else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
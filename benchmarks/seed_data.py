@@ -0,0 +1,70 @@
+"""
+Bulk synthetic data for load and query benchmarks
+
+Seeds a database with utils.test_data.create_bulk_test_data() and reports
+how long it took and the rows written per second. Without --path the
+database goes to a throwaway temp directory (a timing run); with --path
+it is migrated if needed and kept for other benchmarks or a local server.
+
+Usage:
+    python -m benchmarks.seed_data [--users 100000] [--sessions-per-user 10] [--path seeded.db]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.database import close_connections, get_read_connection
+from models.migrations import migrate
+from utils.test_data import create_bulk_test_data
+
+
+def seed(path, args):
+    migrate(path)
+    start = time.perf_counter()
+    counts = create_bulk_test_data(
+        users=args.users, sessions_per_user=args.sessions_per_user, days=args.days, seed=args.seed,
+        events=not args.no_events, visualization=args.visualization, path=path
+    )
+    seconds = time.perf_counter() - start
+    conn = get_read_connection(path)
+    counts['rollup days'] = conn.execute("SELECT COUNT(*) FROM user_daily_rollups").fetchone()[0]
+    close_connections()
+    return counts, seconds, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--sessions-per-user', type=float, default=10)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-events', action='store_true', help='Skip the session_events rows')
+    parser.add_argument('--visualization', action='store_true', help='Store visualization blobs')
+    parser.add_argument('--path', help='Keep the seeded database at this path')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    if args.path:
+        os.makedirs(os.path.dirname(os.path.abspath(args.path)), exist_ok=True)
+        counts, seconds, size = seed(args.path, args)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            counts, seconds, size = seed(os.path.join(tmp, 'seeded.db'), args)
+
+    rows = counts['users'] + counts['sessions'] + counts['events']
+    for name, count in counts.items():
+        print(f"{name.capitalize() + ':':<26}{count:>12,}")
+    print(f"{'Seconds:':<26}{seconds:>12.1f}")
+    print(f"{'Rows / s:':<26}{rows / seconds:>12,.0f}")
+    print(f"{'Database file:':<26}{size / 2 ** 20:>9.1f} MiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
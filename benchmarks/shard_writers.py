@@ -0,0 +1,126 @@
+"""
+Concurrent writers: one database file vs per-user shards
+
+Runs one thread per user, each repeatedly buffering detection events and
+writing them with StatisticsManager.flush_events() followed by a
+checkpoint() - the writes every running session makes - first against
+the single main database and then in shard mode. Reports write
+transactions per second and per-write latency (p50 / p99) for each
+thread count. Runs in a throwaway temp directory.
+
+Usage:
+    python -m benchmarks.shard_writers [--threads 1 4 16] [--rounds 200] [--events 50]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_writers(thread_count, rounds, events):
+    """Return (write transactions, seconds, latencies) for thread_count concurrent users"""
+    from models.database import close_connections
+    from models.user import User
+    from utils.statistics_manager import StatisticsManager
+
+    users = [User.create(f"writer{thread_count}_{i}", f"writer{thread_count}_{i}@example.com", 'Writer', 'x')
+             for i in range(thread_count)]
+    managers = []
+    for user in users:
+        manager = StatisticsManager()
+        manager.user_id = user.id
+        managers.append(manager)
+        # Create the user's shard (in shard mode) before timing starts
+        manager.flush_events()
+
+    latencies = [[] for _ in users]
+    failures = []
+    barrier = threading.Barrier(thread_count)
+
+    def writer(index):
+        manager = managers[index]
+        barrier.wait()
+        try:
+            for _ in range(rounds):
+                now = datetime.now()
+                monotonic = time.monotonic()
+                for _ in range(events):
+                    manager._record_event('drowsy', now, monotonic, value=0.2)
+                start = time.perf_counter()
+                if not manager.flush_events() or not manager.checkpoint():
+                    failures.append(index)
+                latencies[index].append(time.perf_counter() - start)
+        finally:
+            close_connections()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(thread_count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if failures:
+        raise RuntimeError(f"{len(failures)} writes failed")
+    return thread_count * rounds * 2, elapsed, [value for values in latencies for value in values]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--rounds', type=int, default=200, help='flush + checkpoint rounds per thread')
+    parser.add_argument('--events', type=int, default=50, help='Events per flush')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    results = {}
+    root = os.getcwd()
+    for mode in ('single', 'sharded'):
+        with tempfile.TemporaryDirectory() as tmp:
+            # The app's database path is relative to the working directory
+            os.chdir(tmp)
+            try:
+                from models import shards
+                from models.database import close_connections
+                from models.migrations import _migrated_paths
+                from models.user import init_db
+
+                _migrated_paths.clear()
+                if mode == 'sharded':
+                    shards.enable()
+                else:
+                    shards.disable()
+                init_db()
+                for thread_count in args.threads:
+                    results[mode, thread_count] = run_writers(thread_count, args.rounds, args.events)
+                close_connections()
+            finally:
+                shards.disable()
+                os.chdir(root)
+
+    print(f"{'threads':>7}  {'mode':<8} {'writes/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for thread_count in args.threads:
+        for mode in ('single', 'sharded'):
+            writes, seconds, latencies = results[mode, thread_count]
+            print(f"{thread_count:>7}  {mode:<8} {writes / seconds:>10.0f} "
+                  f"{percentile(latencies, 0.5) * 1e3:>8.2f} {percentile(latencies, 0.99) * 1e3:>8.2f}")
+        speedup = (results['sharded', thread_count][0] / results['sharded', thread_count][1]) / \
+                  (results['single', thread_count][0] / results['single', thread_count][1])
+        print(f"{'':>7}  sharded / single throughput: {speedup:.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
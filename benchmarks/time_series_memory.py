@@ -0,0 +1,74 @@
+"""
+Memory benchmark for per-frame EAR/MAR storage
+
+Simulates one hour of 30 FPS samples for a single metric and reports the
+memory retained by the legacy list-of-dicts layout and by MetricTimeSeries
+(with and without per-second downsampling).
+
+Usage:
+    python -m benchmarks.time_series_memory [--fps 30] [--minutes 60]
+"""
+import argparse
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.time_series import MetricTimeSeries
+
+
+def measure(build):
+    """Return (result, retained bytes) for the object produced by build()"""
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def legacy_store(samples, start):
+    values = []
+    for offset, value in samples:
+        values.append({'timestamp': start + timedelta(seconds=offset), 'value': value})
+    return values
+
+
+def typed_store(samples, raw_window_seconds=None):
+    series = MetricTimeSeries(raw_window_seconds=raw_window_seconds)
+    for offset, value in samples:
+        series.append(value, offset)
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--minutes', type=int, default=60)
+    parser.add_argument('--raw-window', type=int, default=10, help='raw window in minutes for the downsampled run')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    n = args.fps * args.minutes * 60
+    samples = [(i / args.fps, rng.uniform(0.1, 0.4)) for i in range(n)]
+    start = datetime.now()
+    hours = args.minutes / 60.0
+
+    print(f"{n:,} samples ({args.minutes} min at {args.fps} FPS)")
+
+    _, legacy_bytes = measure(lambda: legacy_store(samples, start))
+    print(f"  list of dicts:            {legacy_bytes / hours / 1e6:8.2f} MB per session-hour")
+
+    series, typed_bytes = measure(lambda: typed_store(samples))
+    print(f"  typed arrays (raw):       {typed_bytes / hours / 1e6:8.2f} MB per session-hour "
+          f"({series.nbytes / 1e6:.2f} MB buffers)")
+
+    series, down_bytes = measure(lambda: typed_store(samples, args.raw_window * 60))
+    print(f"  typed arrays ({args.raw_window} min raw): {down_bytes / hours / 1e6:8.2f} MB per session-hour "
+          f"({len(series):,} raw samples retained)")
+
+
+if __name__ == '__main__':
+    main()
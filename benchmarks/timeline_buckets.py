@@ -0,0 +1,71 @@
+"""
+Benchmark for building the visualization timeline
+
+Builds a synthetic 8-hour session and compares the old per-bucket rescan
+of every event list with the incremental TimelineBuckets counters.
+
+Usage:
+    python -m benchmarks.timeline_buckets [--hours 8] [--events-per-minute 2]
+"""
+import argparse
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.timeline_buckets import TimelineBuckets
+
+
+def rescan_timeline(start_time, duration_seconds, events, bucket_size=300):
+    """The previous get_visualization_data algorithm: O(buckets x events)"""
+    num_buckets = max(1, int(duration_seconds // bucket_size) + 1)
+    timeline = []
+    for i in range(num_buckets):
+        bucket_start = start_time + timedelta(seconds=i * bucket_size)
+        bucket_end = bucket_start + timedelta(seconds=bucket_size)
+        row = {'time': bucket_start.strftime('%H:%M')}
+        for event_type, event_list in events.items():
+            row[event_type] = sum(1 for event in event_list if bucket_start <= event['start_time'] < bucket_end)
+        timeline.append(row)
+    return timeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=float, default=8)
+    parser.add_argument('--events-per-minute', type=float, default=2)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    start_time = datetime(2024, 1, 1, 8, 0)
+    duration_seconds = args.hours * 3600
+    total_events = int(args.hours * 60 * args.events_per_minute)
+
+    events = {'drowsy': [], 'yawn': [], 'distraction': []}
+    buckets = TimelineBuckets()
+    for _ in range(total_events):
+        event_type = rng.choice(list(events))
+        offset = rng.uniform(0, duration_seconds)
+        events[event_type].append({'start_time': start_time + timedelta(seconds=offset)})
+        buckets.record(event_type, offset)
+
+    # Both paths must agree before timing them
+    assert rescan_timeline(start_time, duration_seconds, events) == \
+        buckets.timeline(start_time, duration_seconds, 300)
+
+    print(f"{args.hours:g} h session, {total_events:,} events, 5-minute buckets")
+    old = min(timeit.repeat(lambda: rescan_timeline(start_time, duration_seconds, events),
+                            number=1, repeat=args.repeat))
+    print(f"  rescan every event per bucket: {old * 1000:9.3f} ms per call")
+    for size in buckets.resolutions:
+        new = min(timeit.repeat(lambda: buckets.timeline(start_time, duration_seconds, size),
+                                number=1, repeat=args.repeat))
+        print(f"  incremental counters ({size // 60:>2} min): {new * 1000:9.3f} ms per call")
+
+
+if __name__ == '__main__':
+    main()
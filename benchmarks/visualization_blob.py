@@ -0,0 +1,165 @@
+"""
+Storage size and read cost of session visualization data
+
+Seeds a throwaway database with sessions whose visualization_data is
+legacy JSON text, runs the background migration to the columnar blob
+format and reports the database size before and after (each VACUUMed),
+the time to encode / decode one session, and the time to read recent
+session history the old way (SELECT * plus json.loads of every row)
+against the headline-columns read used now. Exits non-zero if any
+migrated row does not decode back to its original data.
+
+Usage:
+    python -m benchmarks.visualization_blob [--sessions 5000]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models.database import close_connections, get_connection
+from models.migrations import migrate
+from utils.timeline_buckets import TimelineBuckets
+from utils.visualization_blob import VisualizationBlob, load_visualization, migrate_legacy_rows
+
+HEADLINE_COLUMNS = (
+    'id', 'start_time', 'end_time', 'duration_minutes', 'drowsy_events', 'yawn_events',
+    'distraction_events', 'completed_pomodoros', 'points_earned', 'average_ear',
+    'average_mar', 'perclos', 'blink_count', 'blink_rate', 'yawn_rate'
+)
+
+
+def visualization_data(rng, start):
+    """Visualization data shaped like StatisticsManager.get_visualization_data()"""
+    duration = rng.randint(20, 180) * 60
+    buckets = TimelineBuckets()
+    counts = {'drowsy': 0, 'yawn': 0, 'distraction': 0}
+    for event_type, rate in (('drowsy', 0.3), ('yawn', 0.15), ('distraction', 0.5)):
+        for _ in range(int(duration / 60 * rate)):
+            buckets.record(event_type, rng.uniform(0, duration))
+            counts[event_type] += 1
+    total = sum(counts.values()) or 1
+    return {
+        'timeline': buckets.timeline(start, duration, bucket_seconds=300),
+        'distribution': [
+            {'name': f"{name.title()} Events", 'value': value, 'percentage': value / total * 100}
+            for name, value in counts.items()
+        ],
+        'historical': [],
+        'session_info': {
+            'duration': duration // 60,
+            'drowsy_events': counts['drowsy'],
+            'yawn_events': counts['yawn'],
+            'distraction_events': counts['distraction']
+        }
+    }
+
+
+def database_size(conn, path):
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(path)
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sessions', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'viz.db')
+        migrate(path)
+        conn = get_connection(path)
+        conn.executemany(
+            "INSERT INTO users (id, username, email, full_name, password_hash) VALUES (?, ?, ?, ?, 'x')",
+            [(i, f"user{i}", f"user{i}@example.com", f"User {i}") for i in range(1, args.users + 1)]
+        )
+        originals = {}
+        rows = []
+        base = datetime(2025, 1, 1, 8, 0)
+        for session_id in range(1, args.sessions + 1):
+            start = base + timedelta(hours=session_id)
+            viz = visualization_data(rng, start)
+            originals[session_id] = viz
+            rows.append((session_id, session_id % args.users + 1, start.isoformat(), viz['session_info']['duration'],
+                         json.dumps(viz)))
+        conn.executemany(
+            "INSERT INTO user_sessions (id, user_id, start_time, duration_minutes, visualization_data) "
+            "VALUES (?, ?, ?, ?, ?)", rows
+        )
+        conn.commit()
+
+        json_bytes = sum(len(row[4]) for row in rows)
+        size_before = database_size(conn, path)
+
+        def legacy_history():
+            for row in conn.execute(
+                "SELECT * FROM user_sessions WHERE user_id = ? ORDER BY start_time DESC LIMIT 20", (7,)
+            ):
+                session = dict(row)
+                session['visualization_data'] = json.loads(session['visualization_data'])
+
+        history_before = timed(legacy_history, 200)
+
+        start = time.perf_counter()
+        migrated = migrate_legacy_rows(pause_seconds=0, path=path)
+        migration_seconds = time.perf_counter() - start
+
+        blobs = conn.execute("SELECT id, visualization_data FROM user_sessions").fetchall()
+        blob_bytes = sum(len(row[1]) for row in blobs)
+        mismatches = sum(load_visualization(row[1]) != originals[row[0]] for row in blobs)
+        size_after = database_size(conn, path)
+
+        def headline_history():
+            for row in conn.execute(
+                f"SELECT {', '.join(HEADLINE_COLUMNS)} FROM user_sessions "
+                "WHERE user_id = ? ORDER BY start_time DESC LIMIT 20", (7,)
+            ):
+                dict(row)
+
+        history_after = timed(headline_history, 200)
+
+        sample_viz = originals[1]
+        sample_json = json.dumps(sample_viz)
+        sample_blob = VisualizationBlob.encode(sample_viz)
+        encode_json = timed(lambda: json.dumps(sample_viz), 2000)
+        encode_blob = timed(lambda: VisualizationBlob.encode(sample_viz), 2000)
+        decode_json = timed(lambda: json.loads(sample_json), 2000)
+        decode_blob = timed(lambda: load_visualization(sample_blob), 2000)
+        decode_partial = timed(lambda: load_visualization(sample_blob, ['session_info']), 2000)
+        close_connections()
+
+    print(f"Sessions:                 {args.sessions} ({migrated} migrated in {migration_seconds:.2f} s)")
+    print(f"Visualization payload:    {json_bytes / 1024:10.1f} KiB JSON -> {blob_bytes / 1024:10.1f} KiB blobs "
+          f"({blob_bytes / json_bytes:.1%})")
+    print(f"Database file:            {size_before / 1024:10.1f} KiB      -> {size_after / 1024:10.1f} KiB "
+          f"({size_after / size_before:.1%})")
+    print(f"Encode one session:       {encode_json * 1e6:8.1f} us JSON, {encode_blob * 1e6:8.1f} us blob")
+    print(f"Decode one session:       {decode_json * 1e6:8.1f} us JSON, {decode_blob * 1e6:8.1f} us blob, "
+          f"{decode_partial * 1e6:8.1f} us blob (session_info only)")
+    print(f"History read (20 rows):   {history_before * 1e3:8.3f} ms before, {history_after * 1e3:8.3f} ms after")
+    print(f"Round-trip mismatches:    {mismatches}")
+
+    return 1 if mismatches or size_after >= size_before else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
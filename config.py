@@ -1,6 +1,10 @@
 # config.py
 from dataclasses import dataclass
 
+# Head pose labels that count as looking at the screen (the analyzer reports
+# "Forward"; older clients and saved data use the other spellings)
+FORWARD_HEAD_POSES = frozenset({'Forward', 'forward', 'Center', 'center'})
+
 @dataclass
 class Config:
     """Configuration parameters for drowsiness detection"""
@@ -8,4 +12,8 @@ class Config:
     EYE_AR_CONSEC_FRAMES: int = 30
     MOUTH_AR_THRESH: float = 1.35
     FACE_MESH_CONFIDENCE: float = 0.5
-    HEAD_POSE_THRESHOLD: float = 10.0
\ No newline at end of file
+    HEAD_POSE_THRESHOLD: float = 10.0
+    # Adaptive thresholds derived from the user's own EAR/MAR distribution
+    ADAPTIVE_EAR_PERCENTILE: float = 0.05
+    ADAPTIVE_MAR_PERCENTILE: float = 0.98
+    ADAPTIVE_MIN_SAMPLES: int = 5000
\ No newline at end of file
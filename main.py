@@ -2,7 +2,7 @@ import cv2
 import time
 from threading import Thread
 import logging
-from config import Config
+from config import Config, FORWARD_HEAD_POSES
 from utils.logging_setup import setup_logging
 from utils.audio_manager import AudioManager
 from detectors.facial_landmark_detector import FacialLandmarkDetector
@@ -11,6 +11,7 @@ from analyzers.head_pose_analyzer import HeadPoseAnalyzer
 from ui.ui import DrowsinessUI
 from utils.pomodoro_timer import PomodoroTimer
 from utils.statistics_manager import StatisticsManager
+from utils.frame_result import FrameResult
 
 class DrowsinessDetector:
     """Main class for drowsiness detection system"""
@@ -32,6 +33,14 @@ class DrowsinessDetector:
         self.focus_alert_active = False  # Add this new flag
         self.focus_alert_interval = 5  # Time in seconds to trigger focus alert
 
+        # Sustained looking-away tracking (also covers frames with no face)
+        self.looking_away_since = None
+
+        # Result of the most recent frame, shared with the web wrapper
+        self.last_result = None
+
+        # The web wrapper feeds its own per-session StatisticsManager
+        self.record_statistics = True
         self.stats_manager = StatisticsManager()
         
         # Initialize audio manager and check audio files
@@ -145,19 +154,31 @@ class DrowsinessDetector:
         # Get Pomodoro timer status
         timer_status = self.pomodoro.get_timer_status()
 
-        # Prepare metrics dictionary
-        metrics = {
-            'ear': self.current_ear,
-            'mar': self.current_mar,
-            'ear_thresh': self.config.EYE_AR_THRESH,
-            'mar_thresh': self.config.MOUTH_AR_THRESH,
-            'drowsy': self.alarm_status,
-            'yawning': self.alarm_status2,
-            'distracted': self.focus_alert_active,
-            'camera_blocked': self.camera_blocked_status,
-            'head_pose': self.head_pose_text,
-            'pomodoro': timer_status
-        }
+        # Only count as distracted after looking away for focus_alert_interval seconds
+        now = time.time()
+        if self.head_pose_text not in FORWARD_HEAD_POSES:
+            if self.looking_away_since is None:
+                self.looking_away_since = now
+            is_distracted = now - self.looking_away_since >= self.focus_alert_interval
+        else:
+            self.looking_away_since = None
+            is_distracted = False
+
+        # Build the per-frame result once; statistics, overlays and emitters share it
+        result = FrameResult(
+            ear=self.current_ear,
+            mar=self.current_mar,
+            ear_thresh=self.config.EYE_AR_THRESH,
+            mar_thresh=self.config.MOUTH_AR_THRESH,
+            drowsy=self.alarm_status,
+            yawning=self.alarm_status2,
+            distracted=is_distracted,
+            focus_alert=self.focus_alert_active,
+            camera_blocked=self.camera_blocked_status,
+            head_pose=self.head_pose_text,
+            pomodoro=timer_status
+        )
+        self.last_result = result
 
         # Display Pomodoro timer status
         if timer_status['active']:
@@ -173,10 +194,11 @@ class DrowsinessDetector:
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
         # Update statistics
-        self.stats_manager.update_metrics(metrics)
+        if self.record_statistics:
+            self.stats_manager.update_metrics(result)
 
         # Enhance the frame with UI elements
-        image = self.ui.enhance_frame(image, metrics)
+        image = self.ui.enhance_frame(image, result)
 
         return image
 
@@ -0,0 +1,225 @@
+# models/analytics.py
+"""
+Per-user analytics store
+
+Every counter lives in two places: the user's row for the day in
+user_daily_rollups (history, trends, time-windowed leaderboards) and the
+user's running totals in user_analytics_totals (summaries). Both are
+updated with upsert-increments in one statement each, so recording an
+event never rewrites history and a summary is a single primary-key read.
+
+get_bucketed_stats() answers arbitrary range queries over sessions and
+detection events.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+from models import data_versions, shards
+from models.database import after_commit, get_read_connection, transaction
+from utils.leaderboard import windowed_leaderboards
+
+logger = logging.getLogger(__name__)
+
+# Counter columns shared by user_daily_rollups and user_analytics_totals
+COUNTERS = (
+    'sessions', 'points', 'focus_minutes', 'pomodoros', 'drowsy_events',
+    'distraction_events', 'achievements_unlocked', 'badges_earned', 'level_ups'
+)
+
+
+def record_daily(user_id, day, counters):
+    """
+    Add counters to a user's day and running totals (joins the caller's transaction)
+
+    Args:
+        user_id: The ID of the user
+        day: 'YYYY-MM-DD'
+        counters: {counter: increment}; keys must be in COUNTERS
+    """
+    unknown = set(counters) - set(COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown analytics counters: {sorted(unknown)}")
+    columns = [column for column in COUNTERS if counters.get(column)]
+
+    with transaction() as conn:
+        is_new_day = conn.execute(
+            "SELECT 1 FROM user_daily_rollups WHERE user_id = ? AND day = ?",
+            (user_id, day)
+        ).fetchone() is None
+        if not columns and not is_new_day:
+            return
+
+        values = [counters[column] for column in columns]
+        names = ''.join(f", {column}" for column in columns)
+        placeholders = ', ?' * len(columns)
+        increments = ''.join(f", {column} = {column} + excluded.{column}" for column in columns)
+        on_conflict = f"DO UPDATE SET {increments[2:]}" if columns else "DO NOTHING"
+
+        conn.execute(
+            f"""
+            INSERT INTO user_daily_rollups (user_id, day{names})
+            VALUES (?, ?{placeholders})
+            ON CONFLICT(user_id, day) {on_conflict}
+            """,
+            [user_id, day] + values
+        )
+        conn.execute(
+            f"""
+            INSERT INTO user_analytics_totals (user_id, active_days, first_day, last_day{names})
+            VALUES (?, ?, ?, ?{placeholders})
+            ON CONFLICT(user_id) DO UPDATE SET
+                active_days = active_days + excluded.active_days,
+                first_day = MIN(first_day, excluded.first_day),
+                last_day = MAX(last_day, excluded.last_day){increments}
+            """,
+            [user_id, int(is_new_day), day, day] + values
+        )
+        # Cached windowed leaderboards re-read this user's totals
+        after_commit(lambda: windowed_leaderboards.touch(user_id, day))
+
+
+def get_totals(user_id):
+    """
+    Return a user's running totals
+
+    Returns:
+        dict: Every counter plus active_days, first_day and last_day
+    """
+    row = get_read_connection().execute(
+        "SELECT * FROM user_analytics_totals WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    if row is None:
+        totals = dict.fromkeys(COUNTERS, 0)
+        totals.update(active_days=0, first_day=None, last_day=None)
+        return totals
+    totals = dict(row)
+    totals.pop('user_id', None)
+    return totals
+
+
+def iter_days(user_id, since=None, limit=None):
+    """
+    Iterate a user's daily rows, newest first
+
+    Args:
+        user_id: The ID of the user
+        since: Only days on or after this 'YYYY-MM-DD'
+        limit: Maximum number of days
+
+    Yields:
+        dict: day plus every counter
+    """
+    query = f"SELECT day, {', '.join(COUNTERS)} FROM user_daily_rollups WHERE user_id = ?"
+    params = [user_id]
+    if since:
+        query += " AND day >= ?"
+        params.append(since)
+    query += " ORDER BY day DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    for row in get_read_connection().execute(query, params):
+        yield dict(row)
+
+
+# Bucket -> SQL expression turning an ISO timestamp column into the bucket start
+BUCKETS = {
+    'hour': "strftime('%Y-%m-%dT%H:00:00', {column})",
+    'day': "date({column})",
+    'week': "date({column}, 'weekday 0', '-6 days')"  # Monday
+}
+# Most buckets a single request may span
+MAX_BUCKETS = 5000
+# Cached (user, range, bucket) results kept in memory
+MAX_CACHED_STATS = 256
+
+_stats_cache = OrderedDict()  # (user_id, start, end, bucket) -> (sessions data version, result)
+_stats_lock = threading.Lock()
+
+
+def get_bucketed_stats(user_id, start, end, bucket):
+    """
+    Aggregate a user's sessions and detection events into time buckets
+
+    Computed with GROUP BY over the (user_id, start_time) and
+    (user_id, event_type, occurred_at) indexes, plus the hourly counts of
+    events already compacted by the retention job, and cached per (user,
+    range, bucket) until the user's 'sessions' data version moves.
+
+    Args:
+        user_id: The ID of the user
+        start: First instant included (ISO string)
+        end: First instant excluded (ISO string)
+        bucket: 'hour', 'day' or 'week'
+
+    Returns:
+        list: One dict per non-empty bucket, oldest first
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket: {bucket}")
+
+    key = (user_id, start, end, bucket)
+    version = data_versions.current('sessions', user_id)
+    with _stats_lock:
+        cached = _stats_cache.get(key)
+        if cached and cached[0] == version:
+            _stats_cache.move_to_end(key)
+            return _copy_buckets(cached[1])
+
+    conn = get_read_connection(shards.user_db_path(user_id))
+    buckets = {}
+
+    def bucket_row(bucket_start):
+        row = buckets.get(bucket_start)
+        if row is None:
+            row = buckets[bucket_start] = {
+                'start': bucket_start, 'sessions': 0, 'focus_minutes': 0, 'points': 0,
+                'pomodoros': 0, 'events': {'drowsy': 0, 'yawn': 0, 'distraction': 0}
+            }
+        return row
+
+    session_bucket = BUCKETS[bucket].format(column='start_time')
+    for row in conn.execute(f"""
+        SELECT {session_bucket} AS bucket_start, COUNT(*), SUM(duration_minutes),
+            SUM(points_earned), SUM(completed_pomodoros)
+        FROM user_sessions
+        WHERE user_id = ? AND start_time >= ? AND start_time < ?
+        GROUP BY bucket_start
+    """, (user_id, start, end)):
+        entry = bucket_row(row[0])
+        entry.update(sessions=row[1], focus_minutes=row[2] or 0, points=row[3] or 0, pomodoros=row[4] or 0)
+
+    # Events older than the retention window only survive as hourly counts
+    for column, query in (
+        ('occurred_at', """
+            SELECT {bucket} AS bucket_start, event_type, COUNT(*)
+            FROM session_events
+            WHERE user_id = ? AND event_type IN ('drowsy', 'yawn', 'distraction')
+                AND occurred_at >= ? AND occurred_at < ?
+            GROUP BY bucket_start, event_type
+        """),
+        ('hour', """
+            SELECT {bucket} AS bucket_start, event_type, SUM(events)
+            FROM user_event_hourly
+            WHERE user_id = ? AND event_type IN ('drowsy', 'yawn', 'distraction')
+                AND hour >= ? AND hour < ?
+            GROUP BY bucket_start, event_type
+        """)
+    ):
+        event_bucket = BUCKETS[bucket].format(column=column)
+        for row in conn.execute(query.format(bucket=event_bucket), (user_id, start, end)):
+            bucket_row(row[0])['events'][row[1]] += row[2]
+
+    result = [buckets[bucket_start] for bucket_start in sorted(buckets)]
+    with _stats_lock:
+        _stats_cache[key] = (version, result)
+        if len(_stats_cache) > MAX_CACHED_STATS:
+            _stats_cache.popitem(last=False)
+    return _copy_buckets(result)
+
+
+def _copy_buckets(result):
+    """Copy cached buckets so callers can't change the cache entry"""
+    return [dict(entry, events=dict(entry['events'])) for entry in result]
@@ -0,0 +1,32 @@
+# models/data_versions.py
+"""
+Per-user data version counters
+
+Writers bump a user's counter for one kind of data ('profile', 'sessions',
+...) and in-process caches remember the version they were built from, so a
+cache entry is stale exactly when the counter has moved. Counters live in
+memory only; a restart starts every cache cold.
+"""
+import threading
+
+_versions = {}
+_lock = threading.Lock()
+
+
+def bump(kind, user_id):
+    """
+    Record that a user's data of this kind changed
+
+    Returns:
+        int: The new version
+    """
+    key = (kind, user_id)
+    with _lock:
+        version = _versions.get(key, 0) + 1
+        _versions[key] = version
+    return version
+
+
+def current(kind, user_id):
+    """Return the current version of a user's data of this kind"""
+    return _versions.get((kind, user_id), 0)
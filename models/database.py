@@ -0,0 +1,301 @@
+# models/database.py
+"""
+Shared data-access layer for FocusGuard
+
+Connections are opened once, tuned with WAL journaling,
+synchronous=NORMAL, a larger page cache and a statement cache, and shared
+by every thread through a process-wide pool of idle connections per
+database file and mode (read/write or read-only). A thread checks one out
+on first use and keeps it until release_connections(): the web app
+releases at the end of every request and Socket.IO event
+(teardown_appcontext), and transaction() releases a connection it checked
+out itself when it finishes. Call sites borrow connections instead of
+opening and closing their own, and must not close them or keep them past
+the request.
+
+At most MAX_IDLE_CONNECTIONS idle connections are kept per file; extra
+ones are closed when returned. With per-user shards (models.shards) a
+thread may touch many files, so it holds at most MAX_POOLED_CONNECTIONS at
+once and returns the least recently used idle ones beyond that (never the
+main database's).
+"""
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'database/focusguard.db'
+
+# Negative cache_size is in KiB (16 MiB page cache per connection)
+CACHE_SIZE_KIB = 16384
+# Prepared statements kept per connection
+STATEMENT_CACHE_SIZE = 256
+# Wait this long for a competing writer before raising "database is locked"
+BUSY_TIMEOUT_SECONDS = 5.0
+# Connections one thread holds at once
+MAX_POOLED_CONNECTIONS = 32
+# Idle connections kept open per (database file, mode)
+MAX_IDLE_CONNECTIONS = 8
+
+_local = threading.local()
+
+# (path, read_only) -> idle connections, shared by every thread
+_idle = {}
+_idle_lock = threading.Lock()
+
+
+def _pool():
+    """Return this thread's checked-out {(path, read_only): connection} mapping"""
+    pool = getattr(_local, 'connections', None)
+    if pool is None:
+        pool = _local.connections = OrderedDict()
+    return pool
+
+
+def _open(path, read_only):
+    """Open and tune a new connection"""
+    # check_same_thread=False: a connection moves between threads through
+    # the pool, but only one thread uses it at a time
+    if read_only:
+        conn = sqlite3.connect(
+            f"file:{os.path.abspath(path)}?mode=ro",
+            uri=True,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False
+        )
+    else:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False
+        )
+        # Only takes effect on a new database; existing ones are converted
+        # at startup by RetentionJob.convert_all() (utils.retention) when
+        # FOCUSGUARD_VACUUM_CONVERT=1
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL lets readers proceed while a session is being written
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _checkout(key):
+    """Take an idle connection for key from the shared pool, or open one"""
+    with _idle_lock:
+        idle = _idle.get(key)
+        if idle:
+            return idle.pop()
+    return _open(key[0], read_only=key[1])
+
+
+def _checkin(key, conn):
+    """Return a connection to the shared pool (closed if the pool is full)"""
+    try:
+        if conn.in_transaction:
+            # Left open by a caller that neither committed nor rolled back
+            conn.rollback()
+    except sqlite3.Error:
+        _close(conn)
+        return
+    with _idle_lock:
+        idle = _idle.setdefault(key, [])
+        if len(idle) < MAX_IDLE_CONNECTIONS:
+            idle.append(conn)
+            return
+    _close(conn)
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def get_connection(path=None):
+    """
+    Get the read/write connection this thread has checked out (checking one
+    out of the shared pool on first use)
+
+    Args:
+        path: Database file (defaults to DB_PATH)
+
+    Returns:
+        sqlite3.Connection: Shared connection with sqlite3.Row rows
+    """
+    path = path or DB_PATH
+    pool = _pool()
+    conn = pool.get((path, False))
+    if conn is None:
+        conn = _checkout((path, False))
+        _remember(pool, (path, False), conn)
+    else:
+        pool.move_to_end((path, False))
+    return conn
+
+
+def get_read_connection(path=None):
+    """
+    Get the read-only connection this thread has checked out (for
+    analytics queries)
+
+    Falls back to the read/write connection if the database cannot be opened
+    read-only (for example before it has been created).
+    """
+    path = path or DB_PATH
+    pool = _pool()
+    conn = pool.get((path, True))
+    if conn is None:
+        try:
+            conn = _checkout((path, True))
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Read-only connection unavailable for {path}: {str(e)}")
+            return get_connection(path)
+        _remember(pool, (path, True), conn)
+    else:
+        pool.move_to_end((path, True))
+    return conn
+
+
+def _remember(pool, key, conn):
+    """Record a checked-out connection, returning idle ones beyond the limit"""
+    pool[key] = conn
+    excess = len(pool) - MAX_POOLED_CONNECTIONS
+    if excess <= 0:
+        return
+    depths = getattr(_local, 'depths', {})
+    for old_key in list(pool):
+        if excess <= 0:
+            break
+        old_path = old_key[0]
+        old_conn = pool[old_key]
+        if old_key == key or old_path == DB_PATH or old_conn.in_transaction \
+                or depths.get(('depth', old_path), 0):
+            continue
+        del pool[old_key]
+        _checkin(old_key, old_conn)
+        excess -= 1
+
+
+@contextmanager
+def transaction(path=None):
+    """
+    Run a block in one transaction on the pooled connection
+
+    Commits when the outermost block exits normally and rolls back on any
+    exception. Nested transaction() blocks join the outer transaction, so
+    helpers can be composed into a single atomic write; their in-memory
+    side effects belong in after_commit().
+
+    Yields:
+        sqlite3.Connection: The pooled read/write connection
+    """
+    # A connection this block checks out itself goes back when it finishes
+    held = (path or DB_PATH, False) in _pool()
+    conn = get_connection(path)
+    depth_key = ('depth', path or DB_PATH)
+    depth = getattr(_local, 'depths', None)
+    if depth is None:
+        depth = _local.depths = {}
+
+    outermost = depth.get(depth_key, 0) == 0
+    depth[depth_key] = depth.get(depth_key, 0) + 1
+    committed = False
+    try:
+        if outermost and not conn.in_transaction:
+            conn.execute("BEGIN")
+        yield conn
+        if outermost:
+            conn.commit()
+            committed = True
+    except Exception:
+        if outermost:
+            conn.rollback()
+        raise
+    finally:
+        depth[depth_key] -= 1
+        if outermost:
+            callbacks = _callbacks().pop(depth_key, [])
+            if not held:
+                _release((path or DB_PATH, False))
+            if committed:
+                _run_callbacks(callbacks)
+
+
+def after_commit(callback, path=None):
+    """
+    Run callback once the calling thread's transaction on path commits
+
+    Inside transaction() the callback is queued and runs after the
+    outermost block commits, or is dropped if it rolls back; outside one
+    it runs immediately. Use it for in-memory state that must only reflect
+    committed rows (caches, data versions, write-behind snapshots).
+    """
+    depth_key = ('depth', path or DB_PATH)
+    if not getattr(_local, 'depths', {}).get(depth_key, 0):
+        callback()
+        return
+    _callbacks().setdefault(depth_key, []).append(callback)
+
+
+def _callbacks():
+    """Return this thread's {depth key: [after-commit callbacks]} mapping"""
+    callbacks = getattr(_local, 'callbacks', None)
+    if callbacks is None:
+        callbacks = _local.callbacks = {}
+    return callbacks
+
+
+def _run_callbacks(callbacks):
+    # The rows are committed either way; a failing callback must not undo that
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Error in after-commit callback: {str(e)}")
+
+
+def _release(key):
+    conn = _pool().pop(key, None)
+    if conn is not None:
+        _checkin(key, conn)
+
+
+def release_connections(exception=None):
+    """
+    Return every connection the calling thread has checked out to the
+    shared pool (except one inside an open transaction() block)
+
+    Registered with Flask's teardown_appcontext, so it takes the optional
+    exception argument.
+    """
+    depths = getattr(_local, 'depths', {})
+    for key in list(_pool()):
+        if not depths.get(('depth', key[0]), 0):
+            _release(key)
+
+
+def close_connections():
+    """Close the calling thread's connections and every idle pooled one"""
+    pool = _pool()
+    for conn in pool.values():
+        _close(conn)
+    pool.clear()
+    with _idle_lock:
+        idle = [conn for connections in _idle.values() for conn in connections]
+        _idle.clear()
+    for conn in idle:
+        _close(conn)
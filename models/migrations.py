@@ -0,0 +1,543 @@
+# models/migrations.py
+"""
+Versioned schema migrations for FocusGuard
+
+Each migration runs exactly once per database; the applied version is kept
+in the schema_version table. Add new schema changes by appending a function
+to MIGRATIONS - never edit one that has already shipped.
+"""
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+
+from models.database import DB_PATH, get_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Databases already brought up to date by this process
+_migrated_paths = set()
+_migrate_lock = threading.Lock()
+
+
+def _add_missing_columns(cursor, table, columns):
+    """ALTER TABLE for every column the table does not have yet"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+
+    for column, data_type in columns.items():
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {data_type}")
+            logger.info(f"Added missing column {column} to {table}")
+
+
+def _001_baseline(cursor):
+    """Core tables (matches what init_db used to create on every start)"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        full_name TEXT NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_settings (
+        user_id INTEGER PRIMARY KEY,
+        eye_ar_thresh REAL DEFAULT 0.15,
+        mouth_ar_thresh REAL DEFAULT 1.35,
+        head_pose_threshold REAL DEFAULT 10.0,
+        work_duration INTEGER DEFAULT 25,
+        short_break_duration INTEGER DEFAULT 5,
+        long_break_duration INTEGER DEFAULT 15,
+        long_break_interval INTEGER DEFAULT 4,
+        profile_points INTEGER DEFAULT 0,
+        profile_level INTEGER DEFAULT 1,
+        profile_experience INTEGER DEFAULT 0,
+        daily_streak INTEGER DEFAULT 0,
+        pomodoro_streak INTEGER DEFAULT 0,
+        last_session_date TEXT,
+        last_check_in_date TEXT,
+        total_focus_minutes INTEGER DEFAULT 0,
+        total_sessions INTEGER DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        start_time TIMESTAMP NOT NULL,
+        end_time TIMESTAMP,
+        duration_minutes INTEGER DEFAULT 0,
+        drowsy_events INTEGER DEFAULT 0,
+        yawn_events INTEGER DEFAULT 0,
+        distraction_events INTEGER DEFAULT 0,
+        completed_pomodoros INTEGER DEFAULT 0,
+        points_earned INTEGER DEFAULT 0,
+        visualization_data TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_achievements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        achievement_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT,
+        points INTEGER DEFAULT 0,
+        completed BOOLEAN DEFAULT 0,
+        completed_at TIMESTAMP,
+        UNIQUE(user_id, achievement_id),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_badges (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        badge_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT,
+        unlocked BOOLEAN DEFAULT 0,
+        unlocked_at TIMESTAMP,
+        UNIQUE(user_id, badge_id),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_statistics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        session_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        duration_minutes INTEGER DEFAULT 0,
+        drowsy_events INTEGER DEFAULT 0,
+        yawn_events INTEGER DEFAULT 0,
+        distraction_events INTEGER DEFAULT 0,
+        completed_pomodoros INTEGER DEFAULT 0,
+        visualization_data TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+    # Databases created by older releases may predate the gamification columns
+    _add_missing_columns(cursor, 'user_settings', {
+        'profile_points': 'INTEGER DEFAULT 0',
+        'profile_level': 'INTEGER DEFAULT 1',
+        'profile_experience': 'INTEGER DEFAULT 0',
+        'daily_streak': 'INTEGER DEFAULT 0',
+        'pomodoro_streak': 'INTEGER DEFAULT 0',
+        'last_session_date': 'TEXT',
+        'last_check_in_date': 'TEXT',
+        'total_focus_minutes': 'INTEGER DEFAULT 0',
+        'total_sessions': 'INTEGER DEFAULT 0'
+    })
+
+
+def _002_streaming_statistics(cursor):
+    """Per-session EAR/MAR statistics, quantile sketches and adaptive thresholds"""
+    _add_missing_columns(cursor, 'user_sessions', {
+        'average_ear': 'REAL DEFAULT 0',
+        'average_mar': 'REAL DEFAULT 0',
+        'perclos': 'REAL DEFAULT 0',
+        'blink_count': 'INTEGER DEFAULT 0',
+        'blink_rate': 'REAL DEFAULT 0',
+        'yawn_rate': 'REAL DEFAULT 0'
+    })
+    _add_missing_columns(cursor, 'user_settings', {
+        'adaptive_thresholds': 'INTEGER DEFAULT 0'
+    })
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_metric_sketches (
+        user_id INTEGER NOT NULL,
+        metric TEXT NOT NULL,
+        sketch BLOB NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, metric),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+
+def _003_query_indexes(cursor):
+    """Indexes for session history, finalize and leaderboard queries"""
+    # Session history: WHERE user_id = ? ORDER BY start_time DESC
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_sessions_user_start
+    ON user_sessions (user_id, start_time)
+    ''')
+    # Finalize: newest session of a user still waiting for visualization data.
+    # Partial index, so it only holds the handful of unfinalized rows.
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_sessions_pending_viz
+    ON user_sessions (user_id, start_time)
+    WHERE visualization_data IS NULL
+    ''')
+    # Leaderboard: ORDER BY profile_points DESC
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_settings_points
+    ON user_settings (profile_points DESC)
+    ''')
+    # Legacy statistics history: WHERE user_id = ? ORDER BY session_date DESC
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_statistics_user_date
+    ON user_statistics (user_id, session_date)
+    ''')
+
+
+def _004_daily_rollups(cursor):
+    """Per-user per-day rollup for time-windowed leaderboards"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_daily_rollups (
+        user_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        points INTEGER DEFAULT 0,
+        focus_minutes INTEGER DEFAULT 0,
+        pomodoros INTEGER DEFAULT 0,
+        sessions INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, day),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    # Window queries: WHERE day BETWEEN ? AND ? GROUP BY user_id (covering)
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_daily_rollups_day
+    ON user_daily_rollups (day, user_id, points, focus_minutes, pomodoros)
+    ''')
+    # Backfill from the sessions recorded so far
+    cursor.execute('''
+    INSERT OR IGNORE INTO user_daily_rollups (user_id, day, points, focus_minutes, pomodoros, sessions)
+    SELECT user_id, date(start_time), SUM(points_earned), SUM(duration_minutes),
+        SUM(completed_pomodoros), COUNT(*)
+    FROM user_sessions
+    WHERE date(start_time) IS NOT NULL
+    GROUP BY user_id, date(start_time)
+    ''')
+
+
+def _005_session_summary_index(cursor):
+    """Covering index for per-user session totals"""
+    # Profile summary: COUNT/SUM ... WHERE user_id = ? answered from the index alone
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_sessions_user_totals
+    ON user_sessions (user_id, duration_minutes, points_earned, completed_pomodoros,
+        drowsy_events, yawn_events, distraction_events)
+    ''')
+
+
+def _006_user_analytics(cursor):
+    """Per-user analytics counters on the daily rollup, plus running totals"""
+    _add_missing_columns(cursor, 'user_daily_rollups', {
+        'drowsy_events': 'INTEGER DEFAULT 0',
+        'distraction_events': 'INTEGER DEFAULT 0',
+        'achievements_unlocked': 'INTEGER DEFAULT 0',
+        'badges_earned': 'INTEGER DEFAULT 0',
+        'level_ups': 'INTEGER DEFAULT 0'
+    })
+    # Backfill the event counters from the sessions already rolled up
+    cursor.execute('''
+    UPDATE user_daily_rollups SET
+        drowsy_events = (
+            SELECT COALESCE(SUM(s.drowsy_events), 0) FROM user_sessions s
+            WHERE s.user_id = user_daily_rollups.user_id
+                AND s.start_time >= user_daily_rollups.day
+                AND s.start_time < date(user_daily_rollups.day, '+1 day')
+        ),
+        distraction_events = (
+            SELECT COALESCE(SUM(s.distraction_events), 0) FROM user_sessions s
+            WHERE s.user_id = user_daily_rollups.user_id
+                AND s.start_time >= user_daily_rollups.day
+                AND s.start_time < date(user_daily_rollups.day, '+1 day')
+        )
+    ''')
+
+    # One row per user, kept current alongside the daily rows
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_analytics_totals (
+        user_id INTEGER PRIMARY KEY,
+        sessions INTEGER DEFAULT 0,
+        points INTEGER DEFAULT 0,
+        focus_minutes INTEGER DEFAULT 0,
+        pomodoros INTEGER DEFAULT 0,
+        drowsy_events INTEGER DEFAULT 0,
+        distraction_events INTEGER DEFAULT 0,
+        achievements_unlocked INTEGER DEFAULT 0,
+        badges_earned INTEGER DEFAULT 0,
+        level_ups INTEGER DEFAULT 0,
+        active_days INTEGER DEFAULT 0,
+        first_day TEXT,
+        last_day TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    cursor.execute('''
+    INSERT OR IGNORE INTO user_analytics_totals
+        (user_id, sessions, points, focus_minutes, pomodoros, drowsy_events, distraction_events,
+        active_days, first_day, last_day)
+    SELECT user_id, SUM(sessions), SUM(points), SUM(focus_minutes), SUM(pomodoros),
+        SUM(drowsy_events), SUM(distraction_events), COUNT(*), MIN(day), MAX(day)
+    FROM user_daily_rollups
+    GROUP BY user_id
+    ''')
+
+
+def _007_session_events(cursor):
+    """Normalized per-event rows for cross-session queries"""
+    # Events are written while the session runs, before its user_sessions
+    # row exists, so both carry a uid generated when the session starts
+    _add_missing_columns(cursor, 'user_sessions', {
+        'session_uid': 'TEXT'
+    })
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_user_sessions_uid
+    ON user_sessions (session_uid)
+    WHERE session_uid IS NOT NULL
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS session_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_uid TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        event_type TEXT NOT NULL,
+        occurred_at TIMESTAMP NOT NULL,
+        offset_seconds REAL NOT NULL,
+        value REAL,
+        head_pose TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    # Range and type aggregation: WHERE user_id = ? AND event_type = ? AND occurred_at >= ?
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_session_events_user_type_time
+    ON session_events (user_id, event_type, occurred_at)
+    ''')
+    # One session's timeline: WHERE session_uid = ? ORDER BY offset_seconds
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_session_events_session
+    ON session_events (session_uid, offset_seconds)
+    ''')
+
+
+def _008_session_checkpoints(cursor):
+    """Append-only running-state checkpoints of sessions in progress"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS session_checkpoints (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_uid TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        start_time TIMESTAMP NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        state TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    # Latest checkpoint per session / cleanup after finalize
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_session_checkpoints_session
+    ON session_checkpoints (session_uid, id)
+    ''')
+
+
+def _009_event_hourly_rollups(cursor):
+    """Hourly detection event counts for events compacted out of session_events"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_event_hourly (
+        user_id INTEGER NOT NULL,
+        event_type TEXT NOT NULL,
+        hour TEXT NOT NULL,
+        events INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, event_type, hour),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    ) WITHOUT ROWID
+    ''')
+
+
+# (version, migration) pairs, applied in order
+MIGRATIONS = [
+    (1, _001_baseline),
+    (2, _002_streaming_statistics),
+    (3, _003_query_indexes),
+    (4, _004_daily_rollups),
+    (5, _005_session_summary_index),
+    (6, _006_user_analytics),
+    (7, _007_session_events),
+    (8, _008_session_checkpoints),
+    (9, _009_event_hourly_rollups),
+]
+
+
+def _shard_001_user_tables(cursor):
+    """Per-user shard: sessions, events, checkpoints and compacted event counts"""
+    # Same columns (in the same order) and indexes as the main database's
+    # tables after migration 9, so rows can be copied across with SELECT *
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        start_time TIMESTAMP NOT NULL,
+        end_time TIMESTAMP,
+        duration_minutes INTEGER DEFAULT 0,
+        drowsy_events INTEGER DEFAULT 0,
+        yawn_events INTEGER DEFAULT 0,
+        distraction_events INTEGER DEFAULT 0,
+        completed_pomodoros INTEGER DEFAULT 0,
+        points_earned INTEGER DEFAULT 0,
+        visualization_data TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        average_ear REAL DEFAULT 0,
+        average_mar REAL DEFAULT 0,
+        perclos REAL DEFAULT 0,
+        blink_count INTEGER DEFAULT 0,
+        blink_rate REAL DEFAULT 0,
+        yawn_rate REAL DEFAULT 0,
+        session_uid TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_sessions_user_start
+    ON user_sessions (user_id, start_time)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_sessions_pending_viz
+    ON user_sessions (user_id, start_time)
+    WHERE visualization_data IS NULL
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_user_sessions_user_totals
+    ON user_sessions (user_id, duration_minutes, points_earned, completed_pomodoros,
+                      drowsy_events, yawn_events, distraction_events)
+    ''')
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_user_sessions_uid
+    ON user_sessions (session_uid)
+    WHERE session_uid IS NOT NULL
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS session_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_uid TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        event_type TEXT NOT NULL,
+        occurred_at TIMESTAMP NOT NULL,
+        offset_seconds REAL NOT NULL,
+        value REAL,
+        head_pose TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_session_events_user_type_time
+    ON session_events (user_id, event_type, occurred_at)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_session_events_session
+    ON session_events (session_uid, offset_seconds)
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS session_checkpoints (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_uid TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        start_time TIMESTAMP NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        state TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_session_checkpoints_session
+    ON session_checkpoints (session_uid, id)
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_event_hourly (
+        user_id INTEGER NOT NULL,
+        event_type TEXT NOT NULL,
+        hour TEXT NOT NULL,
+        events INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, event_type, hour)
+    ) WITHOUT ROWID
+    ''')
+
+
+# Schema of per-user shard files (models.shards), versioned separately
+SHARD_MIGRATIONS = [
+    (1, _shard_001_user_tables),
+]
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a new database)"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMP NOT NULL
+    )
+    ''')
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(path=None, migrations=None):
+    """
+    Apply every pending migration, each in its own transaction
+
+    Args:
+        path: Database file (defaults to DB_PATH)
+        migrations: Migration list (defaults to MIGRATIONS)
+
+    Returns:
+        int: The schema version after migrating
+    """
+    conn = get_connection(path)
+    current = get_schema_version(conn)
+
+    for version, migration in migrations or MIGRATIONS:
+        if version <= current:
+            continue
+        description = (migration.__doc__ or migration.__name__).strip()
+        try:
+            with transaction(path) as conn:
+                cursor = conn.cursor()
+                migration(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                    (version, description, datetime.now().isoformat())
+                )
+            logger.info(f"Applied schema migration {version}: {description}")
+            current = version
+        except sqlite3.Error as e:
+            logger.error(f"Schema migration {version} failed: {str(e)}")
+            raise
+
+    return current
+
+
+def ensure_schema(path=None, migrations=None):
+    """
+    Migrate the database once per process
+
+    Cheap to call from constructors: after the first call for a database it
+    returns without touching SQLite.
+    """
+    path = path or DB_PATH
+    if path in _migrated_paths:
+        return
+    with _migrate_lock:
+        if path not in _migrated_paths:
+            migrate(path, migrations)
+            _migrated_paths.add(path)
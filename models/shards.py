@@ -0,0 +1,201 @@
+# models/shards.py
+"""
+Optional per-user database shards
+
+By default every table lives in the main database, so the session,
+event and checkpoint writes of all users queue on its single writer lock.
+In shard mode (FOCUSGUARD_USER_SHARDS=1, or enable()) each user's
+high-volume tables - SHARDED_TABLES - move to their own file under
+SHARD_DIR and users write in parallel. Global tables (users, settings,
+achievements, daily rollups, analytics totals) stay in the main database.
+
+Call sites pass user_db_path(user_id) to get_connection,
+get_read_connection and transaction. With sharding off it returns None
+(the main database), so one code path serves both modes. Queries across
+users go through query_shards(), which ATTACHes shards to one connection
+a few at a time.
+
+A write that spans the main database and a shard is two SQLite
+transactions: WAL commits are atomic per file, not across files. Writers
+open the shard transaction inside the main one, so the user's own rows
+commit first and the rollups (which can be rebuilt from them) second.
+"""
+import logging
+import os
+import re
+from contextlib import contextmanager
+
+from models.database import DB_PATH, get_connection, get_read_connection, transaction
+from models.migrations import SHARD_MIGRATIONS, ensure_schema
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('FOCUSGUARD_USER_SHARDS') == '1'
+SHARD_DIR = os.path.join(os.path.dirname(DB_PATH), 'shards')
+
+# Tables stored per user in shard mode
+SHARDED_TABLES = ('user_sessions', 'session_events', 'session_checkpoints', 'user_event_hourly')
+# Shards attached to one connection at a time (SQLite allows 10 by default)
+MAX_ATTACHED = 8
+
+_SHARD_NAME = re.compile(r'^user_(\d+)\.db$')
+
+
+def enable(shard_dir=None):
+    """Switch shard mode on (optionally with another shard directory)"""
+    global ENABLED, SHARD_DIR
+    ENABLED = True
+    if shard_dir:
+        SHARD_DIR = shard_dir
+
+
+def disable():
+    """Switch shard mode off (shard files are left as they are)"""
+    global ENABLED
+    ENABLED = False
+
+
+def shard_path(user_id):
+    """File holding a user's shard"""
+    return os.path.join(SHARD_DIR, f"user_{int(user_id)}.db")
+
+
+def user_db_path(user_id):
+    """
+    Database file holding a user's sessions, events and checkpoints
+
+    Returns:
+        str: The user's shard (created and migrated on first use), or None
+            for the main database when sharding is off
+    """
+    if not ENABLED or user_id is None:
+        return None
+    path = shard_path(user_id)
+    ensure_schema(path, SHARD_MIGRATIONS)
+    return path
+
+
+def iter_shards():
+    """
+    Existing shard files, by user id
+
+    Yields:
+        tuple: (user_id, path)
+    """
+    if not os.path.isdir(SHARD_DIR):
+        return
+    shards = []
+    for name in os.listdir(SHARD_DIR):
+        match = _SHARD_NAME.match(name)
+        if match:
+            shards.append((int(match.group(1)), os.path.join(SHARD_DIR, name)))
+    yield from sorted(shards)
+
+
+@contextmanager
+def attached(paths):
+    """
+    ATTACH shards to this thread's read-only connection
+
+    Args:
+        paths: At most MAX_ATTACHED shard files
+
+    Yields:
+        list: Schema name of each path, in order
+    """
+    if len(paths) > MAX_ATTACHED:
+        raise ValueError(f"At most {MAX_ATTACHED} shards can be attached at once")
+    conn = get_read_connection()
+    schemas = []
+    try:
+        for index, path in enumerate(paths):
+            schema = f"shard{index}"
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (f"file:{os.path.abspath(path)}?mode=ro",))
+            schemas.append(schema)
+        yield schemas
+    finally:
+        for schema in schemas:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+
+def query_shards(sql, params=()):
+    """
+    Run a query against every shard
+
+    Shards are attached MAX_ATTACHED at a time and the query is run once
+    per group as a UNION ALL, so a cross-user rollup costs one statement
+    per group rather than one connection per user.
+
+    Args:
+        sql: SELECT with '{schema}' in front of every table name, e.g.
+            "SELECT user_id, COUNT(*) FROM {schema}.user_sessions GROUP BY user_id"
+        params: Parameters of one copy of sql
+
+    Yields:
+        sqlite3.Row: Rows of every shard
+    """
+    paths = [path for _, path in iter_shards()]
+    for start in range(0, len(paths), MAX_ATTACHED):
+        group = paths[start:start + MAX_ATTACHED]
+        with attached(group) as schemas:
+            union = ' UNION ALL '.join(f"SELECT * FROM ({sql.format(schema=schema)})" for schema in schemas)
+            rows = get_read_connection().execute(union, tuple(params) * len(schemas)).fetchall()
+        yield from rows
+
+
+def move_user_to_shard(user_id):
+    """
+    Move a user's rows of SHARDED_TABLES from the main database to their shard
+
+    Rows are copied (ids kept) and committed to the shard first, then
+    deleted from the main database in a second transaction. The copy uses
+    INSERT OR IGNORE, so a move interrupted in between can simply be run
+    again.
+
+    Returns:
+        int: Number of rows moved
+    """
+    path = shard_path(user_id)
+    ensure_schema(path, SHARD_MIGRATIONS)
+    conn = get_connection()
+    conn.execute("ATTACH DATABASE ? AS shard", (path,))
+    moved = 0
+    try:
+        with transaction() as conn:
+            for table in SHARDED_TABLES:
+                shard_columns = {row[1] for row in conn.execute(f"PRAGMA shard.table_info({table})")}
+                columns = ', '.join(
+                    row[1] for row in conn.execute(f"PRAGMA main.table_info({table})") if row[1] in shard_columns
+                )
+                conn.execute(
+                    f"INSERT OR IGNORE INTO shard.{table} ({columns}) "
+                    f"SELECT {columns} FROM main.{table} WHERE user_id = ?",
+                    (user_id,)
+                )
+        with transaction() as conn:
+            for table in SHARDED_TABLES:
+                moved += conn.execute(f"DELETE FROM main.{table} WHERE user_id = ?", (user_id,)).rowcount
+    finally:
+        conn.execute("DETACH DATABASE shard")
+    return moved
+
+
+def shard_existing_users():
+    """
+    Move every user's rows still in the main database to their shard
+
+    Run once at startup in shard mode, before any session starts.
+
+    Returns:
+        int: Number of users moved
+    """
+    conn = get_read_connection()
+    user_ids = sorted({
+        row[0]
+        for table in SHARDED_TABLES
+        for row in conn.execute(f"SELECT DISTINCT user_id FROM {table}")
+    })
+    for user_id in user_ids:
+        rows = move_user_to_shard(user_id)
+        logger.info(f"Moved {rows} rows of user {user_id} to {shard_path(user_id)}")
+    return len(user_ids)
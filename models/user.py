@@ -1,150 +1,72 @@
+import base64
 import json
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from datetime import datetime
+from collections import OrderedDict
+from types import MappingProxyType
 import sqlite3
-import os
 import logging
+import threading
+import time
+
+from models import analytics, data_versions, shards
+from models.database import after_commit, get_connection, get_read_connection, transaction
+from models.migrations import ensure_schema
+from utils.account_index import account_index
+from utils.leaderboard import leaderboard_service
+from utils.visualization_blob import load_visualization
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database setup
-DB_PATH = 'database/focusguard.db'
-
 def init_db():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+    """Create or upgrade the database schema (runs each pending migration once)"""
     try:
-        # Table creation and column addition code here
-        # Create users table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            full_name TEXT NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP,
-            is_active BOOLEAN DEFAULT 1
-        )
-        ''')
-        
-        # Create user settings table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_settings (
-            user_id INTEGER PRIMARY KEY,
-            eye_ar_thresh REAL DEFAULT 0.15,
-            mouth_ar_thresh REAL DEFAULT 1.35,
-            head_pose_threshold REAL DEFAULT 10.0,
-            work_duration INTEGER DEFAULT 25,
-            short_break_duration INTEGER DEFAULT 5,
-            long_break_duration INTEGER DEFAULT 15,
-            long_break_interval INTEGER DEFAULT 4,
-            profile_points INTEGER DEFAULT 0,
-            profile_level INTEGER DEFAULT 1,
-            profile_experience INTEGER DEFAULT 0,
-            daily_streak INTEGER DEFAULT 0,
-            pomodoro_streak INTEGER DEFAULT 0,
-            last_session_date TEXT,
-            last_check_in_date TEXT,
-            total_focus_minutes INTEGER DEFAULT 0,
-            total_sessions INTEGER DEFAULT 0,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-        
-        # Create unified session history table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            start_time TIMESTAMP NOT NULL,
-            end_time TIMESTAMP,
-            duration_minutes INTEGER DEFAULT 0,
-            drowsy_events INTEGER DEFAULT 0,
-            yawn_events INTEGER DEFAULT 0,
-            distraction_events INTEGER DEFAULT 0,
-            completed_pomodoros INTEGER DEFAULT 0,
-            points_earned INTEGER DEFAULT 0,
-            visualization_data TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-
-        # Create achievements table (if it doesn't exist)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_achievements (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            achievement_id TEXT NOT NULL,
-            name TEXT NOT NULL,
-            description TEXT,
-            points INTEGER DEFAULT 0,
-            completed BOOLEAN DEFAULT 0,
-            completed_at TIMESTAMP,
-            UNIQUE(user_id, achievement_id),
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-
-        # Create badges table (if it doesn't exist)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_badges (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            badge_id TEXT NOT NULL,
-            name TEXT NOT NULL,
-            description TEXT,
-            unlocked BOOLEAN DEFAULT 0,
-            unlocked_at TIMESTAMP,
-            UNIQUE(user_id, badge_id),
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-
-        # Check if all columns exist in user_settings, if not add them
-        cursor.execute("PRAGMA table_info(user_settings)")
-        columns = {row[1] for row in cursor.fetchall()}
-        
-        # Add any missing columns
-        missing_columns = {
-            'profile_points': 'INTEGER DEFAULT 0',
-            'profile_level': 'INTEGER DEFAULT 1',
-            'profile_experience': 'INTEGER DEFAULT 0',
-            'daily_streak': 'INTEGER DEFAULT 0',
-            'pomodoro_streak': 'INTEGER DEFAULT 0',
-            'last_session_date': 'TEXT',
-            'last_check_in_date': 'TEXT',
-            'total_focus_minutes': 'INTEGER DEFAULT 0',
-            'total_sessions': 'INTEGER DEFAULT 0'
-        }
-        
-        for column, data_type in missing_columns.items():
-            if column not in columns:
-                try:
-                    cursor.execute(f"ALTER TABLE user_settings ADD COLUMN {column} {data_type}")
-                    logging.info(f"Added missing column {column} to user_settings")
-                except sqlite3.OperationalError:
-                    logging.warning(f"Column {column} already exists or couldn't be added")
-
-        conn.commit()
+        ensure_schema()
         logger.info("Database initialized successfully")
     except sqlite3.Error as e:
         logger.error(f"Database initialization failed: {str(e)}")
         raise
-    finally:
-        conn.close()
 
 
 class User(UserMixin):
     """User model for authentication and profile management"""
+
+    # user_settings columns owned by the gamification profile
+    PROFILE_SETTINGS = frozenset({
+        'profile_points', 'profile_level', 'profile_experience', 'daily_streak',
+        'pomodoro_streak', 'last_session_date', 'last_check_in_date'
+    })
+
+    # user_settings column -> leaderboard field
+    LEADERBOARD_SETTINGS = {
+        'profile_points': 'points',
+        'profile_level': 'level',
+        'daily_streak': 'daily_streak',
+        'pomodoro_streak': 'pomodoro_streak'
+    }
+
+    # user_id -> (sessions data version, get_session_summary() result)
+    _session_summaries = {}
     
+    # user_id -> (user data version, time loaded, read-only users row), for
+    # get_by_id(); shared by the Flask-Login user_loader and every handler
+    _user_rows = OrderedDict()
+    _user_rows_lock = threading.Lock()
+    # Cached users rows kept in memory, and how long one is trusted (rows
+    # changed outside this process show up after at most this long)
+    MAX_CACHED_USERS = 4096
+    USER_CACHE_TTL_SECONDS = 60
+
+    # user_sessions columns returned by session listings (no visualization blob)
+    SESSION_LIST_COLUMNS = (
+        'id', 'start_time', 'end_time', 'duration_minutes', 'drowsy_events', 'yawn_events',
+        'distraction_events', 'completed_pomodoros', 'points_earned', 'average_ear',
+        'average_mar', 'perclos', 'blink_count', 'blink_rate', 'yawn_rate'
+    )
+
     def __init__(self, id=None, username=None, email=None, full_name=None, password_hash=None, 
                  created_at=None, last_login=None, is_active=True):
         self.id = id
@@ -164,15 +86,21 @@ class User(UserMixin):
     
     @staticmethod
     def get_by_id(user_id):
-        """Retrieve a user by their ID"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        user_data = cursor.fetchone()
+        """
+        Retrieve a user by their ID
+        
+        The users row is served from memory for up to USER_CACHE_TTL_SECONDS,
+        or until a write through this model bumps the user's 'user' data
+        version, so authenticated requests and Socket.IO events don't query
+        the database to find out who the user is. Every call returns a new
+        User object.
+        """
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
         
-        conn.close()
+        user_data = User._cached_user_row(user_id)
         
         if user_data:
             # Convert timestamp strings to datetime objects if they exist
@@ -208,18 +136,38 @@ class User(UserMixin):
         
         return None
     
+    @staticmethod
+    def _cached_user_row(user_id):
+        """Return the users row for get_by_id(), from the cache when current"""
+        version = data_versions.current('user', user_id)
+        now = time.monotonic()
+        with User._user_rows_lock:
+            cached = User._user_rows.get(user_id)
+            if cached and cached[0] == version and now - cached[1] < User.USER_CACHE_TTL_SECONDS:
+                User._user_rows.move_to_end(user_id)
+                return cached[2]
+        
+        user_data = get_connection().execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        if user_data is None:
+            return None
+        
+        user_data = MappingProxyType(dict(user_data))
+        with User._user_rows_lock:
+            User._user_rows[user_id] = (version, now, user_data)
+            User._user_rows.move_to_end(user_id)
+            if len(User._user_rows) > User.MAX_CACHED_USERS:
+                User._user_rows.popitem(last=False)
+        return user_data
+    
     @staticmethod
     def get_by_username(username):
         """Retrieve a user by their username"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
         user_data = cursor.fetchone()
         
-        conn.close()
-        
         if user_data:
             return User(
                 id=user_data['id'],
@@ -237,15 +185,12 @@ class User(UserMixin):
     @staticmethod
     def get_by_email(email):
         """Retrieve a user by their email"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
         user_data = cursor.fetchone()
         
-        conn.close()
-        
         if user_data:
             return User(
                 id=user_data['id'],
@@ -267,7 +212,7 @@ class User(UserMixin):
         if User.get_by_username(username) or User.get_by_email(email):
             return None
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         try:
@@ -293,6 +238,9 @@ class User(UserMixin):
             
             conn.commit()
             
+            leaderboard_service.update_user(user_id, name=full_name, username=username)
+            account_index.add(username, email)
+            
             # Create and return a user object directly
             return User(
                 id=user_id,
@@ -309,8 +257,6 @@ class User(UserMixin):
             conn.rollback()
             logger.error(f"Error creating user: {str(e)}")
             return None
-        finally:
-            conn.close()
     
     def check_password(self, password):
         """Check if the provided password matches the stored hash"""
@@ -318,7 +264,7 @@ class User(UserMixin):
     
     def update_last_login(self):
         """Update the last login timestamp for the user"""
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         
         try:
@@ -327,108 +273,223 @@ class User(UserMixin):
                 (datetime.now(), self.id)
             )
             conn.commit()
+            data_versions.bump('user', self.id)
             self.last_login = datetime.now()
             return True
         except Exception as e:
             conn.rollback()
             logger.error(f"Error updating last login: {str(e)}")
             return False
-        finally:
-            conn.close()
             
     def _get_db_connection(self):
-        """Get a database connection for direct use"""
-        return sqlite3.connect(DB_PATH)
+        """Get the pooled database connection for direct use (do not close it)"""
+        return get_connection()
     
     def get_settings(self):
         """Get user settings"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM user_settings WHERE user_id = ?", (self.id,))
         settings = cursor.fetchone()
         
-        conn.close()
-        
         if settings:
             return dict(settings)
         
         return None
     
     def update_settings(self, settings_dict):
-        """Update user settings"""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
+        """Update user settings (joins the caller's transaction if one is open)"""
         try:
             # Create SET clause dynamically from provided settings
             set_clause = ", ".join([f"{key} = ?" for key in settings_dict.keys()])
             values = list(settings_dict.values())
             values.append(self.id)  # Add user_id for WHERE clause
             
-            cursor.execute(
-                f"UPDATE user_settings SET {set_clause} WHERE user_id = ?",
-                values
-            )
-            conn.commit()
+            leaderboard_fields = {
+                field: settings_dict[column]
+                for column, field in self.LEADERBOARD_SETTINGS.items()
+                if column in settings_dict
+            }
+            
+            def committed():
+                # Cached gamification profiles must reload these columns
+                if self.PROFILE_SETTINGS.intersection(settings_dict):
+                    data_versions.bump('profile', self.id)
+                if leaderboard_fields:
+                    leaderboard_service.update_user(self.id, **leaderboard_fields)
+            
+            with transaction() as conn:
+                old_points = None
+                if 'profile_points' in settings_dict:
+                    row = conn.execute(
+                        "SELECT profile_points FROM user_settings WHERE user_id = ?", (self.id,)
+                    ).fetchone()
+                    old_points = (row[0] or 0) if row else 0
+                conn.execute(
+                    f"UPDATE user_settings SET {set_clause} WHERE user_id = ?",
+                    values
+                )
+                # Every point award (sessions, achievements, badges, check-ins)
+                # reaches the daily rollups here, so the windowed leaderboards
+                # add up to the all-time points
+                if old_points is not None and (settings_dict['profile_points'] or 0) > old_points:
+                    analytics.record_daily(self.id, datetime.now().strftime('%Y-%m-%d'), {
+                        'points': settings_dict['profile_points'] - old_points
+                    })
+                # In-memory readers only see the change once it is committed
+                after_commit(committed)
             return True
         except Exception as e:
-            conn.rollback()
             logger.error(f"Error updating settings: {str(e)}")
             return False
-        finally:
-            conn.close()
     
     def save_session(self, session_data):
-        """Save a completed focus session to the unified table"""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
+        """Save a completed focus session to the unified table (joins the caller's transaction)"""
         try:
-            cursor.execute(
-                """
-                INSERT INTO user_sessions 
-                (user_id, start_time, end_time, duration_minutes, drowsy_events, 
-                yawn_events, distraction_events, completed_pomodoros, points_earned)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    self.id,
-                    session_data.get('start_time'),
-                    session_data.get('end_time'),
-                    session_data.get('duration_minutes', 0),
-                    session_data.get('drowsy_events', 0),
-                    session_data.get('yawn_events', 0),
-                    session_data.get('distraction_events', 0),
-                    session_data.get('completed_pomodoros', 0),
-                    session_data.get('points_earned', 0)
+            path = shards.user_db_path(self.id)
+            with transaction(path) as conn:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO user_sessions 
+                    (user_id, start_time, end_time, duration_minutes, drowsy_events, 
+                    yawn_events, distraction_events, completed_pomodoros, points_earned,
+                    average_ear, average_mar, perclos, blink_count, blink_rate, yawn_rate, session_uid)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        self.id,
+                        session_data.get('start_time'),
+                        session_data.get('end_time'),
+                        session_data.get('duration_minutes', 0),
+                        session_data.get('drowsy_events', 0),
+                        session_data.get('yawn_events', 0),
+                        session_data.get('distraction_events', 0),
+                        session_data.get('completed_pomodoros', 0),
+                        session_data.get('points_earned', 0),
+                        session_data.get('average_ear', 0.0),
+                        session_data.get('average_mar', 0.0),
+                        session_data.get('perclos', 0.0),
+                        session_data.get('blink_count', 0),
+                        session_data.get('blink_rate', 0.0),
+                        session_data.get('yawn_rate', 0.0),
+                        session_data.get('session_uid')
+                    )
                 )
-            )
-            
-            conn.commit()
+                after_commit(lambda: data_versions.bump('sessions', self.id), path)
             return cursor.lastrowid
         except Exception as e:
-            conn.rollback()
             logger.error(f"Error saving session: {str(e)}")
             return None
-        finally:
-            conn.close()
+    
+    def add_daily_rollup(self, session_data):
+        """
+        Add a finished session to the user's daily analytics and running
+        totals (joins the caller's transaction)
+        
+        The session's points are not counted here: they reach the rollups
+        when the profile that earned them is saved (update_settings).
+        
+        Args:
+            session_data: The dict passed to save_session()
+        """
+        start_time = session_data.get('start_time')
+        if isinstance(start_time, datetime):
+            start_time = start_time.isoformat()
+        day = (start_time or datetime.now().isoformat())[:10]
+        
+        try:
+            analytics.record_daily(self.id, day, {
+                'sessions': 1,
+                'focus_minutes': session_data.get('duration_minutes', 0),
+                'pomodoros': session_data.get('completed_pomodoros', 0),
+                'drowsy_events': session_data.get('drowsy_events', 0),
+                'distraction_events': session_data.get('distraction_events', 0)
+            })
+            return True
+        except Exception as e:
+            logger.error(f"Error updating daily rollup: {str(e)}")
+            return False
+    
+    @staticmethod
+    def encode_session_cursor(session):
+        """Opaque keyset cursor pointing just past a listed session"""
+        raw = f"{session['start_time']}|{session['id']}".encode()
+        return base64.urlsafe_b64encode(raw).decode()
+    
+    @staticmethod
+    def decode_session_cursor(cursor):
+        """
+        Parse a cursor from encode_session_cursor()
+        
+        Returns:
+            tuple: (start_time, id)
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            start_time, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            return start_time, int(session_id)
+        except Exception:
+            raise ValueError(f"Invalid session cursor: {cursor}")
+    
+    def iter_sessions(self, limit=None, cursor=None, include_visualization=False, batch_size=500):
+        """
+        Iterate the user's sessions, newest first, without loading them all
+        
+        Uses keyset pagination on (start_time, id), which the
+        (user_id, start_time) index serves without sorting, so a page deep
+        in a long history costs the same as the first one.
+        
+        Args:
+            limit: Maximum number of sessions (None for all)
+            cursor: Resume after this cursor (from encode_session_cursor)
+            include_visualization: Also return the decoded visualization_data
+            batch_size: Rows fetched from SQLite at a time
+            
+        Yields:
+            dict: One session row (timestamps as ISO strings)
+        """
+        columns = list(self.SESSION_LIST_COLUMNS)
+        if include_visualization:
+            columns.append('visualization_data')
+        
+        query = f"SELECT {', '.join(columns)} FROM user_sessions WHERE user_id = ?"
+        params = [self.id]
+        if cursor:
+            start_time, session_id = self.decode_session_cursor(cursor)
+            query += " AND (start_time, id) < (?, ?)"
+            params += [start_time, session_id]
+        query += " ORDER BY start_time DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        
+        rows = get_read_connection(shards.user_db_path(self.id)).execute(query, params)
+        while True:
+            batch = rows.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                session = dict(row)
+                if include_visualization:
+                    session['visualization_data'] = load_visualization(session['visualization_data'])
+                yield session
     
     def get_session_history(self, limit=10):
         """Get user's session history from the unified table"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_connection(shards.user_db_path(self.id))
         cursor = conn.cursor()
         
+        # Headline columns only: the visualization blob is not needed here
         cursor.execute(
-            "SELECT * FROM user_sessions WHERE user_id = ? ORDER BY start_time DESC LIMIT ?",
+            f"SELECT {', '.join(self.SESSION_LIST_COLUMNS)} FROM user_sessions "
+            "WHERE user_id = ? ORDER BY start_time DESC LIMIT ?",
             (self.id, limit)
         )
         sessions = cursor.fetchall()
         
-        conn.close()
-        
         # Convert sessions to dictionaries with properly formatted timestamps
         result = []
         for session in sessions:
@@ -457,13 +518,50 @@ class User(UserMixin):
         return result
     
 
+    def get_session_summary(self):
+        """
+        Get the user's all-time session totals
+        
+        Computed in SQL from the covering index and cached until the user's
+        sessions change, so the cost does not grow with session history.
+        
+        Returns:
+            dict: total_sessions, total_focus_minutes, total_points,
+                completed_pomodoros and total drowsy/yawn/distraction events
+        """
+        version = data_versions.current('sessions', self.id)
+        cached = User._session_summaries.get(self.id)
+        if cached and cached[0] == version:
+            return dict(cached[1])
+        
+        row = get_read_connection(shards.user_db_path(self.id)).execute(
+            """
+            SELECT COUNT(*), COALESCE(SUM(duration_minutes), 0), COALESCE(SUM(points_earned), 0),
+                COALESCE(SUM(completed_pomodoros), 0), COALESCE(SUM(drowsy_events), 0),
+                COALESCE(SUM(yawn_events), 0), COALESCE(SUM(distraction_events), 0)
+            FROM user_sessions WHERE user_id = ?
+            """,
+            (self.id,)
+        ).fetchone()
+        summary = {
+            'total_sessions': row[0],
+            'total_focus_minutes': int(row[1]),
+            'total_points': int(row[2]),
+            'completed_pomodoros': int(row[3]),
+            'total_drowsy_events': int(row[4]),
+            'total_yawn_events': int(row[5]),
+            'total_distraction_events': int(row[6])
+        }
+        User._session_summaries[self.id] = (version, summary)
+        return dict(summary)
+    
+
 # Add these methods to the User class in user.py if they don't exist
 # Otherwise, make sure they're defined correctly and properly integrated
 
     def get_achievements(self):
         """Get user achievements from database"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute(
@@ -472,70 +570,59 @@ class User(UserMixin):
         )
         achievements = cursor.fetchall()
         
-        conn.close()
-        
         return [dict(achievement) for achievement in achievements]
 
     def save_achievement(self, achievement_data):
         """Save or update a user achievement"""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        return self.save_achievements([achievement_data])
+
+    def save_achievements(self, achievements):
+        """
+        Upsert several achievements with one executemany (joins the caller's transaction)
+
+        completed_at keeps its original value while an achievement stays completed.
+        """
+        now = datetime.now()
+        rows = [
+            (
+                self.id,
+                achievement['id'],
+                achievement['name'],
+                achievement['description'],
+                achievement['points'],
+                achievement['completed'],
+                now if achievement['completed'] else None
+            )
+            for achievement in achievements
+        ]
+        if not rows:
+            return True
         
         try:
-            # Check if achievement exists
-            cursor.execute(
-                "SELECT id FROM user_achievements WHERE user_id = ? AND achievement_id = ?",
-                (self.id, achievement_data['id'])
-            )
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Update existing achievement
-                cursor.execute(
-                    """
-                    UPDATE user_achievements
-                    SET completed = ?, completed_at = ?
-                    WHERE user_id = ? AND achievement_id = ?
-                    """,
-                    (
-                        achievement_data['completed'],
-                        datetime.now() if achievement_data['completed'] else None,
-                        self.id,
-                        achievement_data['id']
-                    )
-                )
-            else:
-                # Insert new achievement
-                cursor.execute(
+            with transaction() as conn:
+                conn.executemany(
                     """
                     INSERT INTO user_achievements
                     (user_id, achievement_id, name, description, points, completed, completed_at)
                     VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id, achievement_id) DO UPDATE SET
+                        completed = excluded.completed,
+                        completed_at = CASE
+                            WHEN excluded.completed THEN COALESCE(user_achievements.completed_at, excluded.completed_at)
+                            ELSE NULL
+                        END
                     """,
-                    (
-                        self.id,
-                        achievement_data['id'],
-                        achievement_data['name'],
-                        achievement_data['description'],
-                        achievement_data['points'],
-                        achievement_data['completed'],
-                        datetime.now() if achievement_data['completed'] else None
-                    )
+                    rows
                 )
-            
-            conn.commit()
+                after_commit(lambda: data_versions.bump('profile', self.id))
             return True
         except Exception as e:
-            conn.rollback()
-            logger.error(f"Error saving achievement: {str(e)}")
+            logger.error(f"Error saving achievements: {str(e)}")
             return False
-        finally:
-            conn.close()
 
     def get_badges(self):
         """Get user badges from database"""
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute(
@@ -544,61 +631,51 @@ class User(UserMixin):
         )
         badges = cursor.fetchall()
         
-        conn.close()
-        
         return [dict(badge) for badge in badges]
 
     def save_badge(self, badge_data):
         """Save or update a user badge"""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        return self.save_badges([badge_data])
+
+    def save_badges(self, badges):
+        """
+        Upsert several badges with one executemany (joins the caller's transaction)
+
+        unlocked_at keeps its original value while a badge stays unlocked.
+        """
+        now = datetime.now()
+        rows = [
+            (
+                self.id,
+                badge['id'],
+                badge['name'],
+                badge['description'],
+                badge['unlocked'],
+                now if badge['unlocked'] else None
+            )
+            for badge in badges
+        ]
+        if not rows:
+            return True
         
         try:
-            # Check if badge exists
-            cursor.execute(
-                "SELECT id FROM user_badges WHERE user_id = ? AND badge_id = ?",
-                (self.id, badge_data['id'])
-            )
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Update existing badge
-                cursor.execute(
-                    """
-                    UPDATE user_badges
-                    SET unlocked = ?, unlocked_at = ?
-                    WHERE user_id = ? AND badge_id = ?
-                    """,
-                    (
-                        badge_data['unlocked'],
-                        datetime.now() if badge_data['unlocked'] else None,
-                        self.id,
-                        badge_data['id']
-                    )
-                )
-            else:
-                # Insert new badge
-                cursor.execute(
+            with transaction() as conn:
+                conn.executemany(
                     """
                     INSERT INTO user_badges
                     (user_id, badge_id, name, description, unlocked, unlocked_at)
                     VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id, badge_id) DO UPDATE SET
+                        unlocked = excluded.unlocked,
+                        unlocked_at = CASE
+                            WHEN excluded.unlocked THEN COALESCE(user_badges.unlocked_at, excluded.unlocked_at)
+                            ELSE NULL
+                        END
                     """,
-                    (
-                        self.id,
-                        badge_data['id'],
-                        badge_data['name'],
-                        badge_data['description'],
-                        badge_data['unlocked'],
-                        datetime.now() if badge_data['unlocked'] else None
-                    )
+                    rows
                 )
-            
-            conn.commit()
+                after_commit(lambda: data_versions.bump('profile', self.id))
             return True
         except Exception as e:
-            conn.rollback()
-            logger.error(f"Error saving badge: {str(e)}")
+            logger.error(f"Error saving badges: {str(e)}")
             return False
-        finally:
-            conn.close()
\ No newline at end of file
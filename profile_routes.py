@@ -1,8 +1,12 @@
-from flask import Blueprint, flash, redirect, render_template, request, jsonify, current_app, url_for
+from flask import Blueprint, flash, redirect, render_template, request, jsonify, current_app, url_for, Response, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
+from models import analytics, data_versions
 from models.user import User
+from utils.leaderboard import leaderboard_service
+import json
 import logging
+from datetime import datetime, timedelta
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -21,8 +25,11 @@ def profile_page():
         flash('User data not found', 'error')
         return redirect(url_for('auth.login_page'))
     
-    # Get session history
+    # Get recent sessions and all-time totals
     sessions = user.get_session_history(limit=5)
+    summary = user.get_session_summary()
+    total_sessions = summary['total_sessions']
+    total_focus_minutes = summary['total_focus_minutes']
     
     # Get the achievement manager for the user to ensure consistent points
     from app import get_detector_for_user
@@ -30,7 +37,7 @@ def profile_page():
     
     # Get consistent points from achievement manager instead of just sessions
     if detector and detector.achievement_manager:
-        # Make sure profile is loaded from database
+        # Make sure profile is loaded (cached until the profile changes)
         detector.achievement_manager.load_profile_from_db()
         
         # Get gamification status which contains the complete points
@@ -42,10 +49,8 @@ def profile_page():
         daily_streak = gamification_data.get('daily_streak', 0)
         pomodoro_streak = gamification_data.get('pomodoro_streak', 0)
     else:
-        # Fallback to the old calculation method if achievement manager not available
-        total_sessions = len(user.get_session_history())
-        total_focus_minutes = sum(session.get('duration_minutes', 0) for session in user.get_session_history())
-        total_points = sum(session.get('points_earned', 0) for session in user.get_session_history())
+        # Fallback to session totals if achievement manager not available
+        total_points = summary['total_points']
         
         # Get user settings for streaks and level
         settings = user.get_settings() or {}
@@ -55,10 +60,6 @@ def profile_page():
         daily_streak = settings.get('daily_streak', 0)
         pomodoro_streak = settings.get('pomodoro_streak', 0)
     
-    # Calculate total_focus_minutes from sessions for progress bars
-    total_focus_minutes = sum(session.get('duration_minutes', 0) for session in user.get_session_history())
-    total_sessions = len(user.get_session_history())
-    
     # Format focus time for display
     hours = total_focus_minutes // 60
     minutes = total_focus_minutes % 60
@@ -93,17 +94,8 @@ def get_profile():
     if not user:
         return jsonify({'success': False, 'message': 'User not found'}), 404
     
-    # Get session history stats
-    sessions = user.get_session_history()
-    total_sessions = len(sessions)
-    total_focus_minutes = sum(session.get('duration_minutes', 0) for session in sessions)
-    total_points = sum(session.get('points_earned', 0) for session in sessions)
-    
-    # Calculate additional stats
-    completed_pomodoros = sum(session.get('completed_pomodoros', 0) for session in sessions)
-    total_drowsy_events = sum(session.get('drowsy_events', 0) for session in sessions)
-    total_yawn_events = sum(session.get('yawn_events', 0) for session in sessions)
-    total_distraction_events = sum(session.get('distraction_events', 0) for session in sessions)
+    # Get session totals (SQL aggregate, cached until the next session)
+    summary = user.get_session_summary()
     
     # Format user data for response
     user_data = {
@@ -113,15 +105,7 @@ def get_profile():
         'full_name': user.full_name,
         'created_at': user.created_at,
         'last_login': user.last_login,
-        'stats': {
-            'total_sessions': total_sessions,
-            'total_focus_minutes': total_focus_minutes,
-            'total_points': total_points,
-            'completed_pomodoros': completed_pomodoros,
-            'total_drowsy_events': total_drowsy_events,
-            'total_yawn_events': total_yawn_events,
-            'total_distraction_events': total_distraction_events
-        }
+        'stats': summary
     }
     
     return jsonify({'success': True, 'user': user_data})
@@ -179,12 +163,12 @@ def update_profile():
         # Execute update
         cursor.execute(query, params)
         conn.commit()
+        # Cached users rows (User.get_by_id) must reload
+        data_versions.bump('user', user.id)
         
         # Update user object
         user.full_name = full_name
-        
-        # Close connection
-        conn.close()
+        leaderboard_service.update_user(user.id, name=full_name)
         
         logger.info(f"Profile updated for user {user.username}")
         
@@ -200,16 +184,50 @@ def update_profile():
         })
         
     except Exception as e:
+        user._get_db_connection().rollback()
         logger.error(f"Error updating profile for user {user.username}: {str(e)}")
         return jsonify({'success': False, 'message': 'Failed to update profile. Please try again.'}), 500
 
+# Largest page /api/user/sessions will return
+MAX_SESSIONS_PAGE = 1000
+
+
+def _stream_sessions(sessions, head, tail=None):
+    """
+    Stream a JSON object holding a sessions list without building it in memory
+    
+    Args:
+        sessions: Iterable of session dicts
+        head: Fields written before "sessions"
+        tail: Optional callable returning fields written after it (called
+            once the sessions have been consumed)
+    """
+    def generate():
+        yield json.dumps(head)[:-1] + ', "sessions": ['
+        for index, session in enumerate(sessions):
+            yield (',' if index else '') + json.dumps(session, default=str)
+        yield ']'
+        if tail:
+            yield ', ' + json.dumps(tail())[1:-1]
+        yield '}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
 @profile_bp.route('/api/user/sessions', methods=['GET'])
 @login_required
 def get_user_sessions():
-    """Get user session history"""
-    # Get pagination parameters
-    page = request.args.get('page', 1, type=int)
-    limit = request.args.get('limit', 10, type=int)
+    """
+    Get one page of user session history, newest first
+    
+    Query args:
+        limit: Page size (default 10, at most MAX_SESSIONS_PAGE)
+        cursor: next_cursor from the previous page (omit for the first page)
+        include: 'visualization' to also return the visualization data
+    """
+    limit = max(1, min(request.args.get('limit', 10, type=int), MAX_SESSIONS_PAGE))
+    cursor = request.args.get('cursor') or None
+    include_visualization = request.args.get('include') == 'visualization'
     
     # Get user from database
     user = User.get_by_id(current_user.id)
@@ -217,52 +235,101 @@ def get_user_sessions():
     if not user:
         return jsonify({'success': False, 'message': 'User not found'}), 404
     
-    # Get session history
-    sessions = user.get_session_history(limit=limit)
+    try:
+        if cursor:
+            User.decode_session_cursor(cursor)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    return jsonify({
-        'success': True,
-        'sessions': sessions,
-        'pagination': {
-            'page': page,
+    # One extra row tells whether another page follows
+    page = {'last': None, 'has_more': False}
+    
+    def sessions():
+        for index, session in enumerate(user.iter_sessions(limit + 1, cursor, include_visualization)):
+            if index == limit:
+                page['has_more'] = True
+                break
+            page['last'] = session
+            yield session
+    
+    def pagination():
+        next_cursor = None
+        if page['has_more']:
+            next_cursor = User.encode_session_cursor(page['last'])
+        return {'pagination': {
             'limit': limit,
-            'total': len(sessions)  # In a real app, you'd get the total count from DB
-        }
-    })
+            'total': user.get_session_summary()['total_sessions'],
+            'next_cursor': next_cursor
+        }}
+    
+    return _stream_sessions(sessions(), {'success': True}, pagination)
 
 
-# Ensure the limit parameter is respected
 @profile_bp.route('/api/user/sessions/all', methods=['GET'])
 @login_required
 def get_all_user_sessions():
-    """Get full user session history"""
+    """Get full user session history (streamed, without visualization data)"""
     # Get user from database
     user = User.get_by_id(current_user.id)
     
     if not user:
         return jsonify({'success': False, 'message': 'User not found'}), 404
     
-    # Get all session history with a high limit
-    # You can adjust this based on your needs
-    max_limit = 200
-    sessions = user.get_session_history(limit=max_limit)
+    total = user.get_session_summary()['total_sessions']
+    return _stream_sessions(user.iter_sessions(), {'success': True, 'total': total})
+
+
+def _parse_range_bound(value, is_end):
+    """
+    Parse a from/to query arg ('YYYY-MM-DD' or ISO datetime)
     
-    # Format session data for better display
-    formatted_sessions = []
-    for session in sessions:
-        # Create a copy to avoid modifying the original
-        session_copy = dict(session)
-        
-        # Format timestamps if they exist
-        if 'start_time' in session_copy and session_copy['start_time']:
-            if isinstance(session_copy['start_time'], str):
-                # Keep as is, it's already a string
-                pass
-        
-        formatted_sessions.append(session_copy)
+    A bare date as the end of a range includes that whole day.
+    """
+    parsed = datetime.fromisoformat(value)
+    if is_end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+@profile_bp.route('/api/user/stats', methods=['GET'])
+@login_required
+def get_user_stats():
+    """
+    Get session and detection-event statistics in time buckets
+    
+    Query args:
+        from: Start of the range (default: 29 days before today)
+        to: End of the range (default: end of today)
+        bucket: 'hour', 'day' (default) or 'week'
+    """
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in analytics.BUCKETS:
+        return jsonify({'success': False, 'message': f"bucket must be one of {', '.join(analytics.BUCKETS)}"}), 400
+    
+    # Defaults are whole days so repeated requests share a cache entry
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        end = _parse_range_bound(request.args['to'], True) if request.args.get('to') else today + timedelta(days=1)
+        start = _parse_range_bound(request.args['from'], False) if request.args.get('from') else today - timedelta(days=29)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'from and to must be ISO dates or datetimes'}), 400
+    
+    if start >= end:
+        return jsonify({'success': False, 'message': 'from must be before to'}), 400
+    bucket_seconds = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}[bucket]
+    if (end - start).total_seconds() / bucket_seconds > analytics.MAX_BUCKETS:
+        return jsonify({'success': False, 'message': 'Range too large for this bucket size'}), 400
+    
+    try:
+        buckets = analytics.get_bucketed_stats(current_user.id, start.isoformat(), end.isoformat(), bucket)
+    except Exception as e:
+        logger.error(f"Error computing statistics for user {current_user.id}: {str(e)}")
+        return jsonify({'success': False, 'message': 'Failed to compute statistics'}), 500
     
     return jsonify({
         'success': True,
-        'sessions': formatted_sessions,
-        'total': len(formatted_sessions)
-    })
\ No newline at end of file
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'bucket': bucket,
+        'buckets': buckets
+    })
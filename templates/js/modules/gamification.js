@@ -314,8 +314,17 @@ const Gamification = (function() {
       achievementModalClose.addEventListener('click', closeAchievementModal);
     }
     
-    // Initial load of leaderboard (without period selector)
-    AppState.getSocket().emit('get_leaderboard_data');
+    // Switching period starts again from the first page
+    const leaderboardPeriod = document.getElementById('leaderboardPeriod');
+    if (leaderboardPeriod) {
+      leaderboardPeriod.addEventListener('change', function() {
+        currentLeaderboardPeriod = this.value;
+        requestLeaderboardPage(1);
+      });
+    }
+    
+    // Initial load of leaderboard (first page)
+    requestLeaderboardPage(1);
     
     // Request analytics data
     AppState.getSocket().emit('get_analytics_data');
@@ -487,24 +496,41 @@ const Gamification = (function() {
   // Add these to the Gamification namespace private variables
   let currentLeaderboardPage = 1;
   const usersPerPage = 5;
-  let allLeaderboardUsers = [];
+  let leaderboardPageUsers = [];
+  let leaderboardTotalPages = 1;
+  let leaderboardMe = null;
+  let currentLeaderboardPeriod = 'all';
+  
+  // Ask the server for one page of the selected period's leaderboard
+  function requestLeaderboardPage(page) {
+    AppState.getSocket().emit('get_leaderboard_data', {
+      page: page,
+      page_size: usersPerPage,
+      period: currentLeaderboardPeriod
+    });
+  }
   
-  // Update the updateLeaderboard function to support pagination
-  function updateLeaderboard(users) {
+  // Render the leaderboard page sent by the server ({users, page, total_pages, me})
+  function updateLeaderboard(data) {
     const leaderboardList = document.getElementById('leaderboardList');
     if (!leaderboardList) return;
 
-    // Store all users for pagination
-    if (users && users.length > 0) {
-        allLeaderboardUsers = [...users];
-        console.log(`Received ${users.length} users for leaderboard`);
+    if (data) {
+        leaderboardPageUsers = data.users || [];
+        currentLeaderboardPage = data.page || 1;
+        leaderboardTotalPages = data.total_pages || 1;
+        leaderboardMe = data.me || null;
+        if (data.period) {
+            currentLeaderboardPeriod = data.period;
+        }
+        console.log(`Received leaderboard page ${currentLeaderboardPage} of ${leaderboardTotalPages}`);
     }
 
     // Clear current items
     leaderboardList.innerHTML = '';
 
     // If no users, show placeholder
-    if (!allLeaderboardUsers || allLeaderboardUsers.length === 0) {
+    if (!leaderboardPageUsers || leaderboardPageUsers.length === 0) {
         leaderboardList.innerHTML = `
             <div class="py-3 text-center text-gray-400">
                 <i class="fas fa-users opacity-50 text-2xl mb-2"></i>
@@ -514,22 +540,8 @@ const Gamification = (function() {
         return;
     }
 
-    // Calculate pagination values
-    const totalPages = Math.ceil(allLeaderboardUsers.length / usersPerPage);
-    
-    // Make sure current page is valid
-    if (currentLeaderboardPage > totalPages) {
-        currentLeaderboardPage = totalPages;
-    } else if (currentLeaderboardPage < 1) {
-        currentLeaderboardPage = 1;
-    }
-
-    // Calculate indices for the current page
-    const startIndex = (currentLeaderboardPage - 1) * usersPerPage;
-    const endIndex = Math.min(startIndex + usersPerPage, allLeaderboardUsers.length);
-    
-    // Get current page users
-    const currentPageUsers = allLeaderboardUsers.slice(startIndex, endIndex);
+    const totalPages = leaderboardTotalPages;
+    const currentPageUsers = leaderboardPageUsers;
     
     // Check if current user is in the current page
     let currentUserInCurrentPage = currentPageUsers.some(user => user.is_current_user);
@@ -539,8 +551,8 @@ const Gamification = (function() {
         // Determine if this is the current user (for highlighting)
         const isCurrentUser = user.is_current_user === true;
         
-        // Calculate actual ranking
-        const actualRank = startIndex + index + 1;
+        // Rank computed by the server
+        const actualRank = user.rank;
         
         // Create leaderboard item with enhanced styling
         const itemEl = document.createElement('div');
@@ -604,13 +616,12 @@ const Gamification = (function() {
     
     // If current user is not in the current page but exists in the data, add pagination hint
     if (!currentUserInCurrentPage) {
-        const currentUserInFullList = allLeaderboardUsers.findIndex(user => user.is_current_user);
-        if (currentUserInFullList !== -1) {
-            const userPage = Math.floor(currentUserInFullList / usersPerPage) + 1;
+        if (leaderboardMe && leaderboardMe.rank) {
+            const userPage = leaderboardMe.page;
             
             const userPageHint = document.createElement('div');
             userPageHint.className = 'text-center text-sm text-blue-600 mt-2 mb-1';
-            userPageHint.innerHTML = `<i class="fas fa-info-circle mr-1"></i> You are on page ${userPage} of the leaderboard`;
+            userPageHint.innerHTML = `<i class="fas fa-info-circle mr-1"></i> You are #${leaderboardMe.rank}, on page ${userPage} of the leaderboard`;
             leaderboardList.appendChild(userPageHint);
         }
     }
@@ -628,8 +639,7 @@ const Gamification = (function() {
         prevButton.disabled = currentLeaderboardPage === 1;
         prevButton.addEventListener('click', () => {
             if (currentLeaderboardPage > 1) {
-                currentLeaderboardPage--;
-                updateLeaderboard();
+                requestLeaderboardPage(currentLeaderboardPage - 1);
             }
         });
         paginationContainer.appendChild(prevButton);
@@ -648,8 +658,7 @@ const Gamification = (function() {
         nextButton.disabled = currentLeaderboardPage === totalPages;
         nextButton.addEventListener('click', () => {
             if (currentLeaderboardPage < totalPages) {
-                currentLeaderboardPage++;
-                updateLeaderboard();
+                requestLeaderboardPage(currentLeaderboardPage + 1);
             }
         });
         paginationContainer.appendChild(nextButton);
@@ -959,16 +968,14 @@ const Gamification = (function() {
     },
     
     nextLeaderboardPage: function() {
-      if (allLeaderboardUsers.length > (currentLeaderboardPage * usersPerPage)) {
-        currentLeaderboardPage++;
-        updateLeaderboard();
+      if (currentLeaderboardPage < leaderboardTotalPages) {
+        requestLeaderboardPage(currentLeaderboardPage + 1);
       }
     },
     
     prevLeaderboardPage: function() {
       if (currentLeaderboardPage > 1) {
-        currentLeaderboardPage--;
-        updateLeaderboard();
+        requestLeaderboardPage(currentLeaderboardPage - 1);
       }
     }
   };
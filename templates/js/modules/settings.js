@@ -182,8 +182,14 @@ const Settings = (function() {
           headPoseThresholdValue.textContent = `${settings.detection.head_pose_threshold}°`;
         }
         
-        // Update Current Detection UI
-        Detection.updateDetectionUI(settings.detection);
+        // Update Current Detection UI with the thresholds in effect
+        // (adaptive ones when enabled, the fixed ones otherwise)
+        const detection = settings.detection;
+        Detection.updateDetectionUI({
+          eye_threshold: detection.adaptive_eye_threshold ?? detection.eye_threshold,
+          mouth_threshold: detection.adaptive_mouth_threshold ?? detection.mouth_threshold,
+          head_pose_threshold: detection.head_pose_threshold
+        });
       }
 
       if (settings.pomodoro) {
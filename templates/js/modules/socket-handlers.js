@@ -148,12 +148,8 @@ const SocketHandlers = (function() {
         return;
       }
       
-      // Reset to first page when new data is received
-      if (typeof Gamification.resetLeaderboardPage === 'function') {
-        Gamification.resetLeaderboardPage();
-      }
-      
-      Gamification.updateLeaderboard(data.users);
+      // The server sends one page at a time
+      Gamification.updateLeaderboard(data);
     });
     
     // Analytics events
@@ -198,7 +194,16 @@ const SocketHandlers = (function() {
       // Pass all sessions to the function that handles pagination internally
       Statistics.updateHistoricalSessions(data.sessions || []);
     });
-    
+
+    // Session persistence finished on the server (sent after 'detection_status: stopped')
+    socket.on('session_finalized', (data) => {
+      if (data.success) {
+        console.log('Session saved:', data);
+      } else {
+        console.error('Failed to save session:', data.error);
+      }
+    });
+
     // Setup logout handler to clear sessionStorage
     setupLogoutHandler();
     
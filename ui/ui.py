@@ -1,6 +1,7 @@
 import cv2
 import numpy as np
 from datetime import datetime
+from config import FORWARD_HEAD_POSES
 
 class DrowsinessUI:
     """Enhanced UI class for drowsiness detection system"""
@@ -95,15 +96,16 @@ class DrowsinessUI:
             self.draw_alert(frame, "DROWSINESS ALERT!", 120)
         if metrics['yawning']:
             self.draw_alert(frame, "YAWNING DETECTED!", 180)
-        if metrics['distracted']:
+        if metrics['focus_alert']:
             self.draw_alert(frame, "FOCUS ALERT!", 240)
         if metrics['camera_blocked']:
             self.draw_alert(frame, "CAMERA BLOCKED!", 300)
         
         # Draw head pose indicator if available
         if 'head_pose' in metrics:
+            pose_color = 'white' if metrics['head_pose'] in FORWARD_HEAD_POSES else 'warning'
             cv2.putText(frame, f"Head Pose: {metrics['head_pose']}", 
                        (width - 250, 30), self.FONT, self.FONT_SMALL, 
-                       self.COLORS['white'], 1)
+                       self.COLORS[pose_color], 1)
         
         return frame
\ No newline at end of file
@@ -0,0 +1,198 @@
+# utils/account_index.py
+import logging
+import math
+import os
+import threading
+
+from models.database import get_read_connection
+
+# Keep only Bloom filters in memory (and confirm possible matches with one
+# indexed query) instead of every username and email
+USE_BLOOM = os.environ.get('FOCUSGUARD_ACCOUNT_BLOOM') == '1'
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Never answers False for an added item; answers True for an item never
+    added with probability about error_rate while at most capacity items
+    have been added.
+
+    Positions come from Python's str hash, which is fixed for the life of
+    the process, so a filter is only valid in the process that built it.
+    """
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @staticmethod
+    def _hashes(item):
+        # Double hashing on the two halves of one 64-bit hash: position i
+        # is (h1 + i * h2) % size (Kirsch-Mitzenmacher)
+        value = hash(item)
+        return value & 0xffffffff, (value >> 32) & 0xffffffff | 1
+
+    def add(self, item):
+        first, second = self._hashes(item)
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (first + i * second) % size
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        first, second = self._hashes(item)
+        bits, size = self.bits, self.size
+        # Most absent items stop at the first or second clear bit
+        for i in range(self.hashes):
+            position = (first + i * second) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class AccountIndex:
+    """
+    In-memory index of registered usernames and emails.
+
+    Answers the registration form's availability checks (asked on every
+    keystroke) without a database query. Loaded from the users table once
+    (start_background_load() at startup; checks made before it finishes
+    fall back to a query), then kept current by add() from User.create().
+    Keys are normalized the way the auth routes compare them: usernames
+    stripped (case-sensitive, like the UNIQUE column), emails stripped and
+    lower-cased.
+
+    With bloom=True (or FOCUSGUARD_ACCOUNT_BLOOM=1) only Bloom filters are
+    kept: a miss means available with no query, and a possible hit is
+    confirmed with one indexed lookup, so answers stay exact at a fraction
+    of the memory for very large user bases. A filter that fills to its
+    capacity keeps taking new accounts while a background thread rebuilds
+    it from the database at twice the size.
+    """
+
+    # Bloom filter false-positive rate, and spare capacity allowed for growth
+    BLOOM_ERROR_RATE = 0.01
+    BLOOM_GROWTH = 2
+
+    def __init__(self, path=None, bloom=None):
+        self.path = path
+        self.bloom = USE_BLOOM if bloom is None else bloom
+        self._usernames = set()
+        self._emails = set()
+        self._loaded = False
+        # Accounts created while a load is reading the users table
+        self._pending = None
+        # A background rebuild of full Bloom filters is under way
+        self._growing = False
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def username_key(username):
+        return (username or '').strip()
+
+    @staticmethod
+    def email_key(email):
+        return (email or '').strip().lower()
+
+    @property
+    def is_loaded(self):
+        return self._loaded
+
+    def start_background_load(self):
+        """Load the index on a daemon thread (a million accounts take seconds)"""
+        thread = threading.Thread(target=self._load_safely, name="account-index")
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _load_safely(self):
+        try:
+            self.reload()
+        except Exception as e:
+            logging.error(f"Error loading account index: {str(e)}")
+        finally:
+            self._growing = False
+
+    def reload(self):
+        """Rebuild the index from the database"""
+        with self._lock:
+            self._pending = []
+        rows = get_read_connection(self.path).execute("SELECT username, email FROM users").fetchall()
+        if self.bloom:
+            capacity = max(1024, len(rows) * self.BLOOM_GROWTH)
+            usernames = BloomFilter(capacity, self.BLOOM_ERROR_RATE)
+            emails = BloomFilter(capacity, self.BLOOM_ERROR_RATE)
+            for username, email in rows:
+                usernames.add(self.username_key(username))
+                emails.add(self.email_key(email))
+        else:
+            usernames = {self.username_key(username) for username, _ in rows}
+            emails = {self.email_key(email) for _, email in rows}
+
+        with self._lock:
+            for username, email in self._pending:
+                usernames.add(self.username_key(username))
+                emails.add(self.email_key(email))
+            self._pending = None
+            self._usernames = usernames
+            self._emails = emails
+            self._loaded = True
+        logging.info(f"Account index loaded with {len(rows)} accounts{' (Bloom filters)' if self.bloom else ''}")
+
+    def add(self, username, email):
+        """
+        Record a newly created account
+
+        Cheap no-op until a load starts; one in progress also picks the
+        account up when it finishes.
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((username, email))
+            if not self._loaded:
+                return
+            # Checks keep using the current index until a reload replaces it
+            self._usernames.add(self.username_key(username))
+            self._emails.add(self.email_key(email))
+            grow = (self.bloom and not self._growing and self._pending is None
+                    and self._usernames.count >= self._usernames.capacity)
+            if grow:
+                self._growing = True
+        if grow:
+            # Never rebuilt inside the request (a users table scan); past its
+            # capacity the filter only costs more confirming queries
+            self.start_background_load()
+
+    def _confirm(self, column, value):
+        """Exact check (behind a Bloom filter hit, or before the index is loaded)"""
+        return get_read_connection(self.path).execute(
+            f"SELECT 1 FROM users WHERE {column} = ?", (value,)
+        ).fetchone() is not None
+
+    def username_taken(self, username):
+        """True if an account already uses this username"""
+        key = self.username_key(username)
+        if not self._loaded:
+            return self._confirm('username', key)
+        if key not in self._usernames:
+            return False
+        return not self.bloom or self._confirm('username', key)
+
+    def email_taken(self, email):
+        """True if an account is already registered with this email"""
+        key = self.email_key(email)
+        if not self._loaded:
+            return self._confirm('email', key)
+        if key not in self._emails:
+            return False
+        return not self.bloom or self._confirm('email', key)
+
+
+# Shared instance used by the web app
+account_index = AccountIndex()
@@ -1,11 +1,27 @@
 # utils/achievement_manager.py
 import json
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from models import data_versions
+from models.database import after_commit, transaction
+
 class AchievementManager:
-    """Manages the gamification and reward system for FocusGuard"""
+    """
+    Manages the gamification and reward system for FocusGuard
+
+    The profile is a write-behind cache: it is loaded from the database once,
+    reads are served from memory, and save_profile() writes only the rows
+    that differ from what the database last held. Writes made elsewhere
+    (through User) bump the user's 'profile' data version, which makes the
+    next load_profile_from_db() reload.
+    """
+
+    # Dirty profiles are flushed at least this often by flush_if_due()
+    FLUSH_INTERVAL_SECONDS = 30
     
     def __init__(self, user_id=None, save_dir="gamification"):
         self.save_dir = Path(save_dir)
@@ -15,6 +31,13 @@ class AchievementManager:
         self.user_id = user_id
         self.user = None
         
+        # Write-behind cache state: the rows the database last held and the
+        # profile data version they were loaded at (None until loaded)
+        self._persisted = None
+        self._loaded_version = None
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        
         # Get user object if user_id is provided
         if user_id:
             from models.user import User
@@ -140,12 +163,27 @@ class AchievementManager:
             self.load_profile_from_db()
 
         
-    def load_profile_from_db(self):
-        """Load user profile from database"""
+    def load_profile_from_db(self, force=False):
+        """
+        Load user profile from database
+        
+        Args:
+            force: Reload even if the cached profile is current
+        """
         if not self.user:
             logging.warning("No user provided for load_profile_from_db")
             return False
         
+        # Serve from cache unless another code path has written the profile
+        version = data_versions.current('profile', self.user.id)
+        if not force and self._loaded_version == version:
+            return True
+        
+        # Don't lose unsaved changes by reloading over them
+        if self._persisted is not None and self.is_dirty():
+            self.save_profile()
+            version = data_versions.current('profile', self.user.id)
+        
         try:
             # Log start of loading
             logging.info(f"Loading profile from database for user {self.user.id}")
@@ -167,14 +205,7 @@ class AchievementManager:
             else:
                 # Initialize achievements in database
                 logging.info("No achievements found in database, initializing...")
-                for achievement in self.achievements:
-                    self.user.save_achievement({
-                        'id': achievement['id'],
-                        'name': achievement['name'],
-                        'description': achievement['description'],
-                        'points': achievement['points'],
-                        'completed': achievement['completed']
-                    })
+                self.user.save_achievements(self.achievements)
                     
             # Load badges from database
             user_badges = self.user.get_badges()
@@ -193,13 +224,7 @@ class AchievementManager:
             else:
                 # Initialize badges in database
                 logging.info("No badges found in database, initializing...")
-                for badge in self.badges:
-                    self.user.save_badge({
-                        'id': badge['id'],
-                        'name': badge['name'],
-                        'description': badge['description'],
-                        'unlocked': badge['unlocked']
-                    })
+                self.user.save_badges(self.badges)
                     
             # Load user's profile data from settings
             settings = self.user.get_settings()
@@ -229,6 +254,11 @@ class AchievementManager:
                 logging.info(f"Loaded user profile: points={self.user_profile['points']}, level={self.user_profile['level']}")
             else:
                 logging.warning(f"No settings found for user {self.user.id}")
+            
+            # What was just loaded is what the database holds
+            with self._lock:
+                self._persisted = self._current_rows()
+                self._loaded_version = version
                 
             return True
                 
@@ -238,53 +268,138 @@ class AchievementManager:
             logging.error(traceback.format_exc())
             return False
 
-    def save_profile(self):
-        """Save user profile to database and file"""
-        if self.user:
-            try:
-                # Save achievements one by one
-                for achievement in self.achievements:
-                    self.user.save_achievement(achievement)
-                    
-                # Save badges one by one
-                for badge in self.badges:
-                    self.user.save_badge(badge)
-                    
-                # Save profile data to user settings
-                profile_settings = {
-                    'profile_points': self.user_profile['points'],
-                    'profile_level': self.user_profile['level'],
-                    'profile_experience': self.user_profile['experience'],
-                    'daily_streak': self.user_profile['streaks']['daily_login'],
-                    'pomodoro_streak': self.user_profile['streaks']['pomodoro_sessions']
-                }
+    def _profile_settings(self):
+        """Build the user_settings columns owned by the profile"""
+        profile_settings = {
+            'profile_points': self.user_profile['points'],
+            'profile_level': self.user_profile['level'],
+            'profile_experience': self.user_profile['experience'],
+            'daily_streak': self.user_profile['streaks']['daily_login'],
+            'pomodoro_streak': self.user_profile['streaks']['pomodoro_sessions']
+        }
+        
+        # Save last_session_date and last_check_in_date if they exist
+        if self.user_profile.get('last_session_date'):
+            if isinstance(self.user_profile['last_session_date'], datetime):
+                profile_settings['last_session_date'] = self.user_profile['last_session_date'].isoformat()
+            else:
+                profile_settings['last_session_date'] = self.user_profile['last_session_date']
                 
-                # Save last_session_date and last_check_in_date if they exist
-                if self.user_profile.get('last_session_date'):
-                    if isinstance(self.user_profile['last_session_date'], datetime):
-                        profile_settings['last_session_date'] = self.user_profile['last_session_date'].isoformat()
-                    else:
-                        profile_settings['last_session_date'] = self.user_profile['last_session_date']
-                        
-                if self.user_profile.get('last_check_in_date'):
-                    profile_settings['last_check_in_date'] = self.user_profile['last_check_in_date']
-                        
-                # Update user settings
-                success = self.user.update_settings(profile_settings)
+        if self.user_profile.get('last_check_in_date'):
+            profile_settings['last_check_in_date'] = self.user_profile['last_check_in_date']
+        
+        return profile_settings
+    
+    def _current_rows(self):
+        """Copy the in-memory profile in the shape it is stored in"""
+        return {
+            'achievements': {a['id']: dict(a) for a in self.achievements},
+            'badges': {b['id']: dict(b) for b in self.badges},
+            'settings': self._profile_settings()
+        }
+    
+    def snapshot_profile(self):
+        """
+        Copy the rows that changed since the database was last written, so
+        they can be persisted later (e.g. on the session finalizer thread)
+        
+        Returns:
+            dict: {'achievements': [...], 'badges': [...], 'settings': {...}}
+        """
+        with self._lock:
+            current = self._current_rows()
+            persisted = self._persisted
+            if persisted is None:
+                # Never loaded: write everything, as before caching
+                return {
+                    'achievements': list(current['achievements'].values()),
+                    'badges': list(current['badges'].values()),
+                    'settings': current['settings']
+                }
+            
+            return {
+                'achievements': [
+                    row for key, row in current['achievements'].items()
+                    if persisted['achievements'].get(key, {}).get('completed') != row['completed']
+                ],
+                'badges': [
+                    row for key, row in current['badges'].items()
+                    if persisted['badges'].get(key, {}).get('unlocked') != row['unlocked']
+                ],
+                'settings': {
+                    key: value for key, value in current['settings'].items()
+                    if persisted['settings'].get(key) != value
+                }
+            }
+    
+    def is_dirty(self):
+        """True if the profile has changes the database doesn't have yet"""
+        snapshot = self.snapshot_profile()
+        return bool(snapshot['achievements'] or snapshot['badges'] or snapshot['settings'])
+    
+    def save_profile(self, snapshot=None):
+        """
+        Write the changed profile rows to the database in one transaction
+        
+        Args:
+            snapshot: Rows from snapshot_profile() (defaults to the current changes)
+        """
+        if not self.user:
+            logging.warning("No user provided for save_profile")
+            return False
+        
+        with self._lock:
+            if snapshot is None:
+                snapshot = self.snapshot_profile()
+            self._last_flush = time.monotonic()
+            
+            if not (snapshot['achievements'] or snapshot['badges'] or snapshot['settings']):
+                return True
+            
+            # Writes from other code paths since our load must still be picked up
+            external_write = data_versions.current('profile', self.user.id) != self._loaded_version
+            
+            try:
+                with transaction():
+                    if not self.user.save_achievements(snapshot['achievements']):
+                        raise RuntimeError("achievements could not be saved")
+                    if not self.user.save_badges(snapshot['badges']):
+                        raise RuntimeError("badges could not be saved")
+                    if snapshot['settings'] and not self.user.update_settings(snapshot['settings']):
+                        raise RuntimeError("profile settings could not be saved")
+                    # Inside a caller's transaction (the session finalizer) the
+                    # rows only count as saved once that commits; on rollback
+                    # they stay dirty for the next flush
+                    after_commit(lambda: self._mark_persisted(snapshot, external_write))
                 
-                if success:
-                    logging.info(f"User profile saved to database for user {self.user.id}")
-                    return True
-                else:
-                    logging.error(f"Failed to save user profile settings for user {self.user.id}")
-                    return False
-                    
             except Exception as e:
                 logging.error(f"Error saving user profile to database: {str(e)}")
                 return False
-        else:
-            logging.warning("No user provided for save_profile")
+            
+            logging.info(f"User profile saved to database for user {self.user.id}")
+            return True
+    
+    def _mark_persisted(self, snapshot, external_write):
+        """Record committed snapshot rows as what the database holds"""
+        with self._lock:
+            if self._persisted is None:
+                return
+            for row in snapshot['achievements']:
+                self._persisted['achievements'][row['id']] = dict(row)
+            for row in snapshot['badges']:
+                self._persisted['badges'][row['id']] = dict(row)
+            self._persisted['settings'].update(snapshot['settings'])
+            if not external_write:
+                self._loaded_version = data_versions.current('profile', self.user.id)
+    
+    def flush_if_due(self):
+        """Save the profile if it has changes and FLUSH_INTERVAL_SECONDS have passed"""
+        if time.monotonic() - self._last_flush < self.FLUSH_INTERVAL_SECONDS:
+            return False
+        if not self.user or not self.is_dirty():
+            self._last_flush = time.monotonic()
             return False
+        return self.save_profile()
     
     def _save_profile_to_file(self):
         """
@@ -542,12 +657,9 @@ class AchievementManager:
         for badge in self.badges:
             if 'level_required' in badge and not badge['unlocked']:
                 if current_level >= badge['level_required']:
+                    # Persisted by the next save_profile() / flush_if_due()
                     badge['unlocked'] = True
                     
-                    # Save badge immediately to database if user exists
-                    if self.user:
-                        self.user.save_badge(badge)
-                    
                     newly_unlocked.append({
                         'type': 'badge',
                         'id': badge['id'],
@@ -611,13 +723,10 @@ class AchievementManager:
         """Mark an achievement as completed and award points"""
         for achievement in self.achievements:
             if achievement['id'] == achievement_id and not achievement['completed']:
+                # Persisted by the next save_profile() / flush_if_due()
                 achievement['completed'] = True
                 self.add_points(achievement['points'], f"Achievement: {achievement['name']}")
                 
-                # Save achievement immediately to database if user exists
-                if self.user:
-                    self.user.save_achievement(achievement)
-                
                 return {
                     'type': 'achievement',
                     'id': achievement_id,
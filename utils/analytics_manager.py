@@ -1,124 +1,127 @@
 # utils/analytics_manager.py
-import json
+import csv
 import logging
-import sqlite3
-import pandas as pd
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from models import analytics
+from utils.leaderboard import leaderboard_service
+
 class AnalyticsManager:
-    """Manages analytics tracking for the gamification system"""
+    """
+    Manages analytics tracking for the gamification system
+    
+    Analytics are per user and stored in SQLite (models.analytics): one row
+    per day plus running totals. Session counters are recorded together
+    with the session row (User.add_daily_rollup); achievements, badges and
+    level-ups are counted here in memory and written by save_analytics().
+    """
+    
+    # History / export field -> models.analytics column
+    HISTORY_FIELDS = (
+        ('date', 'day'),
+        ('points_earned', 'points'),
+        ('achievements_unlocked', 'achievements_unlocked'),
+        ('badges_earned', 'badges_earned'),
+        ('focus_minutes', 'focus_minutes'),
+        ('drowsy_events', 'drowsy_events'),
+        ('distraction_events', 'distraction_events'),
+        ('pomodoro_sessions', 'pomodoros'),
+        ('level_ups', 'level_ups'),
+        ('session_count', 'sessions')
+    )
     
-    def __init__(self, save_dir="analytics"):
+    def __init__(self, user_id=None, save_dir="analytics"):
+        self.user_id = user_id
+        
+        # CSV exports are written here
         self.save_dir = Path(save_dir)
         self.save_dir.mkdir(exist_ok=True)
         
-        # Initialize analytics storage
-        self.reset_tracking()
-        
-        # Maintain daily point history for time-based analysis
-        self.point_history = []
-        
-        # Load existing analytics data if available
-        self.load_analytics()
+        # Counter increments not yet written (models.analytics.COUNTERS)
+        self.pending = {}
     
-    def reset_tracking(self):
-        """Reset daily tracking metrics"""
-        self.daily_tracking = {
-            'date': datetime.now().strftime('%Y-%m-%d'),
-            'points_earned': 0,
-            'achievements_unlocked': 0,
-            'badges_earned': 0,
-            'focus_minutes': 0,
-            'drowsy_events': 0,
-            'distraction_events': 0,
-            'pomodoro_sessions': 0,
-            'level_ups': 0,
-            'session_count': 0
-        }
+    def _count(self, counter, amount=1):
+        self.pending[counter] = self.pending.get(counter, 0) + amount
     
-    def load_analytics(self):
-        """Load analytics data from file if it exists"""
-        analytics_path = self.save_dir / "gamification_analytics.json"
-        
-        if analytics_path.exists():
-            try:
-                with open(analytics_path, 'r') as f:
-                    data = json.load(f)
-                    self.point_history = data.get('point_history', [])
-                    
-                    # Check if we need to reset daily tracking (new day)
-                    last_date = self.daily_tracking['date']
-                    current_date = datetime.now().strftime('%Y-%m-%d')
-                    
-                    if last_date != current_date:
-                        # Save yesterday's tracking to history
-                        if self.daily_tracking['points_earned'] > 0:
-                            self.point_history.append(self.daily_tracking)
-                        
-                        # Reset for today
-                        self.reset_tracking()
-                    else:
-                        # Continue today's tracking
-                        self.daily_tracking = data.get('daily_tracking', self.daily_tracking)
-                    
-                    logging.info("Analytics data loaded successfully")
-            except Exception as e:
-                logging.error(f"Error loading analytics data: {str(e)}")
+    def snapshot_analytics(self):
+        """
+        Hand the pending increments to a later save_analytics() call
+
+        The caller owns the snapshot from then on: if it is never committed
+        it must go back through restore_analytics().
+        """
+        pending, self.pending = self.pending, {}
+        return pending
+    
+    def restore_analytics(self, counters):
+        """Put back increments from a snapshot that was not committed"""
+        for counter, amount in counters.items():
+            self._count(counter, amount)
     
-    def save_analytics(self):
-        """Save analytics data to file"""
-        analytics_path = self.save_dir / "gamification_analytics.json"
+    def save_analytics(self, counters=None):
+        """
+        Write counter increments to today's row and the running totals
+        (joins the caller's transaction)
+        
+        Args:
+            counters: Increments from snapshot_analytics() (defaults to
+                everything pending); on failure the caller restores them
+        """
+        drained = counters is None
+        if drained:
+            counters = self.snapshot_analytics()
+        if not counters:
+            return True
+        if not self.user_id:
+            logging.error("No user ID provided for saving analytics")
+            return False
         
         try:
-            data = {
-                'daily_tracking': self.daily_tracking,
-                'point_history': self.point_history
-            }
-            
-            with open(analytics_path, 'w') as f:
-                json.dump(data, f, indent=4)
-                
+            analytics.record_daily(self.user_id, datetime.now().strftime('%Y-%m-%d'), counters)
             logging.info("Analytics data saved successfully")
             return True
         except Exception as e:
+            # Keep the increments for the next save
+            if drained:
+                self.restore_analytics(counters)
             logging.error(f"Error saving analytics data: {str(e)}")
             return False
     
     # Update the track_session method to ensure session stats are properly recorded
-    def track_session(self, session_stats, points_earned):
-        """Track metrics from a completed session"""
-        # Update focus minutes
-        session_duration = session_stats.get('session_duration_minutes', 0)
-        self.daily_tracking['focus_minutes'] += session_duration
-        
-        # Update event counts
-        self.daily_tracking['drowsy_events'] += session_stats.get('total_drowsy_events', 0)
-        self.daily_tracking['distraction_events'] += session_stats.get('total_distraction_events', 0)
-        self.daily_tracking['pomodoro_sessions'] += session_stats.get('completed_pomodoro_sessions', 0)
-        
-        # Update points earned
-        self.daily_tracking['points_earned'] += points_earned
+    def track_session(self, session_stats, points_earned, achievement_manager=None, save=True):
+        """
+        Track metrics from a completed session
         
-        # Increment session count
-        self.daily_tracking['session_count'] += 1
+        Args:
+            session_stats: Session summary dict
+            points_earned: Points awarded for the session
+            achievement_manager: Manager whose profile totals to update
+                (defaults to the current user's detector)
+            save: Write the profile now; pass False when the caller
+                persists it later (session finalizer)
+        """
+        # Focus minutes, events, points and the session count reach the
+        # analytics tables with the session row itself
+        session_duration = session_stats.get('session_duration_minutes', 0)
         
         # Update achievement manager if available
-        detector = self._get_detector_for_current_user()
-        if detector and detector.achievement_manager:
+        if achievement_manager is None:
+            detector = self._get_detector_for_current_user()
+            if detector:
+                achievement_manager = detector.achievement_manager
+        if achievement_manager:
             # Update total focus minutes
-            total_focus_minutes = detector.achievement_manager.user_profile.get('total_focus_minutes', 0)
-            detector.achievement_manager.user_profile['total_focus_minutes'] = total_focus_minutes + session_duration
+            total_focus_minutes = achievement_manager.user_profile.get('total_focus_minutes', 0)
+            achievement_manager.user_profile['total_focus_minutes'] = total_focus_minutes + session_duration
             
             # Update total sessions
-            total_sessions = detector.achievement_manager.user_profile.get('total_sessions', 0)
-            detector.achievement_manager.user_profile['total_sessions'] = total_sessions + 1
+            total_sessions = achievement_manager.user_profile.get('total_sessions', 0)
+            achievement_manager.user_profile['total_sessions'] = total_sessions + 1
             
             # Save the updated profile
-            detector.achievement_manager.save_profile()
-        
-        # Save analytics
-        self.save_analytics()
+            if save:
+                achievement_manager.save_profile()
 
     # Add this helper method to get the detector for the current user
     def _get_detector_for_current_user(self):
@@ -134,33 +137,33 @@ class AnalyticsManager:
         
         return None
     
-    def track_achievement(self, achievement_count=1):
+    def track_achievement(self, achievement_count=1, save=True):
         """Track achievement unlocks"""
-        self.daily_tracking['achievements_unlocked'] += achievement_count
-        self.save_analytics()
+        self._count('achievements_unlocked', achievement_count)
+        if save:
+            self.save_analytics()
     
-    def track_badge(self, badge_count=1):
+    def track_badge(self, badge_count=1, save=True):
         """Track badge earnings"""
-        self.daily_tracking['badges_earned'] += badge_count
-        self.save_analytics()
+        self._count('badges_earned', badge_count)
+        if save:
+            self.save_analytics()
     
-    def track_level_up(self):
+    def track_level_up(self, save=True):
         """Track level ups"""
-        self.daily_tracking['level_ups'] += 1
-        self.save_analytics()
+        self._count('level_ups')
+        if save:
+            self.save_analytics()
+    
+    def _history_row(self, day):
+        """Daily row in the shape of the old analytics JSON entries"""
+        return {field: day[column] for field, column in self.HISTORY_FIELDS}
     
     def get_point_history(self, days=30):
-        """Get point history for the specified number of days"""
-        # Start with today's data
-        history = [self.daily_tracking]
-        
-        # Add historical data (most recent first)
-        history.extend(self.point_history[:days-1])
-        
-        # Ensure we don't exceed the requested number of days
-        history = history[:days]
-        
-        return history
+        """Get daily analytics for the user's last `days` active days (most recent first)"""
+        if not self.user_id:
+            return []
+        return [self._history_row(day) for day in analytics.iter_days(self.user_id, limit=days)]
     
     def get_leaderboard_data(self, limit=10):
         """
@@ -172,52 +175,9 @@ class AnalyticsManager:
         Returns:
             list: List of user data for leaderboard
         """
-        DB_PATH = 'database/focusguard.db'
-        
         try:
-            # Connect to the database
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # Get all active users with their gamification data
-            # Exclude admin user by adding "WHERE username != 'admin'"
-            cursor.execute('''
-                SELECT u.id, u.username, u.full_name, 
-                    s.profile_points, s.profile_level, s.daily_streak, s.pomodoro_streak
-                FROM users u
-                JOIN user_settings s ON u.id = s.user_id
-                WHERE u.is_active = 1 AND u.username != 'admin'
-                ORDER BY s.profile_points DESC
-                LIMIT ?
-            ''', (limit if limit else -1,))
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
-            # Process the result
-            result = []
-            for row in rows:
-                # Check if this is the current user
-                is_current_user = False
-                if hasattr(self, 'current_user_id') and self.current_user_id == row['id']:
-                    is_current_user = True
-                
-                # Format user data for leaderboard
-                user_data = {
-                    'id': row['id'],
-                    'name': row['full_name'],
-                    'username': row['username'],
-                    'points': row['profile_points'] or 0,
-                    'level': row['profile_level'] or 1,
-                    'daily_streak': row['daily_streak'] or 0,
-                    'pomodoro_streak': row['pomodoro_streak'] or 0,
-                    'is_current_user': is_current_user
-                }
-                
-                result.append(user_data)
-                
-            return result
+            # Served from the in-memory leaderboard (no per-request sort)
+            return leaderboard_service.top(limit, getattr(self, 'current_user_id', None))
             
         except Exception as e:
             logging.error(f"Error getting leaderboard data: {str(e)}")
@@ -228,19 +188,23 @@ class AnalyticsManager:
     
     def get_analytics_summary(self):
         """Get a summary of user analytics"""
-        # Calculate engagement metrics
-        total_sessions = sum(day.get('session_count', 0) for day in self.point_history) + self.daily_tracking['session_count']
-        total_focus_minutes = sum(day.get('focus_minutes', 0) for day in self.point_history) + self.daily_tracking['focus_minutes']
-        total_pomodoros = sum(day.get('pomodoro_sessions', 0) for day in self.point_history) + self.daily_tracking['pomodoro_sessions']
+        # Running totals plus whatever has not been written yet
+        totals = analytics.get_totals(self.user_id)
+        for counter, amount in self.pending.items():
+            totals[counter] += amount
+        
+        total_sessions = totals['sessions']
+        total_focus_minutes = totals['focus_minutes']
+        total_pomodoros = totals['pomodoros']
         
         # Calculate daily averages
-        active_days = len(self.point_history) + 1  # +1 for today
-        avg_focus_minutes = total_focus_minutes / max(1, active_days)
-        avg_pomodoros = total_pomodoros / max(1, active_days)
+        active_days = max(1, totals['active_days'])
+        avg_focus_minutes = total_focus_minutes / active_days
+        avg_pomodoros = total_pomodoros / active_days
         
         # Calculate achievement progress
-        total_achievements = sum(day.get('achievements_unlocked', 0) for day in self.point_history) + self.daily_tracking['achievements_unlocked']
-        total_badges = sum(day.get('badges_earned', 0) for day in self.point_history) + self.daily_tracking['badges_earned']
+        total_achievements = totals['achievements_unlocked']
+        total_badges = totals['badges_earned']
         
         # Get point trend
         point_trend = self.get_point_trend()
@@ -276,46 +240,36 @@ class AnalyticsManager:
         }
     
     def get_point_trend(self, days=7):
-        """Get point earning trend for the last N days"""
-        # Start with today
-        trend = [{
-            'date': self.daily_tracking['date'],
-            'points': self.daily_tracking['points_earned']
-        }]
-        
-        # Add historical data
-        for day in self.point_history[:days-1]:
-            trend.append({
-                'date': day['date'],
-                'points': day['points_earned']
-            })
-        
-        # Ensure we don't exceed the requested number of days
-        trend = trend[:days]
-        
-        # Sort by date (oldest first)
-        trend.sort(key=lambda x: x['date'])
-        
+        """Get points earned per day over the last N days (oldest first)"""
+        if not self.user_id:
+            return []
+        since = (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        trend = [
+            {'date': day['day'], 'points': day['points']}
+            for day in analytics.iter_days(self.user_id, since=since)
+        ]
+        trend.reverse()
         return trend
     
     def export_analytics_to_csv(self):
-        """Export analytics data to CSV for further analysis"""
+        """Export the user's daily analytics to CSV for further analysis"""
+        if not self.user_id:
+            logging.error("No user ID provided for exporting analytics")
+            return None
         try:
-            # Combine current day with history
-            all_data = [self.daily_tracking] + self.point_history
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(all_data)
-            
             # Generate filename with timestamp
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = self.save_dir / f"gamification_analytics_{timestamp}.csv"
+            filename = self.save_dir / f"gamification_analytics_{self.user_id}_{timestamp}.csv"
             
-            # Save to CSV
-            df.to_csv(filename, index=False)
+            # Stream rows from the table straight to the CSV
+            with open(filename, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=[field for field, _ in self.HISTORY_FIELDS])
+                writer.writeheader()
+                for day in analytics.iter_days(self.user_id):
+                    writer.writerow(self._history_row(day))
             
             logging.info(f"Analytics exported to {filename}")
             return filename
         except Exception as e:
             logging.error(f"Error exporting analytics: {str(e)}")
-            return None
\ No newline at end of file
+            return None
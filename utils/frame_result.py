@@ -0,0 +1,57 @@
+# utils/frame_result.py
+import time
+
+
+class FrameResult:
+    """
+    Detection results for a single frame.
+
+    Built once per frame by DrowsinessDetector.process_frame and shared by
+    the statistics manager, socket emitters and frame overlays. Supports
+    read-only mapping access (result['ear'], result.get('ear'), 'ear' in
+    result) so consumers written against the old metrics dict keep working.
+    """
+
+    __slots__ = (
+        'timestamp', 'ear', 'mar', 'ear_thresh', 'mar_thresh',
+        'drowsy', 'yawning', 'distracted', 'focus_alert', 'camera_blocked',
+        'head_pose', 'pomodoro', 'fps', 'cpu_usage', 'user_id'
+    )
+
+    def __init__(self, ear=0.0, mar=0.0, ear_thresh=None, mar_thresh=None,
+                 drowsy=False, yawning=False, distracted=False, focus_alert=False,
+                 camera_blocked=False, head_pose=None, pomodoro=None,
+                 fps=0.0, cpu_usage=0.0, user_id=None, timestamp=None):
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self.ear = ear
+        self.mar = mar
+        self.ear_thresh = ear_thresh
+        self.mar_thresh = mar_thresh
+        self.drowsy = drowsy
+        self.yawning = yawning
+        self.distracted = distracted
+        self.focus_alert = focus_alert
+        self.camera_blocked = camera_blocked
+        self.head_pose = head_pose
+        self.pomodoro = pomodoro
+        self.fps = fps
+        self.cpu_usage = cpu_usage
+        self.user_id = user_id
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        """A field counts as present when it has been set to a value"""
+        return getattr(self, key, None) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def as_dict(self):
+        """Return the fields as a plain dict (for JSON payloads)"""
+        return {name: getattr(self, name) for name in self.__slots__}
@@ -0,0 +1,376 @@
+# utils/leaderboard.py
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from models import data_versions
+from models.database import get_read_connection
+
+
+class LeaderboardService:
+    """
+    In-memory all-time leaderboard.
+
+    Loaded from the database once, then kept current by update_user() calls
+    from the code paths that change points or names. Users are kept in a
+    list sorted by (-points, user_id), so top-N and page reads are slices and
+    "my rank" is a binary search instead of a sort of every user.
+    """
+
+    # Fields copied from users / user_settings into each entry
+    FIELDS = ('name', 'username', 'points', 'level', 'daily_streak', 'pomodoro_streak')
+
+    def __init__(self, path=None):
+        self.path = path
+        self._keys = []      # sorted (-points, user_id)
+        self._entries = {}   # user_id -> entry dict
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self.reload()
+
+    def reload(self):
+        """Rebuild the leaderboard from the database"""
+        conn = get_read_connection(self.path)
+        rows = conn.execute('''
+            SELECT u.id, u.username, u.full_name,
+                s.profile_points, s.profile_level, s.daily_streak, s.pomodoro_streak
+            FROM users u
+            JOIN user_settings s ON u.id = s.user_id
+            WHERE u.is_active = 1 AND u.username != 'admin'
+        ''').fetchall()
+
+        entries = {}
+        for row in rows:
+            entries[row['id']] = {
+                'id': row['id'],
+                'name': row['full_name'],
+                'username': row['username'],
+                'points': row['profile_points'] or 0,
+                'level': row['profile_level'] or 1,
+                'daily_streak': row['daily_streak'] or 0,
+                'pomodoro_streak': row['pomodoro_streak'] or 0
+            }
+
+        with self._lock:
+            self._entries = entries
+            self._keys = sorted((-entry['points'], user_id) for user_id, entry in entries.items())
+            self._loaded = True
+        logging.info(f"Leaderboard loaded with {len(entries)} users")
+
+    def update_user(self, user_id, **fields):
+        """
+        Apply changed fields for one user (adds the user if missing)
+
+        Cheap no-op until the leaderboard has been loaded; the first read
+        loads current values from the database anyway.
+        """
+        if not self._loaded:
+            return
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                if fields.get('username') == 'admin':
+                    return
+                entry = {'id': user_id, 'name': '', 'username': '', 'points': 0,
+                         'level': 1, 'daily_streak': 0, 'pomodoro_streak': 0}
+                self._entries[user_id] = entry
+                insort(self._keys, (0, user_id))
+
+            old_points = entry['points']
+            for field in self.FIELDS:
+                if fields.get(field) is not None:
+                    entry[field] = fields[field]
+
+            if entry['points'] != old_points:
+                del self._keys[bisect_left(self._keys, (-old_points, user_id))]
+                insort(self._keys, (-entry['points'], user_id))
+
+    def remove_user(self, user_id):
+        """Drop a user (e.g. deactivated)"""
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                del self._keys[bisect_left(self._keys, (-entry['points'], user_id))]
+
+    def _row(self, index, current_user_id=None):
+        """Entry at a sorted position, with its rank"""
+        user_id = self._keys[index][1]
+        row = dict(self._entries[user_id])
+        row['rank'] = index + 1
+        row['is_current_user'] = user_id == current_user_id
+        return row
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._keys)
+
+    def top(self, limit=10, current_user_id=None):
+        """Return the first limit users (all users if limit is None)"""
+        self._ensure_loaded()
+        with self._lock:
+            end = len(self._keys) if limit is None else min(limit, len(self._keys))
+            return [self._row(i, current_user_id) for i in range(end)]
+
+    def page(self, page=1, page_size=10, current_user_id=None):
+        """
+        Return one page of the leaderboard
+
+        Returns:
+            tuple: (rows, total_users)
+        """
+        self._ensure_loaded()
+        with self._lock:
+            total = len(self._keys)
+            start = max(0, (page - 1) * page_size)
+            end = min(start + page_size, total)
+            return [self._row(i, current_user_id) for i in range(start, end)], total
+
+    def rank_of(self, user_id):
+        """1-based rank of a user, or None if not on the leaderboard"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            return bisect_left(self._keys, (-entry['points'], user_id)) + 1
+
+    def around(self, user_id, radius=2):
+        """Return a user's rank and up to radius neighbours on each side"""
+        self._ensure_loaded()
+        with self._lock:
+            rank = self.rank_of(user_id)
+            if rank is None:
+                return {'rank': None, 'neighbours': []}
+            start = max(0, rank - 1 - radius)
+            end = min(len(self._keys), rank + radius)
+            return {
+                'rank': rank,
+                'neighbours': [self._row(i, user_id) for i in range(start, end)]
+            }
+
+
+class WindowedLeaderboards:
+    """
+    Daily, weekly and monthly leaderboards.
+
+    Rankings are computed from the per-user per-day rollup table, which
+    receives every point award (User.update_settings) and each finished
+    session's focus minutes and pomodoros, never from raw sessions. Each
+    window is computed once and cached; after that, a committed rollup write
+    only marks its user dirty (touch()), and the next read re-reads just the
+    dirty users' totals and moves them to their new rank. Bulk writes (the
+    test data seeder) bump the 'rollups' data version, which recomputes the
+    open windows.
+    """
+
+    PERIODS = ('daily', 'weekly', 'monthly')
+    # Closed windows kept in memory (least recently used are dropped)
+    MAX_CLOSED_WINDOWS = 64
+    # User ids per refresh query (below SQLite's bound-parameter limit)
+    REFRESH_BATCH = 500
+
+    RANKING_QUERY = '''
+        SELECT r.user_id, u.username, u.full_name, s.profile_level,
+            SUM(r.points) AS points, SUM(r.focus_minutes) AS focus_minutes,
+            SUM(r.pomodoros) AS pomodoros
+        FROM user_daily_rollups r
+        JOIN users u ON u.id = r.user_id
+        LEFT JOIN user_settings s ON s.user_id = r.user_id
+        WHERE r.day BETWEEN ? AND ?{users}
+            AND u.is_active = 1 AND u.username != 'admin'
+        GROUP BY r.user_id
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self._closed = OrderedDict()  # (period, start) -> ranking
+        self._open = {}               # (period, start) -> ranking (with its rollup version)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def window(period, day=None):
+        """
+        Return the (first_day, last_day) of the window containing day
+
+        Weeks start on Monday.
+        """
+        day = day or date.today()
+        if period == 'daily':
+            return day, day
+        if period == 'weekly':
+            start = day - timedelta(days=day.weekday())
+            return start, start + timedelta(days=6)
+        if period == 'monthly':
+            start = day.replace(day=1)
+            next_month = (start + timedelta(days=32)).replace(day=1)
+            return start, next_month - timedelta(days=1)
+        raise ValueError(f"Unknown leaderboard period: {period}")
+
+    @staticmethod
+    def _entry(row):
+        return {
+            'id': row['user_id'],
+            'name': row['full_name'],
+            'username': row['username'],
+            'points': row['points'] or 0,
+            'level': row['profile_level'] or 1,
+            'focus_minutes': row['focus_minutes'] or 0,
+            'pomodoros': row['pomodoros'] or 0
+        }
+
+    def _compute(self, start, end):
+        """Rank users by points earned between start and end (inclusive)"""
+        conn = get_read_connection(self.path)
+        rows = conn.execute(
+            self.RANKING_QUERY.format(users='') + ' ORDER BY points DESC, r.user_id',
+            (start.isoformat(), end.isoformat())
+        ).fetchall()
+
+        entries = []
+        positions = {}
+        for index, row in enumerate(rows):
+            entry = self._entry(row)
+            entry['rank'] = index + 1
+            entries.append(entry)
+            positions[row['user_id']] = index
+        return {
+            'start': start,
+            'end': end,
+            'entries': entries,
+            'keys': [(-entry['points'], entry['id']) for entry in entries],
+            'positions': positions,
+            'dirty': set()
+        }
+
+    def _refresh(self, ranking):
+        """Re-read the dirty users' totals and move each to its new rank"""
+        dirty = list(ranking['dirty'])
+        ranking['dirty'] = set()
+        conn = get_read_connection(self.path)
+        rows = {}
+        for i in range(0, len(dirty), self.REFRESH_BATCH):
+            batch = dirty[i:i + self.REFRESH_BATCH]
+            query = self.RANKING_QUERY.format(users=f" AND r.user_id IN ({', '.join('?' * len(batch))})")
+            for row in conn.execute(query, [ranking['start'].isoformat(), ranking['end'].isoformat()] + batch):
+                rows[row['user_id']] = row
+
+        entries, keys, positions = ranking['entries'], ranking['keys'], ranking['positions']
+        for user_id in dirty:
+            old = positions.pop(user_id, None)
+            if old is not None:
+                del entries[old]
+                del keys[old]
+            new = None
+            row = rows.get(user_id)
+            if row is not None:
+                entry = self._entry(row)
+                key = (-entry['points'], user_id)
+                new = bisect_left(keys, key)
+                keys.insert(new, key)
+                entries.insert(new, entry)
+
+            # Only the ranks between the old and new position shift
+            moved = [index for index in (old, new) if index is not None]
+            if not moved:
+                continue
+            first = min(moved)
+            last = max(moved) if old is not None and new is not None else len(entries) - 1
+            for index in range(first, min(last, len(entries) - 1) + 1):
+                entries[index]['rank'] = index + 1
+                positions[entries[index]['id']] = index
+
+    def touch(self, user_id, day):
+        """
+        Note that a user's rollup for day changed (call once it is committed)
+
+        Args:
+            user_id: The ID of the user
+            day: 'YYYY-MM-DD' or a date
+        """
+        if isinstance(day, str):
+            day = date.fromisoformat(day[:10])
+        with self._lock:
+            for ranking in list(self._closed.values()) + list(self._open.values()):
+                if ranking['start'] <= day <= ranking['end']:
+                    ranking['dirty'].add(user_id)
+
+    def ranking(self, period, day=None):
+        """
+        Return the ranking of the window containing day
+
+        Returns:
+            tuple: (entries sorted by rank, {user_id: index})
+        """
+        today = date.today()
+        start, end = self.window(period, day or today)
+        key = (period, start)
+
+        with self._lock:
+            if end < today:
+                ranking = self._closed.get(key)
+                if ranking is None:
+                    ranking = self._compute(start, end)
+                    self._closed[key] = ranking
+                    if len(self._closed) > self.MAX_CLOSED_WINDOWS:
+                        self._closed.popitem(last=False)
+                else:
+                    self._closed.move_to_end(key)
+            else:
+                version = data_versions.current('rollups', None)
+                ranking = self._open.get(key)
+                if ranking is None or ranking['version'] != version:
+                    # Drop open windows left over from previous days
+                    self._open = {k: v for k, v in self._open.items() if k[0] != period}
+                    ranking = self._compute(start, end)
+                    ranking['version'] = version
+                    self._open[key] = ranking
+
+            if ranking['dirty']:
+                self._refresh(ranking)
+            return ranking['entries'], ranking['positions']
+
+    def page(self, period, page=1, page_size=10, current_user_id=None, day=None):
+        """
+        Return one page of a window's leaderboard
+
+        Returns:
+            tuple: (rows, total_users)
+        """
+        entries, _ = self.ranking(period, day)
+        start = max(0, (page - 1) * page_size)
+        rows = [dict(entry, is_current_user=entry['id'] == current_user_id)
+                for entry in entries[start:start + page_size]]
+        return rows, len(entries)
+
+    def rank_of(self, period, user_id, day=None):
+        """1-based rank in the window, or None if the user earned nothing in it"""
+        _, positions = self.ranking(period, day)
+        index = positions.get(user_id)
+        return None if index is None else index + 1
+
+    def around(self, period, user_id, radius=2, day=None):
+        """Return a user's rank and up to radius neighbours on each side"""
+        entries, positions = self.ranking(period, day)
+        index = positions.get(user_id)
+        if index is None:
+            return {'rank': None, 'neighbours': []}
+        return {
+            'rank': index + 1,
+            'neighbours': [
+                dict(entry, is_current_user=entry['id'] == user_id)
+                for entry in entries[max(0, index - radius):index + radius + 1]
+            ]
+        }
+
+
+# Shared instances used by the web app
+leaderboard_service = LeaderboardService()
+windowed_leaderboards = WindowedLeaderboards()
@@ -0,0 +1,163 @@
+# utils/quantile_sketch.py
+import math
+import struct
+from array import array
+
+
+class QuantileSketch:
+    """
+    Fixed-memory streaming quantile sketch (merging t-digest).
+
+    Values are buffered and periodically merged into a bounded set of
+    weighted centroids. Centroids near the tails stay small, so extreme
+    percentiles (the ones thresholds are derived from) remain accurate.
+    Sketches can be merged and serialized to a few kilobytes regardless of
+    how many values they have seen.
+    """
+
+    _HEADER = struct.Struct('<2sBHddd')
+    _MAGIC = b'QS'
+    _VERSION = 1
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self._means = []
+        self._weights = []
+        self._buffer = []
+        self._buffer_limit = compression * 5
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def add(self, value, weight=1.0):
+        """Add a value to the sketch"""
+        self._buffer.append((value, weight))
+        self.count += weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self._buffer) >= self._buffer_limit:
+            self._compress()
+
+    def merge(self, other):
+        """Fold another sketch into this one"""
+        if not other.count:
+            return self
+        other._compress()
+        self._buffer.extend(zip(other._means, other._weights))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        """Merge buffered values into the centroid list"""
+        if not self._buffer:
+            return
+
+        points = sorted(list(zip(self._means, self._weights)) + self._buffer)
+        self._buffer = []
+
+        total = self.count
+        means = []
+        weights = []
+        cur_mean, cur_weight = points[0]
+        # k-scale position of the current centroid's left edge; a centroid
+        # may span at most one unit of k, which bounds the centroid count
+        k_left = self._k(0.0)
+        cumulative = 0.0
+
+        for mean, weight in points[1:]:
+            proposed = cur_weight + weight
+            if self._k((cumulative + proposed) / total) - k_left <= 1.0:
+                cur_mean += (mean - cur_mean) * weight / proposed
+                cur_weight = proposed
+            else:
+                means.append(cur_mean)
+                weights.append(cur_weight)
+                cumulative += cur_weight
+                k_left = self._k(cumulative / total)
+                cur_mean, cur_weight = mean, weight
+
+        means.append(cur_mean)
+        weights.append(cur_weight)
+        self._means = means
+        self._weights = weights
+
+    def _k(self, q):
+        """t-digest k1 scale function"""
+        return self.compression / (2.0 * math.pi) * math.asin(2.0 * min(max(q, 0.0), 1.0) - 1.0)
+
+    def quantile(self, q):
+        """Estimate the value at quantile q (0.0 - 1.0), or None if empty"""
+        if not self.count:
+            return None
+        self._compress()
+
+        if len(self._means) == 1 or q <= 0:
+            return self.min if q <= 0 else self._means[0]
+        if q >= 1:
+            return self.max
+
+        target = q * self.count
+        cumulative = 0.0
+        for i, weight in enumerate(self._weights):
+            center = cumulative + weight / 2.0
+            if target < center:
+                if i == 0:
+                    # Interpolate between the minimum and the first centroid
+                    left, left_pos = self.min, 0.0
+                else:
+                    left = self._means[i - 1]
+                    left_pos = cumulative - self._weights[i - 1] / 2.0
+                span = center - left_pos
+                if span <= 0:
+                    return self._means[i]
+                return left + (self._means[i] - left) * (target - left_pos) / span
+            cumulative += weight
+
+        # Between the last centroid and the maximum
+        last_center = cumulative - self._weights[-1] / 2.0
+        span = self.count - last_center
+        if span <= 0:
+            return self.max
+        return self._means[-1] + (self.max - self._means[-1]) * (target - last_center) / span
+
+    def __len__(self):
+        """Number of centroids currently held"""
+        self._compress()
+        return len(self._means)
+
+    def to_bytes(self):
+        """Serialize to a compact binary form (float32 means, float64 weights)"""
+        self._compress()
+        header = self._HEADER.pack(
+            self._MAGIC, self._VERSION, self.compression,
+            self.count, self.min if self.count else 0.0, self.max if self.count else 0.0
+        )
+        return header + array('f', self._means).tobytes() + array('d', self._weights).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a sketch produced by to_bytes()"""
+        magic, version, compression, count, min_value, max_value = cls._HEADER.unpack_from(data)
+        if magic != cls._MAGIC or version != cls._VERSION:
+            raise ValueError("Unrecognized quantile sketch format")
+
+        body = memoryview(data)[cls._HEADER.size:]
+        n = len(body) // 12
+        means = array('f')
+        means.frombytes(body[:n * 4])
+        weights = array('d')
+        weights.frombytes(body[n * 4:n * 12])
+
+        sketch = cls(compression)
+        sketch._means = list(means)
+        sketch._weights = list(weights)
+        sketch.count = count
+        if count:
+            sketch.min = min_value
+            sketch.max = max_value
+        return sketch
@@ -0,0 +1,333 @@
+# utils/retention.py
+import logging
+import os
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from models import data_versions, shards
+from models.database import get_connection, get_read_connection, transaction
+
+# Convert databases created without incremental auto_vacuum at startup
+# (RetentionJob.convert_all); a full VACUUM rewrites the whole file and
+# blocks every writer until it finishes, so it is never run while serving
+CONVERT_AUTO_VACUUM = os.environ.get('FOCUSGUARD_VACUUM_CONVERT') == '1'
+
+
+class RetentionJob:
+    """
+    Keeps disk use and directory scans bounded on a long-running server.
+
+    Each run:
+    - rolls detection events older than detail_days up into hourly counts
+      (user_event_hourly), which the stats queries read alongside
+      session_events
+    - drops the visualization blobs of sessions older than detail_days (the
+      session rows and daily rollups stay)
+    - removes legacy session_stats_*.json files older than file_days or
+      beyond the newest MAX_SESSION_FILES, analytics CSV exports older than
+      EXPORT_DAYS and, once archived, the retired gamification_analytics.json
+    - hands free pages back to the filesystem with incremental VACUUM
+      (main database and, in shard mode, every user shard); databases
+      created before incremental auto_vacuum are only converted by
+      convert_all() at startup
+
+    Blobs and files are copied into monthly zip archives under archive_dir
+    before removal when one is given, and simply deleted otherwise. All
+    database work happens one user or one batch per short transaction with
+    a pause after each change, so detection writes are never held up for
+    long.
+    """
+
+    DETAIL_DAYS = 90
+    FILE_DAYS = 30
+    EXPORT_DAYS = 1
+    MAX_SESSION_FILES = 200
+    # Blobs archived per transaction
+    BATCH_SIZE = 200
+    # Pause after each write transaction / VACUUM step
+    PAUSE_SECONDS = 0.05
+    # Pages released per incremental VACUUM step, and steps per run
+    VACUUM_PAGES_PER_STEP = 256
+    MAX_VACUUM_STEPS = 400
+    # Free pages at which convert_all() gives a database created without
+    # incremental auto_vacuum its one-time converting VACUUM
+    CONVERT_FREE_PAGES = 2048
+    INTERVAL_SECONDS = 6 * 60 * 60
+
+    # Retired analytics file (replaced by the per-user SQLite store)
+    LEGACY_ANALYTICS_FILE = 'gamification_analytics.json'
+
+    def __init__(self, detail_days=None, file_days=None, archive_dir=None,
+                 statistics_dir="statistics", analytics_dir="analytics", path=None):
+        self.detail_days = detail_days or self.DETAIL_DAYS
+        self.file_days = file_days or self.FILE_DAYS
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.statistics_dir = Path(statistics_dir)
+        self.analytics_dir = Path(analytics_dir)
+        self.path = path
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Run the job now and then every INTERVAL_SECONDS on a daemon thread"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="retention")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self):
+        """Stop the background thread after its current step"""
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.INTERVAL_SECONDS)
+
+    def _pause(self):
+        if self.PAUSE_SECONDS:
+            self._stop.wait(self.PAUSE_SECONDS)
+
+    def run_once(self, now=None):
+        """
+        Run every retention step once
+
+        Returns:
+            dict: events_compacted, blobs_dropped, files_removed, pages_freed
+        """
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=self.detail_days)).isoformat()
+        report = {'events_compacted': 0, 'blobs_dropped': 0, 'files_removed': 0, 'pages_freed': 0}
+
+        for key, step in (
+            ('events_compacted', lambda: self.compact_events(cutoff)),
+            ('blobs_dropped', lambda: self.drop_visualization(cutoff)),
+            ('files_removed', lambda: self.prune_files(now)),
+            ('pages_freed', self.vacuum_all)
+        ):
+            if self._stop.is_set():
+                break
+            try:
+                report[key] = step()
+            except Exception as e:
+                logging.error(f"Retention step {key} failed: {str(e)}")
+
+        logging.info(f"Retention run finished: {report}")
+        return report
+
+    def _user_paths(self):
+        """(user_id, database holding the user's sessions and events)"""
+        if shards.ENABLED:
+            return list(shards.iter_shards())
+        return [(row[0], self.path)
+                for row in get_read_connection(self.path).execute("SELECT id FROM users ORDER BY id")]
+
+    def compact_events(self, cutoff):
+        """
+        Replace each user's detection events before cutoff by hourly counts
+
+        Returns:
+            int: Number of events compacted
+        """
+        compacted = 0
+        for user_id, path in self._user_paths():
+            if self._stop.is_set():
+                break
+            has_expired = get_read_connection(path).execute(
+                "SELECT 1 FROM session_events WHERE user_id = ? AND occurred_at < ? LIMIT 1", (user_id, cutoff)
+            ).fetchone()
+            if not has_expired:
+                continue
+            with transaction(path) as conn:
+                conn.execute('''
+                    INSERT INTO user_event_hourly (user_id, event_type, hour, events)
+                    SELECT user_id, event_type, strftime('%Y-%m-%dT%H:00:00', occurred_at), COUNT(*)
+                    FROM session_events
+                    WHERE user_id = ? AND occurred_at < ?
+                    GROUP BY event_type, strftime('%Y-%m-%dT%H:00:00', occurred_at)
+                    ON CONFLICT(user_id, event_type, hour) DO UPDATE SET events = events + excluded.events
+                ''', (user_id, cutoff))
+                deleted = conn.execute(
+                    "DELETE FROM session_events WHERE user_id = ? AND occurred_at < ?", (user_id, cutoff)
+                ).rowcount
+            if deleted:
+                data_versions.bump('sessions', user_id)
+                compacted += deleted
+                self._pause()
+        return compacted
+
+    def drop_visualization(self, cutoff):
+        """
+        Remove the visualization blobs of sessions that started before cutoff
+
+        The column is set to an empty blob rather than NULL: NULL marks a
+        session still waiting for its data (see idx_user_sessions_pending_viz).
+
+        Returns:
+            int: Number of blobs dropped
+        """
+        dropped = 0
+        for user_id, path in self._user_paths():
+            while not self._stop.is_set():
+                rows = get_read_connection(path).execute('''
+                    SELECT id, start_time, visualization_data FROM user_sessions
+                    WHERE user_id = ? AND start_time < ? AND length(visualization_data) > 0
+                    LIMIT ?
+                ''', (user_id, cutoff, self.BATCH_SIZE)).fetchall()
+                if not rows:
+                    break
+
+                if self.archive_dir:
+                    self._archive('visualization', [
+                        (row['start_time'][:7],
+                         f"session_{row['id']}.{'json' if isinstance(row[2], str) else 'bin'}",
+                         row[2])
+                        for row in rows
+                    ])
+                with transaction(path) as conn:
+                    conn.executemany(
+                        "UPDATE user_sessions SET visualization_data = X'' WHERE id = ?",
+                        [(row['id'],) for row in rows]
+                    )
+                dropped += len(rows)
+                self._pause()
+        return dropped
+
+    def prune_files(self, now):
+        """
+        Remove legacy session stats files, old analytics exports and the
+        retired analytics JSON file
+
+        Returns:
+            int: Number of files removed
+        """
+        expired = []
+        file_cutoff = (now - timedelta(days=self.file_days)).timestamp()
+        export_cutoff = (now - timedelta(days=self.EXPORT_DAYS)).timestamp()
+
+        if self.statistics_dir.is_dir():
+            # Names embed the end time, so they sort oldest to newest
+            session_files = sorted(self.statistics_dir.glob('session_stats_*.json'))
+            excess = max(0, len(session_files) - self.MAX_SESSION_FILES)
+            for index, file_path in enumerate(session_files):
+                if index < excess or file_path.stat().st_mtime < file_cutoff:
+                    expired.append(file_path)
+
+        if self.analytics_dir.is_dir():
+            for file_path in self.analytics_dir.glob('gamification_analytics_*.csv'):
+                if file_path.stat().st_mtime < export_cutoff:
+                    expired.append(file_path)
+            # Its history exists nowhere else, so it is only removed once archived
+            legacy_file = self.analytics_dir / self.LEGACY_ANALYTICS_FILE
+            if self.archive_dir and legacy_file.is_file():
+                expired.append(legacy_file)
+
+        if expired and self.archive_dir:
+            self._archive_files(expired)
+
+        removed = 0
+        for file_path in expired:
+            try:
+                file_path.unlink()
+                removed += 1
+            except OSError as e:
+                logging.error(f"Error removing {file_path}: {str(e)}")
+        return removed
+
+    def vacuum_all(self):
+        """vacuum() the main database and every user shard"""
+        paths = [self.path] + ([path for _, path in shards.iter_shards()] if shards.ENABLED else [])
+        return sum(self.vacuum(path) for path in paths if not self._stop.is_set())
+
+    def convert_all(self):
+        """
+        Convert the main database and every user shard to incremental
+        auto_vacuum
+
+        Each database without it that has at least CONVERT_FREE_PAGES free
+        pages gets one full VACUUM. Call at startup before serving requests
+        (app.py does when FOCUSGUARD_VACUUM_CONVERT=1), never while
+        detection is writing.
+
+        Returns:
+            int: Number of pages released
+        """
+        paths = [self.path] + ([path for _, path in shards.iter_shards()] if shards.ENABLED else [])
+        released = 0
+        for path in paths:
+            conn = get_connection(path)
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                continue
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free_pages < self.CONVERT_FREE_PAGES:
+                continue
+            logging.info(f"Converting {path or 'database'} to incremental auto_vacuum ({free_pages} free pages)")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            released += free_pages
+        return released
+
+    def vacuum(self, path=None):
+        """
+        Release free pages to the filesystem a few at a time
+
+        Only databases with incremental auto_vacuum are touched; older ones
+        keep their free pages (reused by later writes) until convert_all().
+
+        Returns:
+            int: Number of pages released
+        """
+        conn = get_connection(path)
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free_pages or conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+
+        released = 0
+        for _ in range(self.MAX_VACUUM_STEPS):
+            if self._stop.is_set():
+                break
+            # executescript steps the pragma to completion; execute() would
+            # stop after the first page
+            conn.executescript(f"PRAGMA incremental_vacuum({self.VACUUM_PAGES_PER_STEP});")
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            released += free_pages - remaining
+            free_pages = remaining
+            if not free_pages:
+                break
+            self._pause()
+        return released
+
+    def _archive(self, kind, entries):
+        """
+        Append entries to monthly zip archives
+
+        Args:
+            kind: Archive name prefix
+            entries: Iterable of ('YYYY-MM', name inside the archive, str,
+                bytes or Path of a file to copy)
+        """
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        by_month = {}
+        for month, name, data in entries:
+            by_month.setdefault(month, []).append((name, data))
+        for month, items in by_month.items():
+            with zipfile.ZipFile(self.archive_dir / f"{kind}_{month}.zip", 'a', zipfile.ZIP_DEFLATED) as archive:
+                for name, data in items:
+                    if isinstance(data, Path):
+                        archive.write(data, name)
+                    else:
+                        archive.writestr(name, data)
+
+    def _archive_files(self, files):
+        """Copy files into the archive of their directory and modification month"""
+        by_kind = {}
+        for file_path in files:
+            month = datetime.fromtimestamp(file_path.stat().st_mtime).strftime('%Y-%m')
+            by_kind.setdefault(file_path.parent.name, []).append((month, file_path.name, file_path))
+        for kind, entries in by_kind.items():
+            self._archive(kind, entries)
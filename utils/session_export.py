@@ -0,0 +1,205 @@
+# utils/session_export.py
+"""
+Streaming export of a user's session history
+
+Rows are read from SQLite in batches (User.iter_sessions) and written out as
+they arrive, so memory stays flat however long the history is. CSV and
+NDJSON are produced chunk by chunk for a streamed response; XLSX is written
+with xlsxwriter's constant_memory mode to a temporary file that is then
+streamed and deleted when the response closes.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+
+# (header, session column, XLSX column width)
+EXPORT_COLUMNS = (
+    ('Date', 'start_time', 21),
+    ('End Time', 'end_time', 21),
+    ('Duration (minutes)', 'duration_minutes', 20),
+    ('Drowsy Events', 'drowsy_events', 15),
+    ('Yawn Events', 'yawn_events', 13),
+    ('Distraction Events', 'distraction_events', 20),
+    ('Completed Pomodoros', 'completed_pomodoros', 21),
+    ('Points Earned', 'points_earned', 15)
+)
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx')
+}
+
+# Rows buffered per chunk of streamed CSV / NDJSON output
+ROWS_PER_CHUNK = 500
+# Bytes per chunk when streaming the XLSX file
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def _format_time(value):
+    """ISO timestamp -> 'YYYY-MM-DD HH:MM:SS' (as the old Excel export showed it)"""
+    if not value:
+        return value
+    return str(value).replace('T', ' ')[:19]
+
+
+def export_rows(sessions):
+    """
+    Turn session dicts into export rows
+
+    Args:
+        sessions: Iterable of session dicts (e.g. User.iter_sessions())
+
+    Yields:
+        list: One value per EXPORT_COLUMNS entry
+    """
+    for session in sessions:
+        row = []
+        for _, column, _ in EXPORT_COLUMNS:
+            value = session.get(column)
+            if column.endswith('_time'):
+                value = _format_time(value)
+            elif value is None:
+                value = 0
+            row.append(value)
+        yield row
+
+
+def stream_csv(rows):
+    """Yield CSV text (header first) in chunks of ROWS_PER_CHUNK rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _, _ in EXPORT_COLUMNS])
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    """Yield one JSON object per line, ROWS_PER_CHUNK lines at a time"""
+    headers = [header for header, _, _ in EXPORT_COLUMNS]
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(headers, row)), default=str))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def write_xlsx(rows, path):
+    """
+    Write rows to an XLSX file in constant memory
+
+    Column widths are fixed up front: constant_memory mode flushes each row
+    to disk as soon as the next one starts, so they cannot be sized from
+    the data afterwards.
+
+    Args:
+        rows: Iterable of export rows
+        path: Destination file
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        worksheet = workbook.add_worksheet('Session History')
+        header_format = workbook.add_format({'bold': True})
+        for index, (header, _, width) in enumerate(EXPORT_COLUMNS):
+            worksheet.set_column(index, index, width)
+            worksheet.write(0, index, header, header_format)
+
+        for row_index, row in enumerate(rows, 1):
+            worksheet.write_row(row_index, 0, row)
+    finally:
+        workbook.close()
+
+
+class TemporaryFileStream:
+    """
+    Iterate over a temporary file in FILE_CHUNK_SIZE chunks, deleting it
+    when closed
+
+    close() runs when the file has been read to the end, and should also
+    be registered with the response (response.call_on_close) so the file
+    goes away if the body is never iterated, e.g. when the client
+    disconnects first. It is safe to call more than once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.path is None:
+            raise StopIteration
+        if self._file is None:
+            self._file = open(self.path, 'rb')
+        chunk = self._file.read(FILE_CHUNK_SIZE)
+        if not chunk:
+            self.close()
+            raise StopIteration
+        return chunk
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+def stream_xlsx(rows):
+    """
+    Build the XLSX in a temporary file and return a TemporaryFileStream
+    over its bytes
+
+    The workbook is written before this returns, so errors surface before
+    a response starts. The file is removed when the stream is closed.
+    """
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    try:
+        write_xlsx(rows, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return TemporaryFileStream(path)
+
+
+def stream_export(sessions, export_format):
+    """
+    Stream a session export
+
+    Args:
+        sessions: Iterable of session dicts
+        export_format: One of FORMATS
+
+    Returns:
+        Iterator of str (CSV / NDJSON) or bytes (XLSX) chunks. Call its
+        close() once the response is done (it removes the XLSX temp file).
+    """
+    rows = export_rows(sessions)
+    if export_format == 'csv':
+        return stream_csv(rows)
+    if export_format == 'ndjson':
+        return stream_ndjson(rows)
+    if export_format == 'xlsx':
+        return stream_xlsx(rows)
+    raise ValueError(f"Unsupported export format: {export_format}")
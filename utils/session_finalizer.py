@@ -0,0 +1,211 @@
+# utils/session_finalizer.py
+import json
+import logging
+import queue
+import threading
+
+from models import data_versions, shards
+from models.database import get_read_connection, transaction
+
+
+class SessionFinalizer:
+    """
+    Persists finished detection sessions on a background worker.
+
+    stop_detection only snapshots the session and acknowledges the client.
+    The worker writes the session stats file, then commits the session row,
+    the daily analytics rollup, the last detection events, the visualization
+    data, the EAR/MAR sketches, the gamification profile and the analytics
+    counters in one SQLite transaction, and finally hands the result to the
+    job's callback (which pushes it to the client). A failure anywhere in
+    the transaction rolls all of it back. In shard mode (models.shards) the
+    user's shard commits just before the main database.
+
+    Sessions that never got that far (crash, killed process) are rebuilt
+    from their last checkpoint by recover() when the app starts.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, job, on_done=None):
+        """
+        Queue a session snapshot for finalization
+
+        Args:
+            job: dict with 'user', 'stats_manager', 'session_data' and
+                optionally 'achievement_manager', 'profile' (from
+                AchievementManager.snapshot_profile), 'analytics_manager'
+                and 'analytics' (from AnalyticsManager.snapshot_analytics)
+            on_done: Called with the result dict once the job has finished
+        """
+        self._ensure_worker()
+        self._queue.put((job, on_done))
+
+    def join(self):
+        """Block until every queued session has been finalized"""
+        self._queue.join()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="session-finalizer")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            job, on_done = self._queue.get()
+            try:
+                result = self.finalize(job)
+                if on_done:
+                    on_done(result)
+            except Exception as e:
+                logging.error(f"Error in session finalizer callback: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def finalize(self, job):
+        """
+        Persist one session snapshot
+
+        Returns:
+            dict: {'success', 'session_id', 'stats_file', 'error'}
+        """
+        user = job.get('user')
+        stats_manager = job['stats_manager']
+        user_id = user.id if user else job.get('user_id')
+        result = {'success': False, 'session_id': None, 'stats_file': None, 'error': None}
+        committed = False
+
+        try:
+            # The stats file lives outside the database; write it first
+            stats_file = stats_manager.save_session()
+            result['stats_file'] = str(stats_file) if stats_file else None
+
+            with transaction(), transaction(shards.user_db_path(user_id)):
+                session_id = None
+                if user:
+                    session_id = user.save_session(job['session_data'])
+                    if session_id is None:
+                        raise RuntimeError("session row could not be saved")
+                    if not user.add_daily_rollup(job['session_data']):
+                        raise RuntimeError("daily rollup could not be updated")
+
+                # Detection events still buffered since the last batch
+                if not stats_manager.flush_events(user_id):
+                    raise RuntimeError("session events could not be saved")
+
+                # The session row supersedes its crash-recovery checkpoints
+                if not stats_manager.clear_checkpoints(user_id):
+                    raise RuntimeError("session checkpoints could not be cleared")
+
+                # Attach visualization data to the row just inserted
+                if not stats_manager.save_session_to_db(user_id, session_id):
+                    raise RuntimeError("session statistics could not be saved")
+
+                if not stats_manager.save_metric_sketches(user_id):
+                    raise RuntimeError("metric sketches could not be saved")
+
+                achievement_manager = job.get('achievement_manager')
+                if achievement_manager and job.get('profile'):
+                    if not achievement_manager.save_profile(job['profile']):
+                        raise RuntimeError("profile could not be saved")
+                
+                analytics_manager = job.get('analytics_manager')
+                if analytics_manager and job.get('analytics'):
+                    if not analytics_manager.save_analytics(job['analytics']):
+                        raise RuntimeError("analytics could not be saved")
+            committed = True
+
+            # Session summaries must re-read what was just committed (the
+            # rollups already marked the user in the windowed leaderboards)
+            if user:
+                data_versions.bump('sessions', user_id)
+
+            result['session_id'] = session_id
+            result['success'] = True
+            logging.info(f"Session finalized for user {user_id} (session {session_id})")
+
+        except Exception as e:
+            result['error'] = str(e)
+            logging.error(f"Error finalizing session for user {user_id}: {str(e)}")
+            # The counters were drained from the manager when the session
+            # stopped; hand them back so the next save writes them
+            analytics_manager = job.get('analytics_manager')
+            if not committed and analytics_manager and job.get('analytics'):
+                analytics_manager.restore_analytics(job['analytics'])
+
+        return result
+
+    def recover(self):
+        """
+        Save sessions left behind by a crash from their last checkpoint
+
+        Call once at startup, before any detection starts: every checkpoint
+        whose session has no user_sessions row belongs to a session that
+        was never finalized. Like emergency stops, recovered sessions earn
+        no points.
+
+        Returns:
+            int: Number of sessions recovered
+        """
+        from models.user import User
+
+        query = '''
+            SELECT c.session_uid, c.user_id, c.start_time, c.created_at, c.state,
+                s.id AS session_id
+            FROM {schema}.session_checkpoints c
+            LEFT JOIN {schema}.user_sessions s ON s.session_uid = c.session_uid
+            WHERE c.id IN (SELECT MAX(id) FROM {schema}.session_checkpoints GROUP BY session_uid)
+        '''
+        try:
+            if shards.ENABLED:
+                rows = list(shards.query_shards(query))
+            else:
+                rows = get_read_connection().execute(query.format(schema='main')).fetchall()
+        except Exception as e:
+            logging.error(f"Error reading session checkpoints: {str(e)}")
+            return 0
+
+        recovered = 0
+        for row in rows:
+            try:
+                user = None if row['session_id'] else User.get_by_id(row['user_id'])
+                with transaction(), transaction(shards.user_db_path(row['user_id'])) as conn:
+                    if user:
+                        state = json.loads(row['state'])
+                        session_data = {
+                            'start_time': row['start_time'],
+                            'end_time': row['created_at'],
+                            'duration_minutes': int(state.get('duration_seconds', 0) // 60),
+                            'drowsy_events': state.get('total_drowsy_events', 0),
+                            'yawn_events': state.get('total_yawn_events', 0),
+                            'distraction_events': state.get('total_distraction_events', 0),
+                            'completed_pomodoros': state.get('completed_pomodoro_sessions', 0),
+                            'points_earned': 0,
+                            'average_ear': state.get('average_ear', 0.0),
+                            'average_mar': state.get('average_mar', 0.0),
+                            'perclos': state.get('perclos', 0.0),
+                            'blink_count': state.get('blink_count', 0),
+                            'blink_rate': state.get('blink_rate', 0.0),
+                            'yawn_rate': state.get('yawn_rate', 0.0),
+                            'session_uid': row['session_uid']
+                        }
+                        if user.save_session(session_data) is None:
+                            raise RuntimeError("session row could not be saved")
+                        if not user.add_daily_rollup(session_data):
+                            raise RuntimeError("daily rollup could not be updated")
+                    # Finalized sessions may still have a late checkpoint
+                    conn.execute("DELETE FROM session_checkpoints WHERE session_uid = ?", (row['session_uid'],))
+
+                if user:
+                    data_versions.bump('sessions', user.id)
+                    recovered += 1
+                    logging.info(f"Recovered session {row['session_uid']} for user {user.id} from checkpoint")
+            except Exception as e:
+                logging.error(f"Error recovering session {row['session_uid']}: {str(e)}")
+
+        return recovered
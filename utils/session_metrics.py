@@ -0,0 +1,145 @@
+# utils/session_metrics.py
+import math
+import time
+
+
+class RunningStats:
+    """Welford online mean and variance"""
+
+    __slots__ = ('count', 'mean', '_m2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        """Sample variance (0.0 until two values have been seen)"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class SlidingPerclos:
+    """
+    PERCLOS (percentage of eye closure) over a sliding time window.
+
+    Frames are counted into one ring slot per second, so each update is O(1)
+    and memory is fixed at window_seconds slots.
+    """
+
+    def __init__(self, window_seconds=60):
+        self.window_seconds = window_seconds
+        self._closed = [0] * window_seconds
+        self._total = [0] * window_seconds
+        self._closed_sum = 0
+        self._total_sum = 0
+        self._second = None
+
+    def add(self, eyes_closed, timestamp):
+        second = int(timestamp)
+
+        if self._second is None:
+            self._second = second
+        elif second > self._second:
+            # Clear the slots for every second we skipped over
+            for s in range(self._second + 1, min(second, self._second + self.window_seconds) + 1):
+                slot = s % self.window_seconds
+                self._closed_sum -= self._closed[slot]
+                self._total_sum -= self._total[slot]
+                self._closed[slot] = 0
+                self._total[slot] = 0
+            self._second = second
+
+        slot = second % self.window_seconds
+        self._total[slot] += 1
+        self._total_sum += 1
+        if eyes_closed:
+            self._closed[slot] += 1
+            self._closed_sum += 1
+
+    @property
+    def value(self):
+        """Fraction of frames in the window with eyes closed (0.0 - 1.0)"""
+        return self._closed_sum / self._total_sum if self._total_sum else 0.0
+
+
+class SessionMetrics:
+    """
+    Incremental per-session statistics derived from the EAR/MAR stream.
+
+    Every update is constant time and memory: Welford mean/variance for EAR
+    and MAR, sliding-window PERCLOS, blink count/rate, and yawn frequency.
+    """
+
+    # Eye closures longer than this are not counted as blinks
+    MAX_BLINK_SECONDS = 0.5
+
+    def __init__(self, ear_thresh=0.15, perclos_window_seconds=60):
+        self.ear_thresh = ear_thresh
+        self.ear = RunningStats()
+        self.mar = RunningStats()
+        self.perclos = SlidingPerclos(perclos_window_seconds)
+
+        self.blink_count = 0
+        self.yawn_count = 0
+        self._eyes_closed_since = None
+        self._was_yawning = False
+
+        self.start_time = time.monotonic()
+        self.last_update = self.start_time
+
+    def update(self, ear=None, mar=None, yawning=False, timestamp=None, ear_thresh=None):
+        """Feed one frame of metrics"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if ear_thresh is not None:
+            self.ear_thresh = ear_thresh
+        self.last_update = timestamp
+
+        if ear and ear > 0:
+            self.ear.add(ear)
+            eyes_closed = ear < self.ear_thresh
+            self.perclos.add(eyes_closed, timestamp)
+
+            if eyes_closed:
+                if self._eyes_closed_since is None:
+                    self._eyes_closed_since = timestamp
+            elif self._eyes_closed_since is not None:
+                if timestamp - self._eyes_closed_since <= self.MAX_BLINK_SECONDS:
+                    self.blink_count += 1
+                self._eyes_closed_since = None
+
+        if mar and mar > 0:
+            self.mar.add(mar)
+
+        if yawning and not self._was_yawning:
+            self.yawn_count += 1
+        self._was_yawning = bool(yawning)
+
+    @property
+    def elapsed_minutes(self):
+        return max(0.0, self.last_update - self.start_time) / 60.0
+
+    def summary(self):
+        """Return the current statistics as a flat, JSON-serializable dict"""
+        minutes = self.elapsed_minutes
+        return {
+            'average_ear': round(self.ear.mean, 4),
+            'ear_std': round(self.ear.std, 4),
+            'average_mar': round(self.mar.mean, 4),
+            'mar_std': round(self.mar.std, 4),
+            'perclos': round(self.perclos.value, 4),
+            'blink_count': self.blink_count,
+            'blink_rate': round(self.blink_count / minutes, 2) if minutes > 0 else 0.0,
+            'yawn_rate': round(self.yawn_count / minutes, 3) if minutes > 0 else 0.0
+        }
@@ -1,72 +1,93 @@
 # Enhanced version of the StatisticsManager class with database integration
 
+import heapq
 import json
 import logging
+import time
+import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
-import sqlite3
-import os
+
+from models import data_versions, shards
+from models.database import after_commit, get_connection, get_read_connection, transaction
+from models.migrations import ensure_schema
+
+from utils.time_series import MetricTimeSeries
+from utils.session_metrics import SessionMetrics
+from utils.quantile_sketch import QuantileSketch
+from utils.timeline_buckets import TimelineBuckets
+from utils.visualization_blob import VisualizationBlob, load_visualization
 
 class StatisticsManager:
     """Manages statistics collection and analysis for drowsiness detection system"""
     
-    def __init__(self, save_dir="statistics"):
+    # Detection events are buffered and written to session_events in batches
+    # of this many rows, or once the oldest buffered event is this old
+    EVENT_BATCH_SIZE = 50
+    EVENT_FLUSH_SECONDS = 10.0
+    # Running counters are appended to session_checkpoints this often, so a
+    # crash loses at most this much of a session
+    CHECKPOINT_INTERVAL_SECONDS = 30.0
+    # Session summary fields stored in each checkpoint
+    CHECKPOINT_FIELDS = (
+        'total_drowsy_events', 'total_yawn_events', 'total_distraction_events',
+        'completed_pomodoro_sessions', 'average_ear', 'average_mar', 'perclos',
+        'blink_count', 'blink_rate', 'yawn_rate'
+    )
+    
+    def __init__(self, save_dir="statistics", raw_metric_minutes=10):
         self.save_dir = Path(save_dir)
         self.save_dir.mkdir(exist_ok=True)
+
+        # Raw EAR/MAR samples older than this are kept as per-second min/mean/max
+        # (None keeps every raw sample)
+        self.raw_metric_minutes = raw_metric_minutes
         
-        # Make sure the database has the needed tables
-        self._ensure_statistics_table_exists()
+        # Make sure the database schema is current (no-op after the first call)
+        try:
+            ensure_schema()
+        except Exception as e:
+            logging.error(f"Error migrating database schema: {str(e)}")
 
         # Initialize metrics storage with current timestamp
         self.reset_session()
         
-    def _ensure_statistics_table_exists(self):
-        """Ensure the statistics table exists in the database"""
-        DB_PATH = 'database/focusguard.db'
-        
-        try:
-            # Create database directory if it doesn't exist
-            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-            
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Create statistics table if it doesn't exist
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_statistics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                session_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                duration_minutes INTEGER DEFAULT 0,
-                drowsy_events INTEGER DEFAULT 0,
-                yawn_events INTEGER DEFAULT 0,
-                distraction_events INTEGER DEFAULT 0,
-                completed_pomodoros INTEGER DEFAULT 0,
-                visualization_data TEXT,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-            ''')
-            
-            conn.commit()
-            conn.close()
-            
-            logging.info("Statistics table checked/created successfully")
-            
-        except Exception as e:
-            logging.error(f"Error ensuring statistics table exists: {str(e)}")
-    
     def reset_session(self):
         """Reset all session data"""
+        raw_window_seconds = self.raw_metric_minutes * 60 if self.raw_metric_minutes else None
+
+        # Links session_events rows (written during the session) to the
+        # user_sessions row saved when it ends
+        self.session_uid = uuid.uuid4().hex
+        self.session_start_monotonic = time.monotonic()
+        # Set by finish_session() once detection has stopped
+        self.session_end_time = None
+        self.pending_events = []
+        self.pending_events_since = None
+        self.last_checkpoint = self.session_start_monotonic
+        
         self.current_session = {
             'start_time': datetime.now(),
             'drowsy_events': [],
             'yawn_events': [],
             'distraction_events': [],
             'camera_blocked_events': [],
-            'ear_values': [],
-            'mar_values': [],
+            'ear_values': MetricTimeSeries(raw_window_seconds=raw_window_seconds),
+            'mar_values': MetricTimeSeries(raw_window_seconds=raw_window_seconds),
             'pomodoro_sessions': []
         }
+
+        # Incremental EAR/MAR statistics (mean/variance, PERCLOS, blinks, yawns)
+        self.session_metrics = SessionMetrics()
+
+        # Event counts per 1/5/15 minute bucket, updated as events arrive
+        self.timeline = TimelineBuckets()
+
+        # Per-session quantile sketches, merged into the user's baseline at session end
+        self.metric_sketches = {
+            'ear': QuantileSketch(),
+            'mar': QuantileSketch()
+        }
         
         # Reset current state
         self.current_state = {
@@ -84,13 +105,38 @@ class StatisticsManager:
             'total_camera_blocked_events': 0,
             'average_ear': 0.0,
             'average_mar': 0.0,
+            'ear_std': 0.0,
+            'mar_std': 0.0,
+            'perclos': 0.0,
+            'blink_count': 0,
+            'blink_rate': 0.0,
+            'yawn_rate': 0.0,
             'completed_pomodoro_sessions': 0
         }
 
+    def refresh_summary(self):
+        """Copy the streaming EAR/MAR statistics into the session summary"""
+        self.session_summary.update(self.session_metrics.summary())
+        return self.session_summary
+
+    def finish_session(self, end_time=None):
+        """
+        Stamp the session's end time and duration into the summary (call
+        once detection has stopped, before the session is scored)
+
+        Returns:
+            dict: The refreshed session summary
+        """
+        self.session_end_time = end_time or datetime.now()
+        duration = (self.session_end_time - self.current_session['start_time']).total_seconds() // 60
+        self.session_summary['session_duration_minutes'] = duration
+        return self.refresh_summary()
+
     def update_metrics(self, metrics):
         """Update statistics with new metrics from the current frame"""
         try:
             current_time = datetime.now()
+            monotonic_time = time.monotonic()
         
             # Store user_id from metrics for later use with database functions
             # FIX: Store the user_id from metrics for database operations
@@ -99,16 +145,21 @@ class StatisticsManager:
             
             # Track EAR and MAR values if they are valid
             if 'ear' in metrics and metrics['ear'] and metrics['ear'] > 0:
-                self.current_session['ear_values'].append({
-                    'timestamp': current_time,
-                    'value': metrics['ear']
-                })
+                self.current_session['ear_values'].append(metrics['ear'], monotonic_time)
+                self.metric_sketches['ear'].add(metrics['ear'])
             
             if 'mar' in metrics and metrics['mar'] and metrics['mar'] > 0:
-                self.current_session['mar_values'].append({
-                    'timestamp': current_time,
-                    'value': metrics['mar']
-                })
+                self.current_session['mar_values'].append(metrics['mar'], monotonic_time)
+                self.metric_sketches['mar'].add(metrics['mar'])
+
+            # Feed the streaming statistics (constant time per frame)
+            self.session_metrics.update(
+                metrics.get('ear'),
+                metrics.get('mar'),
+                metrics.get('yawning', False),
+                monotonic_time,
+                metrics.get('ear_thresh')
+            )
         
             # Track drowsy events with state change detection
             if metrics.get('drowsy', False) and not self.current_state['is_drowsy']:
@@ -117,6 +168,8 @@ class StatisticsManager:
                     'ear_value': metrics.get('ear', 0)
                 })
                 self.current_state['is_drowsy'] = True
+                self.timeline.record('drowsy', (current_time - self.current_session['start_time']).total_seconds())
+                self._record_event('drowsy', current_time, monotonic_time, value=metrics.get('ear', 0))
                 self.session_summary['total_drowsy_events'] += 1
                 logging.debug(f"Drowsy event detected. Total: {self.session_summary['total_drowsy_events']}")
             elif not metrics.get('drowsy', False):
@@ -129,6 +182,8 @@ class StatisticsManager:
                     'mar_value': metrics.get('mar', 0)
                 })
                 self.current_state['is_yawning'] = True
+                self.timeline.record('yawn', (current_time - self.current_session['start_time']).total_seconds())
+                self._record_event('yawn', current_time, monotonic_time, value=metrics.get('mar', 0))
                 self.session_summary['total_yawn_events'] += 1
                 logging.debug(f"Yawn event detected. Total: {self.session_summary['total_yawn_events']}")
             elif not metrics.get('yawning', False):
@@ -146,6 +201,8 @@ class StatisticsManager:
                     'head_pose': head_pose
                 })
                 self.current_state['is_distracted'] = True
+                self.timeline.record('distraction', (current_time - self.current_session['start_time']).total_seconds())
+                self._record_event('distraction', current_time, monotonic_time, head_pose=head_pose)
                 self.session_summary['total_distraction_events'] += 1
                 logging.debug(f"Distraction event detected. Head pose: {head_pose}. Total: {self.session_summary['total_distraction_events']}")
             elif not is_distracted:
@@ -159,10 +216,77 @@ class StatisticsManager:
                 if pomodoro_status and 'sessions_completed' in pomodoro_status:
                     self.session_summary['completed_pomodoro_sessions'] = pomodoro_status['sessions_completed']
 
+            # Checkpoint periodically; in between, write buffered events once
+            # a batch is full or old enough
+            if monotonic_time - self.last_checkpoint >= self.CHECKPOINT_INTERVAL_SECONDS:
+                self.checkpoint()
+            elif self.pending_events and (
+                len(self.pending_events) >= self.EVENT_BATCH_SIZE
+                or monotonic_time - self.pending_events_since >= self.EVENT_FLUSH_SECONDS
+            ):
+                self.flush_events()
+
         except Exception as e:
             logging.error(f"Error updating metrics: {str(e)}")
             logging.exception("Full traceback:")
 
+    def _record_event(self, event_type, current_time, monotonic_time, value=None, head_pose=None):
+        """Buffer one detection event for session_events"""
+        if not self.pending_events:
+            self.pending_events_since = monotonic_time
+        self.pending_events.append((
+            event_type,
+            current_time.isoformat(),
+            round(monotonic_time - self.session_start_monotonic, 3),
+            value,
+            head_pose
+        ))
+
+    def flush_events(self, user_id=None):
+        """
+        Write buffered detection events to session_events with one
+        executemany (joins the caller's transaction; the buffer is trimmed
+        once it commits)
+        
+        Args:
+            user_id: The ID of the user (defaults to the one seen in update_metrics)
+            
+        Returns:
+            bool: False if the events could not be written (they stay buffered)
+        """
+        if not self.pending_events:
+            return True
+        user_id = user_id or getattr(self, 'user_id', None)
+        if not user_id:
+            # Keep buffering until the user is known
+            return True
+        
+        events = list(self.pending_events)
+        path = shards.user_db_path(user_id)
+
+        def flushed():
+            # Events recorded since this batch was taken stay buffered
+            del self.pending_events[:len(events)]
+            data_versions.bump('sessions', user_id)
+
+        try:
+            with transaction(path) as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO session_events
+                    (session_uid, user_id, event_type, occurred_at, offset_seconds, value, head_pose)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    [(self.session_uid, user_id) + event for event in events]
+                )
+                # Inside the caller's transaction the batch stays buffered
+                # until that commits, so a rollback loses nothing
+                after_commit(flushed, path)
+            return True
+        except Exception as e:
+            logging.error(f"Error saving session events for user {user_id}: {str(e)}")
+            return False
+
     def save_session(self):
         """Save the current session statistics to a file (legacy method)"""
         try:
@@ -170,10 +294,13 @@ class StatisticsManager:
                 logging.warning("No events recorded in this session")
                 return None
 
-            # Calculate session duration
-            end_time = datetime.now()
-            duration = (end_time - self.current_session['start_time']).total_seconds() // 60
-            self.session_summary['session_duration_minutes'] = duration
+            # Calculate session duration (as scored, once the session has ended)
+            if self.session_end_time:
+                end_time = self.session_end_time
+                self.refresh_summary()
+            else:
+                end_time = datetime.now()
+                self.finish_session(end_time)
 
             # Prepare data for saving
             save_data = {
@@ -219,7 +346,6 @@ class StatisticsManager:
             user_id: The ID of the user
             session_id: Optional ID of an existing session to update with visualization data
         """
-        DB_PATH = 'database/focusguard.db'
 
         if not user_id:
             logging.error("No user ID provided for saving statistics")
@@ -231,68 +357,76 @@ class StatisticsManager:
                 end_time = datetime.now()
                 duration = (end_time - self.current_session['start_time']).total_seconds() // 60
                 self.session_summary['session_duration_minutes'] = duration
+            self.refresh_summary()
             
-            # Get visualization data
-            viz_data = self.get_visualization_data()
+            # Get visualization data, encoded as a compressed columnar blob
+            viz_blob = VisualizationBlob.encode(self.get_visualization_data())
             
             # Connect to the database
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
+            path = shards.user_db_path(user_id)
+            with transaction(path) as conn:
+                cursor = conn.cursor()
             
-            if session_id:
-                # Update an existing session with visualization data
-                cursor.execute('''
-                    UPDATE user_sessions
-                    SET visualization_data = ?
-                    WHERE id = ? AND user_id = ?
-                ''', (
-                    json.dumps(viz_data),
-                    session_id,
-                    user_id
-                ))
-            else:
-                # Find the most recent session for this user that doesn't have visualization data
-                cursor.execute('''
-                    SELECT id FROM user_sessions
-                    WHERE user_id = ? AND visualization_data IS NULL
-                    ORDER BY start_time DESC LIMIT 1
-                ''', (user_id,))
-                
-                recent_session = cursor.fetchone()
-                
-                if recent_session:
-                    # Update the recent session
+                if session_id:
+                    # Update an existing session with visualization data
                     cursor.execute('''
                         UPDATE user_sessions
                         SET visualization_data = ?
-                        WHERE id = ?
+                        WHERE id = ? AND user_id = ?
                     ''', (
-                        json.dumps(viz_data),
-                        recent_session[0]
+                        viz_blob,
+                        session_id,
+                        user_id
                     ))
                 else:
-                    # Create a new session record
+                    # Find the most recent session for this user that doesn't have visualization data
                     cursor.execute('''
-                        INSERT INTO user_sessions 
-                        (user_id, start_time, end_time, duration_minutes, drowsy_events, 
-                        yawn_events, distraction_events, completed_pomodoros, points_earned, visualization_data)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        user_id,
-                        self.current_session['start_time'].isoformat(),
-                        datetime.now().isoformat(),
-                        self.session_summary.get('session_duration_minutes', 0),
-                        self.session_summary.get('total_drowsy_events', 0),
-                        self.session_summary.get('total_yawn_events', 0),
-                        self.session_summary.get('total_distraction_events', 0),
-                        self.session_summary.get('completed_pomodoro_sessions', 0),
-                        0,  # We don't know points earned here
-                        json.dumps(viz_data)
-                    ))
-            
-            conn.commit()
-            conn.close()
-            
+                        SELECT id FROM user_sessions
+                        WHERE user_id = ? AND visualization_data IS NULL
+                        ORDER BY start_time DESC LIMIT 1
+                    ''', (user_id,))
+                
+                    recent_session = cursor.fetchone()
+                
+                    if recent_session:
+                        # Update the recent session
+                        cursor.execute('''
+                            UPDATE user_sessions
+                            SET visualization_data = ?
+                            WHERE id = ?
+                        ''', (
+                            viz_blob,
+                            recent_session[0]
+                        ))
+                    else:
+                        # Create a new session record
+                        cursor.execute('''
+                            INSERT INTO user_sessions 
+                            (user_id, start_time, end_time, duration_minutes, drowsy_events, 
+                            yawn_events, distraction_events, completed_pomodoros, points_earned, visualization_data,
+                            average_ear, average_mar, perclos, blink_count, blink_rate, yawn_rate, session_uid)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', (
+                            user_id,
+                            self.current_session['start_time'].isoformat(),
+                            datetime.now().isoformat(),
+                            self.session_summary.get('session_duration_minutes', 0),
+                            self.session_summary.get('total_drowsy_events', 0),
+                            self.session_summary.get('total_yawn_events', 0),
+                            self.session_summary.get('total_distraction_events', 0),
+                            self.session_summary.get('completed_pomodoro_sessions', 0),
+                            0,  # We don't know points earned here
+                            viz_blob,
+                            self.session_summary.get('average_ear', 0.0),
+                            self.session_summary.get('average_mar', 0.0),
+                            self.session_summary.get('perclos', 0.0),
+                            self.session_summary.get('blink_count', 0),
+                            self.session_summary.get('blink_rate', 0.0),
+                            self.session_summary.get('yawn_rate', 0.0),
+                            self.session_uid
+                        ))
+                
+                after_commit(lambda: data_versions.bump('sessions', user_id), path)
             logging.info(f"Statistics saved to database for user {user_id}")
             return True
             
@@ -300,6 +434,184 @@ class StatisticsManager:
             logging.error(f"Error saving statistics to database for user {user_id}: {str(e)}")
             return False
 
+    def checkpoint_state(self):
+        """Compact running state of the session (what recovery needs)"""
+        self.refresh_summary()
+        state = {field: self.session_summary.get(field, 0) for field in self.CHECKPOINT_FIELDS}
+        state['duration_seconds'] = round(time.monotonic() - self.session_start_monotonic, 1)
+        return state
+
+    def checkpoint(self, user_id=None):
+        """
+        Append the session's running state to session_checkpoints, together
+        with any buffered events, in one transaction
+        
+        Returns:
+            bool: True if a checkpoint was written
+        """
+        self.last_checkpoint = time.monotonic()
+        user_id = user_id or getattr(self, 'user_id', None)
+        if not user_id:
+            return False
+        
+        try:
+            state = json.dumps(self.checkpoint_state(), separators=(',', ':'))
+            with transaction(shards.user_db_path(user_id)) as conn:
+                if not self.flush_events(user_id):
+                    raise RuntimeError("session events could not be saved")
+                conn.execute(
+                    """
+                    INSERT INTO session_checkpoints (session_uid, user_id, start_time, created_at, state)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (self.session_uid, user_id, self.current_session['start_time'].isoformat(),
+                     datetime.now().isoformat(), state)
+                )
+            return True
+        except Exception as e:
+            logging.error(f"Error checkpointing session for user {user_id}: {str(e)}")
+            return False
+
+    def clear_checkpoints(self, user_id=None):
+        """Drop this session's checkpoints once it is finalized (joins the caller's transaction)"""
+        user_id = user_id or getattr(self, 'user_id', None)
+        try:
+            with transaction(shards.user_db_path(user_id)) as conn:
+                conn.execute("DELETE FROM session_checkpoints WHERE session_uid = ?", (self.session_uid,))
+            return True
+        except Exception as e:
+            logging.error(f"Error clearing session checkpoints: {str(e)}")
+            return False
+
+    @staticmethod
+    def get_event_counts_by_hour(user_id, event_type='drowsy', days=90):
+        """
+        Count a user's detection events by hour of day across sessions
+        
+        Args:
+            user_id: The ID of the user
+            event_type: 'drowsy', 'yawn' or 'distraction'
+            days: How far back to look
+            
+        Returns:
+            dict: Hour (0-23) -> event count (hours without events omitted)
+        """
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        try:
+            conn = get_read_connection(shards.user_db_path(user_id))
+            rows = conn.execute('''
+                SELECT CAST(strftime('%H', occurred_at) AS INTEGER) AS hour, COUNT(*)
+                FROM session_events
+                WHERE user_id = ? AND event_type = ? AND occurred_at >= ?
+                GROUP BY hour
+            ''', (user_id, event_type, since)).fetchall()
+            # Events compacted by the retention job
+            rows += conn.execute('''
+                SELECT CAST(strftime('%H', hour) AS INTEGER) AS hour_of_day, SUM(events)
+                FROM user_event_hourly
+                WHERE user_id = ? AND event_type = ? AND hour >= ?
+                GROUP BY hour_of_day
+            ''', (user_id, event_type, since)).fetchall()
+            counts = {}
+            for hour, count in rows:
+                counts[hour] = counts.get(hour, 0) + count
+            return counts
+        except Exception as e:
+            logging.error(f"Error counting {event_type} events for user {user_id}: {str(e)}")
+            return {}
+
+    @staticmethod
+    def load_metric_sketches(user_id):
+        """
+        Load a user's stored EAR/MAR quantile sketches
+        
+        Args:
+            user_id: The ID of the user
+            
+        Returns:
+            dict: Metric name -> QuantileSketch (empty dict if none stored)
+        """
+        try:
+            conn = get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT metric, sketch FROM user_metric_sketches WHERE user_id = ?', (user_id,))
+            rows = cursor.fetchall()
+            
+            return {metric: QuantileSketch.from_bytes(data) for metric, data in rows}
+            
+        except Exception as e:
+            logging.error(f"Error loading metric sketches for user {user_id}: {str(e)}")
+            return {}
+
+    def save_metric_sketches(self, user_id):
+        """
+        Merge this session's EAR/MAR sketches into the user's stored baseline
+        
+        Args:
+            user_id: The ID of the user
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not user_id:
+            logging.error("No user ID provided for saving metric sketches")
+            return False
+            
+        try:
+            stored = self.load_metric_sketches(user_id)
+            rows = []
+            for metric, sketch in self.metric_sketches.items():
+                if not sketch.count:
+                    continue
+                merged = stored.get(metric, QuantileSketch()).merge(sketch)
+                rows.append((user_id, metric, merged.to_bytes(), datetime.now().isoformat()))
+            
+            if not rows:
+                return True
+            
+            with transaction() as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO user_metric_sketches (user_id, metric, sketch, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(user_id, metric) DO UPDATE SET
+                        sketch = excluded.sketch,
+                        updated_at = excluded.updated_at
+                ''', rows)
+            
+            logging.info(f"Metric sketches saved for user {user_id}")
+            return True
+            
+        except Exception as e:
+            logging.error(f"Error saving metric sketches for user {user_id}: {str(e)}")
+            return False
+
+    @classmethod
+    def get_adaptive_thresholds(cls, user_id, config):
+        """
+        Derive EAR/MAR thresholds from the user's own distribution percentiles
+        
+        Args:
+            user_id: The ID of the user
+            config: Config providing the percentiles and minimum sample count
+            
+        Returns:
+            dict: {'eye_ar_thresh', 'mouth_ar_thresh'} with the values that have
+            enough history (missing keys keep their fixed thresholds)
+        """
+        sketches = cls.load_metric_sketches(user_id)
+        thresholds = {}
+        
+        ear_sketch = sketches.get('ear')
+        if ear_sketch and ear_sketch.count >= config.ADAPTIVE_MIN_SAMPLES:
+            thresholds['eye_ar_thresh'] = round(ear_sketch.quantile(config.ADAPTIVE_EAR_PERCENTILE), 4)
+            
+        mar_sketch = sketches.get('mar')
+        if mar_sketch and mar_sketch.count >= config.ADAPTIVE_MIN_SAMPLES:
+            thresholds['mouth_ar_thresh'] = round(mar_sketch.quantile(config.ADAPTIVE_MAR_PERCENTILE), 4)
+            
+        return thresholds
+
     def load_session_from_db(self, user_id):
         """
         Load the latest session statistics from the unified database table
@@ -310,34 +622,31 @@ class StatisticsManager:
         Returns:
             dict: Visualization data if successful, None otherwise
         """
-        DB_PATH = 'database/focusguard.db'
         if not user_id:
             logging.error("No user ID provided for loading statistics")
             return None
             
         try:
             # Connect to the database
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row  # Access columns by name
+            conn = get_connection(shards.user_db_path(user_id))
             cursor = conn.cursor()
             
             # Get the most recent session with visualization data
             cursor.execute('''
                 SELECT * FROM user_sessions
-                WHERE user_id = ? AND visualization_data IS NOT NULL
+                WHERE user_id = ? AND length(visualization_data) > 0
                 ORDER BY start_time DESC
                 LIMIT 1
             ''', (user_id,))
             
             row = cursor.fetchone()
-            conn.close()
             
             if not row:
                 logging.info(f"No statistics found for user {user_id}")
                 return None
                 
-            # Parse the visualization data
-            viz_data = json.loads(row['visualization_data'])
+            # Decode the visualization data (blob or legacy JSON)
+            viz_data = load_visualization(row['visualization_data'])
             
             # Add session info to enhance the visualization data
             viz_data['session_info'] = {
@@ -368,11 +677,9 @@ class StatisticsManager:
         Returns:
             list: List of session data dictionaries
         """
-        DB_PATH = 'database/focusguard.db'
         try:
             # Connect to the database
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row
+            conn = get_read_connection(shards.user_db_path(user_id))
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -383,18 +690,18 @@ class StatisticsManager:
             ''', (user_id, limit))
             
             rows = cursor.fetchall()
-            conn.close()
             
             sessions = []
             for row in rows:
                 session = dict(row)
-                # Convert visualization_data to object if needed
-                if 'visualization_data' in session and session['visualization_data']:
+                # Decode visualization_data (blob or legacy JSON) to an object;
+                # None once the retention job has dropped it
+                if 'visualization_data' in session:
                     try:
-                        session['visualization_data'] = json.loads(session['visualization_data'])
-                    except:
-                        # Keep as string if JSON parsing fails
-                        pass
+                        session['visualization_data'] = load_visualization(session['visualization_data'])
+                    except ValueError as e:
+                        logging.warning(f"Undecodable visualization data for session {session['id']}: {str(e)}")
+                        session['visualization_data'] = None
                 sessions.append(session)
             
             return sessions
@@ -419,15 +726,11 @@ class StatisticsManager:
             
         try:
             # Connect to the database
-            DB_PATH = 'database/focusguard.db'
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Delete all statistics for the user
-            cursor.execute('DELETE FROM user_statistics WHERE user_id = ?', (user_id,))
+            with transaction() as conn:
+                cursor = conn.cursor()
             
-            conn.commit()
-            conn.close()
+                # Delete all statistics for the user
+                cursor.execute('DELETE FROM user_statistics WHERE user_id = ?', (user_id,))
             
             logging.info(f"Cleared all statistics for user {user_id}")
             return True
@@ -436,8 +739,8 @@ class StatisticsManager:
             logging.error(f"Error clearing statistics for user {user_id}: {str(e)}")
             return False
         
-    def get_visualization_data(self, from_db=False, user_id=None):
-        """Prepare data for front-end visualization"""
+    def get_visualization_data(self, from_db=False, user_id=None, bucket_minutes=5):
+        """Prepare data for front-end visualization (timeline buckets of 1, 5 or 15 minutes)"""
         try:
             # Return empty data if no session active
             if not self.current_session['start_time']:
@@ -448,33 +751,12 @@ class StatisticsManager:
             duration_seconds = (current_time - self.current_session['start_time']).total_seconds()
             duration_minutes = int(duration_seconds // 60)
             
-            # Timeline data - create time buckets (5 minute intervals)
-            bucket_size = 300  # 5 minutes in seconds
-            num_buckets = max(1, int(duration_seconds // bucket_size) + 1)
-            
-            timeline_data = []
-            
-            for i in range(num_buckets):
-                bucket_start = self.current_session['start_time'] + timedelta(seconds=i * bucket_size)
-                bucket_end = bucket_start + timedelta(seconds=bucket_size)
-                
-                # Count events in this time bucket
-                drowsy_count = sum(1 for event in self.current_session['drowsy_events'] 
-                                if bucket_start <= event['start_time'] < bucket_end)
-                yawn_count = sum(1 for event in self.current_session['yawn_events'] 
-                            if bucket_start <= event['start_time'] < bucket_end)
-                distraction_count = sum(1 for event in self.current_session['distraction_events'] 
-                                    if bucket_start <= event['start_time'] < bucket_end)
-                
-                # Calculate bucket label
-                time_label = bucket_start.strftime('%H:%M')
-                
-                timeline_data.append({
-                    'time': time_label,
-                    'drowsy': drowsy_count,
-                    'yawn': yawn_count,
-                    'distraction': distraction_count
-                })
+            # Timeline data from the incrementally maintained bucket counters
+            timeline_data = self.timeline.timeline(
+                self.current_session['start_time'],
+                duration_seconds,
+                bucket_seconds=bucket_minutes * 60
+            )
             
             # Distribution data
             total_events = (self.session_summary['total_drowsy_events'] + 
@@ -550,27 +832,25 @@ class StatisticsManager:
         """Get historical sessions from database"""
         try:
             # Connect to the database
-            DB_PATH = 'database/focusguard.db'
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row
+            conn = get_read_connection(shards.user_db_path(user_id))
             cursor = conn.cursor()
             
             # Get the 5 most recent sessions
             cursor.execute('''
-                SELECT * FROM user_statistics
+                SELECT start_time, duration_minutes, drowsy_events, yawn_events, distraction_events
+                FROM user_sessions
                 WHERE user_id = ?
-                ORDER BY session_date DESC
+                ORDER BY start_time DESC
                 LIMIT 5
             ''', (user_id,))
             
             rows = cursor.fetchall()
-            conn.close()
             
             history = []
-            for row in dict(row):
+            for row in rows:
                 try:
-                    # Parse date from session_date
-                    session_date = datetime.fromisoformat(row['session_date'])
+                    # Parse date from start_time
+                    session_date = datetime.fromisoformat(row['start_time'])
                     date_label = session_date.strftime('%m/%d %H:%M')
                 except:
                     date_label = "Unknown"
@@ -593,13 +873,9 @@ class StatisticsManager:
         """Get historical sessions from files (legacy method)"""
         try:
             # Find all session JSON files
-            session_files = list(self.save_dir.glob('session_stats_*.json'))
-            
-            # Sort by date (newest first)
-            session_files.sort(reverse=True)
-            
-            # Limit to last 5 sessions
-            session_files = session_files[:5]
+            # Last 5 sessions, newest first (names sort by date; the
+            # retention job keeps the directory small)
+            session_files = heapq.nlargest(5, self.save_dir.glob('session_stats_*.json'))
             
             history = []
             
@@ -272,4 +272,246 @@ def create_sample_sessions(user, user_data):
         # Add to in-memory list for points calculation
         sessions.append(session_data)
     
-    return sessions
\ No newline at end of file
+    return sessions
+
+# Synthetic accounts made by create_bulk_test_data() all share this password
+SYNTHETIC_PASSWORD = "Synthetic123!"
+
+_FIRST_NAMES = ["Alex", "Sam", "Taylor", "Morgan", "Casey", "Jordan", "Riley", "Jamie", "Avery", "Quinn",
+                "Drew", "Robin", "Skyler", "Parker", "Rowan", "Hayden", "Emerson", "Reese", "Kai", "Noa"]
+_LAST_NAMES = ["Johnson", "Smith", "Brown", "Wilson", "Miller", "Lee", "Taylor", "Garcia", "Nguyen", "Khan",
+               "Silva", "Novak", "Rossi", "Tanaka", "Okafor", "Murphy", "Kowalski", "Haddad", "Larsen", "Costa"]
+# Relative likelihood of a session starting at each hour of the day
+_HOUR_WEIGHTS = [1, 0, 0, 0, 0, 1, 2, 4, 8, 10, 10, 8, 5, 7, 9, 9, 8, 6, 6, 8, 9, 8, 5, 2]
+
+
+def create_bulk_test_data(users=100000, sessions_per_user=10, days=180, seed=42, end=None,
+                          events=True, visualization=False, batch_users=5000, path=None):
+    """
+    Bulk-insert synthetic users, sessions and detection events for load tests
+    
+    Unlike create_test_users() nothing goes through User.create() or the
+    achievement manager: rows are generated in memory and written with
+    executemany, batch_users users per transaction, with synchronous=OFF
+    for the duration of the load. Every account shares one precomputed
+    password hash (SYNTHETIC_PASSWORD). Settings, daily rollups and
+    analytics totals are derived from the generated sessions, so they are
+    consistent with what the app would have recorded.
+    
+    Distributions: sessions per user are log-normal around
+    sessions_per_user (most users have a few, some have many), start
+    hours follow a daytime/evening curve, durations are log-normal around
+    45 minutes, and each user has a focus quality that scales their
+    drowsy / yawn / distraction event rates.
+    
+    Writes the single-database layout; in shard mode run
+    shards.shard_existing_users() afterwards.
+    
+    Args:
+        users: Number of users to add (ids continue after existing users)
+        sessions_per_user: Mean sessions per user
+        days: Sessions start within this many days before end
+        seed: Random seed; the same seed and end give the same rows (apart
+            from the salted password hash)
+        end: Datetime the history ends at (default: today at midnight)
+        events: Also write a session_events row per detection event
+        visualization: Give sessions a visualization blob instead of an
+            empty one
+        batch_users: Users written per transaction
+        path: Database file (default: the main database)
+        
+    Returns:
+        dict: Counts of users, sessions and events written
+    """
+    import bisect
+    import logging
+    import math
+    import random
+    from datetime import datetime
+    from statistics import NormalDist
+    from werkzeug.security import generate_password_hash
+    from models import data_versions
+    from models.analytics import COUNTERS
+    from models.database import get_connection, transaction
+    from utils.account_index import account_index
+    from utils.achievement_manager import AchievementManager
+    from utils.leaderboard import leaderboard_service
+    from utils.visualization_blob import VisualizationBlob
+    
+    # Sessions and event times draw from separate streams, so the sessions
+    # are the same with and without events
+    random_fraction = random.Random(seed).random
+    event_fraction = random.Random(seed + 1).random
+    from_timestamp = datetime.fromtimestamp
+    # Standard normal by inverse-CDF table lookup: far cheaper than
+    # random.gauss() per draw, and plenty for synthetic data
+    normal_table = [NormalDist().inv_cdf((i + 0.5) / 4096) for i in range(4096)]
+    
+    def normal():
+        return normal_table[int(random_fraction() * 4096)]
+    
+    end = end or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    end_timestamp = end.timestamp()
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+    
+    # Level thresholds and point rules the app itself scores with
+    rules = AchievementManager()
+    thresholds = rules.level_thresholds
+    minute_points = rules.point_rules['minute_focused']
+    pomodoro_points = rules.point_rules['pomodoro_complete']
+    drowsy_points = rules.point_rules['drowsy_penalty']
+    distraction_points = rules.point_rules['distraction_penalty']
+    
+    # A few distinct blobs, reused: encoding one per session would dominate the run
+    blobs = [b'']
+    if visualization:
+        blobs = []
+        for variant in range(16):
+            timeline = [{'time': f"{9 + i // 12:02d}:{i % 12 * 5:02d}", 'drowsy': (i * variant) % 3,
+                         'yawn': (i + variant) % 2, 'distraction': (i * 7 + variant) % 4}
+                        for i in range(6 + variant)]
+            blobs.append(VisualizationBlob.encode({
+                'timeline': timeline, 'distribution': [], 'historical': [],
+                'session_info': {'duration': len(timeline) * 5}
+            }))
+    
+    hours = [hour for hour, weight in enumerate(_HOUR_WEIGHTS) for _ in range(weight)]
+    # Log-normal with sigma 1 has mean exp(mu + 1/2)
+    mu = math.log(max(sessions_per_user, 0.01)) - 0.5
+    event_types = ('drowsy', 'yawn', 'distraction')
+    
+    conn = get_connection(path)
+    first_id = (conn.execute("SELECT MAX(id) FROM users").fetchone()[0] or 0) + 1
+    conn.execute("PRAGMA synchronous=OFF")
+    counts = {'users': 0, 'sessions': 0, 'events': 0}
+    
+    try:
+        for batch_start in range(first_id, first_id + users, batch_users):
+            user_rows, settings_rows, session_rows, event_rows = [], [], [], []
+            rollup_rows, totals_rows = [], []
+            
+            for user_id in range(batch_start, min(batch_start + batch_users, first_id + users)):
+                name = (f"{_FIRST_NAMES[int(random_fraction() * len(_FIRST_NAMES))]} "
+                        f"{_LAST_NAMES[int(random_fraction() * len(_LAST_NAMES))]}")
+                active_days = 1 + int(random_fraction() * days)
+                joined_timestamp = end_timestamp - active_days * 86400
+                user_rows.append((user_id, f"synthetic{user_id}", f"synthetic{user_id}@example.com", name,
+                                  password_hash, from_timestamp(joined_timestamp).isoformat()))
+                
+                # Per-user focus quality: 1.0 never drowsy, 0.0 often; the
+                # per-minute event rates scale with it
+                quality = min(1.0, max(0.0, 0.6 + 0.2 * normal()))
+                rates = (0.15 * (1 - quality), 0.02 + 0.06 * (1 - quality), 0.25 * (1 - quality))
+                
+                starts = sorted(
+                    joined_timestamp + int(random_fraction() * active_days) * 86400
+                    + hours[int(random_fraction() * len(hours))] * 3600 + int(random_fraction() * 3600)
+                    for _ in range(int(math.exp(mu + normal())))
+                )
+                by_day = {}
+                for index, start_timestamp in enumerate(starts):
+                    duration = min(240, max(5, int(math.exp(3.8 + 0.5 * normal()))))
+                    pomodoros = duration // 30 if random_fraction() < 0.7 else 0
+                    # Shaped like uuid4().hex, but increasing so index inserts append
+                    uid = f"{seed & 0xffffffff:08x}{user_id:012x}{index:012x}"
+                    start_text = from_timestamp(start_timestamp).isoformat()
+                    
+                    counters = []
+                    for event_type, rate in zip(event_types, rates):
+                        # Normal approximation of a Poisson count
+                        mean = rate * duration
+                        count = max(0, round(mean + math.sqrt(mean) * normal()))
+                        counters.append(count)
+                        if events:
+                            for _ in range(count):
+                                offset = event_fraction() * duration * 60
+                                event_rows.append((uid, user_id, event_type,
+                                                   from_timestamp(start_timestamp + offset).isoformat(), offset))
+                    drowsy, yawns, distractions = counters
+                    
+                    points = max(0, duration * minute_points + pomodoros * pomodoro_points
+                                 + drowsy * drowsy_points + distractions * distraction_points)
+                    blinks = int(duration * (10 + 10 * random_fraction()))
+                    end_text = from_timestamp(start_timestamp + duration * 60).isoformat()
+                    session_rows.append((
+                        user_id, start_text, end_text, end_text, duration, drowsy, yawns, distractions, pomodoros, points,
+                        0.22 + 0.08 * quality + 0.02 * normal(), 0.5 + 0.1 * normal(), (1 - quality) * 0.2,
+                        blinks, blinks / duration, yawns / duration, uid,
+                        blobs[int(random_fraction() * len(blobs))]
+                    ))
+                    
+                    day = by_day.get(start_text[:10])
+                    if day is None:
+                        day = by_day[start_text[:10]] = [0] * len(COUNTERS)
+                    # Same order as COUNTERS
+                    for position, value in enumerate((1, points, duration, pomodoros, drowsy, distractions)):
+                        day[position] += value
+                
+                totals = [0] * len(COUNTERS)
+                for day, day_counters in by_day.items():
+                    rollup_rows.append((user_id, day, *day_counters))
+                    totals = [total + value for total, value in zip(totals, day_counters)]
+                sessions, points, focus_minutes, pomodoros = totals[:4]
+                
+                # Daily streak: consecutive days with a session up to the last one
+                streak = 0
+                last_day = max(by_day) if by_day else None
+                if last_day:
+                    last_ordinal = datetime.fromisoformat(last_day).toordinal()
+                    while datetime.fromordinal(last_ordinal - streak).date().isoformat() in by_day:
+                        streak += 1
+                    totals_rows.append((user_id, *totals, len(by_day), min(by_day), last_day))
+                
+                settings_rows.append((
+                    user_id, points, bisect.bisect_right(thresholds, points), points, streak,
+                    min(pomodoros, int(random_fraction() * 60)), last_day, last_day, focus_minutes, sessions
+                ))
+            
+            columns = ', '.join(COUNTERS)
+            placeholders = ', '.join('?' * len(COUNTERS))
+            with transaction(path) as conn:
+                conn.executemany(
+                    "INSERT INTO users (id, username, email, full_name, password_hash, created_at, is_active) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 1)", user_rows
+                )
+                conn.executemany(
+                    "INSERT INTO user_settings (user_id, profile_points, profile_level, profile_experience, "
+                    "daily_streak, pomodoro_streak, last_session_date, last_check_in_date, total_focus_minutes, "
+                    "total_sessions) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", settings_rows
+                )
+                conn.executemany(
+                    "INSERT INTO user_sessions (user_id, start_time, end_time, created_at, duration_minutes, "
+                    "drowsy_events, yawn_events, distraction_events, completed_pomodoros, points_earned, "
+                    "average_ear, average_mar, perclos, blink_count, blink_rate, yawn_rate, session_uid, "
+                    "visualization_data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", session_rows
+                )
+                conn.executemany(
+                    "INSERT INTO session_events (session_uid, user_id, event_type, occurred_at, offset_seconds) "
+                    "VALUES (?, ?, ?, ?, ?)", event_rows
+                )
+                conn.executemany(
+                    f"INSERT INTO user_daily_rollups (user_id, day, {columns}) VALUES (?, ?, {placeholders})",
+                    rollup_rows
+                )
+                conn.executemany(
+                    f"INSERT INTO user_analytics_totals (user_id, {columns}, active_days, first_day, last_day) "
+                    f"VALUES (?, {placeholders}, ?, ?, ?)", totals_rows
+                )
+            
+            counts['users'] += len(user_rows)
+            counts['sessions'] += len(session_rows)
+            counts['events'] += len(event_rows)
+            logging.info(f"Seeded {counts['users']}/{users} synthetic users")
+    finally:
+        conn.execute("PRAGMA synchronous=NORMAL")
+    
+    # Windowed leaderboards, the in-memory ranking and the account index
+    # must pick up the new rows
+    data_versions.bump('rollups', None)
+    if path is None:
+        leaderboard_service.reload()
+        if account_index.is_loaded:
+            account_index.reload()
+    
+    logging.info(f"Seeded {counts['users']} users, {counts['sessions']} sessions and {counts['events']} events")
+    return counts
@@ -0,0 +1,121 @@
+# utils/time_series.py
+import time
+from array import array
+
+
+class MetricTimeSeries:
+    """
+    Compact per-frame metric storage backed by typed arrays.
+
+    Samples are stored as float64 monotonic timestamps plus float32 values in
+    fixed-size chunks, so appending never copies the whole series. When
+    raw_window_seconds is set, chunks older than the window are folded into
+    per-second min/mean/max rows and the raw samples are released.
+    """
+
+    def __init__(self, chunk_size=4096, raw_window_seconds=None):
+        self.chunk_size = chunk_size
+        self.raw_window_seconds = raw_window_seconds
+
+        # Raw samples: list of (timestamps, values) chunk pairs
+        self._chunks = [(array('d'), array('f'))]
+
+        # Per-second rollup of samples that left the raw window
+        self._sec_ts = array('d')
+        self._sec_min = array('f')
+        self._sec_max = array('f')
+        self._sec_sum = array('d')
+        self._sec_count = array('I')
+
+        # Total number of samples ever appended
+        self.count = 0
+
+    def append(self, value, timestamp=None):
+        """Append a sample, using time.monotonic() when no timestamp is given"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        timestamps, values = self._chunks[-1]
+        if len(timestamps) >= self.chunk_size:
+            timestamps, values = array('d'), array('f')
+            self._chunks.append((timestamps, values))
+            self._compact(timestamp)
+
+        timestamps.append(timestamp)
+        values.append(value)
+        self.count += 1
+
+    def _compact(self, now):
+        """Fold full chunks that fell out of the raw window into per-second rows"""
+        if self.raw_window_seconds is None:
+            return
+
+        cutoff = now - self.raw_window_seconds
+        # Never fold the chunk currently being written
+        while len(self._chunks) > 1 and self._chunks[0][0][-1] < cutoff:
+            timestamps, values = self._chunks.pop(0)
+            self._rollup(timestamps, values)
+
+    def _rollup(self, timestamps, values):
+        """Aggregate one chunk of raw samples into the per-second arrays"""
+        sec_ts = self._sec_ts
+        sec_min = self._sec_min
+        sec_max = self._sec_max
+        sec_sum = self._sec_sum
+        sec_count = self._sec_count
+
+        for ts, value in zip(timestamps, values):
+            second = float(int(ts))
+            if sec_ts and sec_ts[-1] == second:
+                if value < sec_min[-1]:
+                    sec_min[-1] = value
+                if value > sec_max[-1]:
+                    sec_max[-1] = value
+                sec_sum[-1] += value
+                sec_count[-1] += 1
+            else:
+                sec_ts.append(second)
+                sec_min.append(value)
+                sec_max.append(value)
+                sec_sum.append(value)
+                sec_count.append(1)
+
+    def __len__(self):
+        """Number of raw samples currently retained"""
+        return sum(len(timestamps) for timestamps, _ in self._chunks)
+
+    def __bool__(self):
+        return self.count > 0
+
+    def raw(self):
+        """Yield retained raw samples as (timestamp, value) pairs, oldest first"""
+        for timestamps, values in self._chunks:
+            yield from zip(timestamps, values)
+
+    def downsampled(self):
+        """Yield per-second rollups as (second, min, mean, max), oldest first"""
+        for i in range(len(self._sec_ts)):
+            yield (
+                self._sec_ts[i],
+                self._sec_min[i],
+                self._sec_sum[i] / self._sec_count[i],
+                self._sec_max[i]
+            )
+
+    def latest(self):
+        """Return the most recent (timestamp, value) pair, or None if empty"""
+        for timestamps, values in reversed(self._chunks):
+            if timestamps:
+                return timestamps[-1], values[-1]
+        return None
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the sample buffers in bytes"""
+        total = 0
+        for timestamps, values in self._chunks:
+            total += timestamps.buffer_info()[1] * timestamps.itemsize
+            total += values.buffer_info()[1] * values.itemsize
+        for column in (self._sec_ts, self._sec_min, self._sec_max, self._sec_sum, self._sec_count):
+            total += column.buffer_info()[1] * column.itemsize
+        return total
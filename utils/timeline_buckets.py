@@ -0,0 +1,88 @@
+# utils/timeline_buckets.py
+from array import array
+from datetime import timedelta
+
+
+class TimelineBuckets:
+    """
+    Per-session event counters kept at several bucket resolutions.
+
+    Each recorded event increments one counter per resolution, so building a
+    timeline is O(buckets) instead of rescanning every event for every bucket.
+    """
+
+    EVENT_TYPES = ('drowsy', 'yawn', 'distraction')
+    DEFAULT_RESOLUTIONS = (60, 300, 900)  # 1, 5 and 15 minutes in seconds
+
+    def __init__(self, resolutions=DEFAULT_RESOLUTIONS):
+        self.resolutions = tuple(resolutions)
+        # resolution -> event type -> counts per bucket
+        self._counts = {
+            size: {event_type: array('I') for event_type in self.EVENT_TYPES}
+            for size in self.resolutions
+        }
+        # resolution -> cached 'HH:MM' labels (only valid for one start_time)
+        self._labels = {size: [] for size in self.resolutions}
+        self._label_start = None
+
+    def record(self, event_type, offset_seconds):
+        """Count one event that happened offset_seconds after session start"""
+        offset_seconds = max(0.0, offset_seconds)
+        for size in self.resolutions:
+            counts = self._counts[size][event_type]
+            index = int(offset_seconds // size)
+            if index >= len(counts):
+                self._grow(size, index + 1)
+            counts[index] += 1
+
+    def _grow(self, size, length):
+        """Extend every counter of a resolution to at least length buckets"""
+        for counts in self._counts[size].values():
+            missing = length - len(counts)
+            if missing > 0:
+                counts.frombytes(bytes(missing * counts.itemsize))
+
+    def _bucket_labels(self, size, start_time, num_buckets):
+        """Return 'HH:MM' labels for the first num_buckets buckets, caching them"""
+        if self._label_start != start_time:
+            self._labels = {s: [] for s in self.resolutions}
+            self._label_start = start_time
+
+        labels = self._labels.setdefault(size, [])
+        step = timedelta(seconds=size)
+        while len(labels) < num_buckets:
+            labels.append((start_time + step * len(labels)).strftime('%H:%M'))
+        return labels
+
+    def timeline(self, start_time, duration_seconds, bucket_seconds=300):
+        """
+        Build timeline rows for the front end
+
+        Args:
+            start_time: Session start as a datetime (used for bucket labels)
+            duration_seconds: Elapsed session time in seconds
+            bucket_seconds: One of the tracked resolutions
+
+        Returns:
+            list: [{'time', 'drowsy', 'yawn', 'distraction'}, ...]
+        """
+        if bucket_seconds not in self._counts:
+            raise ValueError(f"Unsupported bucket size: {bucket_seconds}s (tracked: {self.resolutions})")
+
+        num_buckets = max(1, int(duration_seconds // bucket_seconds) + 1)
+        counts = self._counts[bucket_seconds]
+        drowsy = counts['drowsy']
+        yawn = counts['yawn']
+        distraction = counts['distraction']
+        recorded = len(drowsy)
+        labels = self._bucket_labels(bucket_seconds, start_time, num_buckets)
+
+        return [
+            {
+                'time': labels[i],
+                'drowsy': drowsy[i] if i < recorded else 0,
+                'yawn': yawn[i] if i < recorded else 0,
+                'distraction': distraction[i] if i < recorded else 0
+            }
+            for i in range(num_buckets)
+        ]
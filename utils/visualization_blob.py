@@ -0,0 +1,265 @@
+# utils/visualization_blob.py
+import json
+import logging
+import struct
+import threading
+import time
+import zlib
+from array import array
+
+from models import shards
+from models.database import get_read_connection, transaction
+
+
+class VisualizationBlob:
+    """
+    Compact binary form of a session's stored visualization data.
+
+    The timeline is stored column by column as typed arrays (bucket start
+    as minutes since midnight, one uint32 array per event type) and every
+    other key as one compact JSON column. Each column is zlib-compressed on
+    its own (or kept raw when that is smaller, as for short sessions) behind
+    a small directory, so opening a blob only parses the header and a reader
+    that wants one key decodes one column.
+
+    Layout: header (magic, version, column count), then one directory entry
+    per column (name, typecode, compressed flag, item count, stored size),
+    then the column bodies in directory order. Timeline columns are named
+    'tl.<field>'; the JSON column is 'meta'.
+    """
+
+    _HEADER = struct.Struct('<2sBB')
+    _COLUMN = struct.Struct('<16scBII')
+    _MAGIC = b'VB'
+    _VERSION = 1
+
+    # Typecode of the JSON column (everything that is not a typed array)
+    _JSON = b'j'
+    TIMELINE_COUNTS = ('drowsy', 'yawn', 'distraction')
+
+    def __init__(self, data):
+        """Parse the header of a blob produced by encode() (bodies stay compressed)"""
+        data = memoryview(data)
+        magic, version, column_count = self._HEADER.unpack_from(data)
+        if magic != self._MAGIC or version != self._VERSION:
+            raise ValueError("Unrecognized visualization blob format")
+
+        self._data = data
+        self._columns = {}  # name -> (typecode, compressed, count, offset, size)
+        offset = self._HEADER.size + column_count * self._COLUMN.size
+        for index in range(column_count):
+            name, typecode, compressed, count, size = self._COLUMN.unpack_from(
+                data, self._HEADER.size + index * self._COLUMN.size
+            )
+            self._columns[name.rstrip(b'\0').decode()] = (typecode, compressed, count, offset, size)
+            offset += size
+        if offset > len(data):
+            raise ValueError("Truncated visualization blob")
+        self._meta = None
+
+    @classmethod
+    def encode(cls, viz_data, level=6):
+        """
+        Serialize visualization data (as built by get_visualization_data)
+
+        Returns:
+            bytes: The blob
+        """
+        other = dict(viz_data or {})
+        columns = []
+
+        minutes = cls._timeline_minutes(other.get('timeline'))
+        if minutes is not None:
+            timeline = other.pop('timeline')
+            columns.append(('tl.time', b'H', array('H', minutes)))
+            for field in cls.TIMELINE_COUNTS:
+                columns.append((f'tl.{field}', b'I', array('I', [row[field] for row in timeline])))
+        columns.append(('meta', cls._JSON, json.dumps(other, separators=(',', ':')).encode()))
+
+        directory = [cls._HEADER.pack(cls._MAGIC, cls._VERSION, len(columns))]
+        bodies = []
+        for name, typecode, values in columns:
+            raw = values.tobytes() if isinstance(values, array) else values
+            body = zlib.compress(raw, level)
+            compressed = len(body) < len(raw)
+            if not compressed:
+                body = raw
+            directory.append(cls._COLUMN.pack(name.encode(), typecode, compressed, len(values), len(body)))
+            bodies.append(body)
+        return b''.join(directory + bodies)
+
+    @classmethod
+    def _timeline_minutes(cls, timeline):
+        """
+        Bucket labels as minutes since midnight, or None if the timeline
+        does not fit the typed columns exactly (it then goes into 'meta')
+        """
+        if not isinstance(timeline, list) or not timeline:
+            return None
+        fields = {'time', *cls.TIMELINE_COUNTS}
+        minutes = []
+        for row in timeline:
+            if not isinstance(row, dict) or set(row) != fields:
+                return None
+            label = row['time']
+            if not isinstance(label, str) or len(label) != 5 or label[2] != ':':
+                return None
+            try:
+                hours, mins = int(label[:2]), int(label[3:])
+            except ValueError:
+                return None
+            if not (0 <= hours < 24 and 0 <= mins < 60):
+                return None
+            for field in cls.TIMELINE_COUNTS:
+                value = row[field]
+                if type(value) is not int or not 0 <= value < 2 ** 32:
+                    return None
+            minutes.append(hours * 60 + mins)
+        return minutes
+
+    def keys(self):
+        """Top-level keys stored in the blob"""
+        keys = list(self._get_meta())
+        if 'tl.time' in self._columns:
+            keys.insert(0, 'timeline')
+        return keys
+
+    def _body(self, name):
+        """Raw bytes of one column"""
+        _, compressed, _, offset, size = self._columns[name]
+        body = self._data[offset:offset + size]
+        return zlib.decompress(body) if compressed else body
+
+    def column(self, name):
+        """Decode one typed column"""
+        typecode, _, count, _, _ = self._columns[name]
+        values = array(typecode.decode())
+        values.frombytes(self._body(name))
+        if len(values) != count:
+            raise ValueError(f"Corrupt visualization blob column: {name}")
+        return values
+
+    def _get_meta(self):
+        if self._meta is None:
+            self._meta = json.loads(bytes(self._body('meta')))
+        return self._meta
+
+    def timeline(self):
+        """Rebuild the timeline rows"""
+        if 'tl.time' not in self._columns:
+            return self._get_meta().get('timeline')
+        drowsy, yawn, distraction = (self.column(f'tl.{field}') for field in self.TIMELINE_COUNTS)
+        return [
+            {'time': f"{minutes // 60:02d}:{minutes % 60:02d}", 'drowsy': d, 'yawn': y, 'distraction': x}
+            for minutes, d, y, x in zip(self.column('tl.time'), drowsy, yawn, distraction)
+        ]
+
+    def get(self, key, default=None):
+        """Decode a single top-level key"""
+        if key == 'timeline' and 'tl.time' in self._columns:
+            return self.timeline()
+        return self._get_meta().get(key, default)
+
+    def to_dict(self, keys=None):
+        """Decode the whole blob, or only the given keys"""
+        if keys is None:
+            return {key: self.get(key) for key in self.keys()}
+        return {key: self.get(key) for key in keys if key in self.keys()}
+
+
+def load_visualization(value, keys=None):
+    """
+    Decode a stored visualization_data value
+
+    Accepts both blobs and the legacy JSON text still present in rows the
+    background migration has not reached yet.
+
+    Args:
+        value: user_sessions.visualization_data
+        keys: Only decode these top-level keys
+
+    Returns:
+        dict: Visualization data, or None if value is empty
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        data = json.loads(value)
+        return data if keys is None else {key: data[key] for key in keys if key in data}
+    return VisualizationBlob(value).to_dict(keys)
+
+
+# Legacy rows re-encoded per transaction, and the pause between batches
+MIGRATION_BATCH_SIZE = 200
+MIGRATION_PAUSE_SECONDS = 0.05
+
+_migration_thread = None
+_migration_lock = threading.Lock()
+
+
+def migrate_legacy_rows(batch_size=MIGRATION_BATCH_SIZE, pause_seconds=MIGRATION_PAUSE_SECONDS, path=None):
+    """
+    Re-encode JSON visualization_data rows as blobs
+
+    Walks user_sessions by id in small batches, each in its own short
+    transaction, so detection and finalization writes are never held up
+    for long. A row is only replaced if it still holds the JSON that was
+    read; rows that fail to parse are left alone.
+
+    Returns:
+        int: Number of rows migrated
+    """
+    last_id = 0
+    migrated = 0
+    while True:
+        rows = get_read_connection(path).execute('''
+            SELECT id, visualization_data FROM user_sessions
+            WHERE id > ? AND typeof(visualization_data) = 'text'
+            ORDER BY id LIMIT ?
+        ''', (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row in rows:
+            last_id = row['id']
+            try:
+                blob = VisualizationBlob.encode(json.loads(row['visualization_data']))
+            except (ValueError, TypeError) as e:
+                logging.warning(f"Skipping visualization data of session {row['id']}: {str(e)}")
+                continue
+            updates.append((blob, row['id'], row['visualization_data']))
+
+        with transaction(path) as conn:
+            cursor = conn.executemany(
+                "UPDATE user_sessions SET visualization_data = ? WHERE id = ? AND visualization_data = ?",
+                updates
+            )
+            migrated += max(cursor.rowcount, 0)
+
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+    return migrated
+
+
+def start_background_migration():
+    """Run migrate_legacy_rows() once on a daemon thread"""
+    global _migration_thread
+
+    def run():
+        try:
+            # Shards hold the rows of users moved out of the main database
+            paths = [None] + ([path for _, path in shards.iter_shards()] if shards.ENABLED else [])
+            migrated = sum(migrate_legacy_rows(path=path) for path in paths)
+            if migrated:
+                logging.info(f"Migrated visualization data of {migrated} sessions to blobs")
+        except Exception as e:
+            logging.error(f"Error migrating visualization data: {str(e)}")
+
+    with _migration_lock:
+        if _migration_thread is None or not _migration_thread.is_alive():
+            _migration_thread = threading.Thread(target=run, name="visualization-migration")
+            _migration_thread.daemon = True
+            _migration_thread.start()
+    return _migration_thread